@@ -1,5 +1,6 @@
 """Alembic environment configuration."""
 
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -8,15 +9,25 @@ from sqlalchemy import pool
 from alembic import context
 
 from db import Base
-from models import Family, Guest  # noqa: F401 - needed for metadata
+import models  # noqa: F401 - needed for metadata
 
 config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+    # From the CLI, migrate the database the app uses; alembic.ini only holds
+    # the SQLite default. (migrations.upgrade_schema passes its own URL.)
+    if os.getenv("DATABASE_URL"):
+        config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"].replace("%", "%%"))
+
 target_metadata = Base.metadata
 
 
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    """Keep autogenerate away from the FTS5 tables of migration 009 (not in the models)."""
+    return not (type_ == "table" and reflected and name.startswith("photos_fts"))
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
     url = config.get_main_option("sqlalchemy.url")
@@ -24,6 +35,7 @@ def run_migrations_offline() -> None:
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
+        include_object=include_object,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -41,7 +53,11 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            # SQLite can't ALTER most things; batch mode recreates the table instead
+            render_as_batch=connection.dialect.name == "sqlite",
         )
 
         with context.begin_transaction():
@@ -16,7 +16,18 @@ branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
 
+def _has_table(bind, table_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    return table_name in inspector.get_table_names()
+
+
 def upgrade() -> None:
+    bind = op.get_bind()
+    # Databases created by the app's old create_all() have the tables but no
+    # alembic_version; later revisions add whatever columns they miss.
+    if _has_table(bind, 'families') and _has_table(bind, 'guests'):
+        return
+
     op.create_table(
         'families',
         sa.Column('id', sa.Integer(), nullable=False),
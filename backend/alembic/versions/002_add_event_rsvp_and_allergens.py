@@ -37,6 +37,7 @@ def upgrade() -> None:
     if not _has_column(bind, "guests", "allergens"):
         op.add_column("guests", sa.Column("allergens", sa.JSON(), nullable=True))
 
+    # Boolean literals are TRUE/FALSE (not 1/0) so the backfills also run on PostgreSQL.
     # Backfill from legacy single-choice field if present.
     if _has_column(bind, "guests", "attendance_choice"):
         op.execute(
@@ -45,15 +46,15 @@ def upgrade() -> None:
                 UPDATE guests
                 SET
                   attend_ceremony = CASE
-                    WHEN attendance_choice = 'ceremony' THEN 1
-                    WHEN attendance_choice = 'lunch' THEN 0
-                    WHEN attendance_choice = 'decline' THEN 0
+                    WHEN attendance_choice = 'ceremony' THEN TRUE
+                    WHEN attendance_choice = 'lunch' THEN FALSE
+                    WHEN attendance_choice = 'decline' THEN FALSE
                     ELSE attend_ceremony
                   END,
                   attend_lunch = CASE
-                    WHEN attendance_choice = 'ceremony' THEN 0
-                    WHEN attendance_choice = 'lunch' THEN 1
-                    WHEN attendance_choice = 'decline' THEN 0
+                    WHEN attendance_choice = 'ceremony' THEN FALSE
+                    WHEN attendance_choice = 'lunch' THEN TRUE
+                    WHEN attendance_choice = 'decline' THEN FALSE
                     ELSE attend_lunch
                   END
                 WHERE attendance_choice IS NOT NULL
@@ -71,13 +72,13 @@ def upgrade() -> None:
             UPDATE guests
             SET
               attend_ceremony = CASE
-                WHEN attend_ceremony IS NULL AND attending = 1 THEN 1
-                WHEN attend_ceremony IS NULL AND attending = 0 THEN 0
+                WHEN attend_ceremony IS NULL AND attending = TRUE THEN TRUE
+                WHEN attend_ceremony IS NULL AND attending = FALSE THEN FALSE
                 ELSE attend_ceremony
               END,
               attend_lunch = CASE
-                WHEN attend_lunch IS NULL AND attending = 1 THEN 1
-                WHEN attend_lunch IS NULL AND attending = 0 THEN 0
+                WHEN attend_lunch IS NULL AND attending = TRUE THEN TRUE
+                WHEN attend_lunch IS NULL AND attending = FALSE THEN FALSE
                 ELSE attend_lunch
               END
             """
@@ -0,0 +1,39 @@
+"""Add processing status to photos table.
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "005"
+down_revision: Union[str, None] = "004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_column(bind, table_name: str, column_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    columns = {col["name"] for col in inspector.get_columns(table_name)}
+    return column_name in columns
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # Photos uploaded before the async pipeline were processed synchronously.
+    if not _has_column(bind, "photos", "status"):
+        op.add_column(
+            "photos",
+            sa.Column("status", sa.String(), nullable=False, server_default="ready"),
+        )
+    if not _has_column(bind, "photos", "status_detail"):
+        op.add_column("photos", sa.Column("status_detail", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    # SQLite doesn't support easy column drops, and it's safer to leave it if we ever roll back app code.
+    pass
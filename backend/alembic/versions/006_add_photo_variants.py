@@ -0,0 +1,34 @@
+"""Add responsive variants to photos table.
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "006"
+down_revision: Union[str, None] = "005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_column(bind, table_name: str, column_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    columns = {col["name"] for col in inspector.get_columns(table_name)}
+    return column_name in columns
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not _has_column(bind, "photos", "variants"):
+        # JSON payload is serialized in SQLite as text.
+        op.add_column("photos", sa.Column("variants", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    # SQLite doesn't support easy column drops, and it's safer to leave it if we ever roll back app code.
+    pass
@@ -0,0 +1,45 @@
+"""Add content and perceptual hashes to photos table.
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "007"
+down_revision: Union[str, None] = "006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_column(bind, table_name: str, column_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    columns = {col["name"] for col in inspector.get_columns(table_name)}
+    return column_name in columns
+
+
+def _has_index(bind, table_name: str, index_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    indexes = {index["name"] for index in inspector.get_indexes(table_name)}
+    return index_name in indexes
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    # Existing photos keep NULL hashes: they are never matched as duplicates.
+    for column_name in ("content_hash", "perceptual_hash"):
+        if not _has_column(bind, "photos", column_name):
+            op.add_column("photos", sa.Column(column_name, sa.String(), nullable=True))
+
+    if not _has_index(bind, "photos", "ix_photos_content_hash"):
+        op.create_index("ix_photos_content_hash", "photos", ["content_hash"], unique=False)
+
+
+def downgrade() -> None:
+    # SQLite doesn't support easy column drops, and it's safer to leave it if we ever roll back app code.
+    pass
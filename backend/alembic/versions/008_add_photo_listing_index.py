@@ -0,0 +1,41 @@
+"""Add composite index backing the photo gallery listing.
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "008"
+down_revision: Union[str, None] = "007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_index(bind, table_name: str, index_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    indexes = {index["name"] for index in inspector.get_indexes(table_name)}
+    return index_name in indexes
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    # Lets GET /api/photos walk ready photos newest first (keyset cursor) without sorting.
+    if not _has_index(bind, "photos", "ix_photos_status_created_at_id"):
+        op.create_index(
+            "ix_photos_status_created_at_id",
+            "photos",
+            ["status", "created_at", "id"],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if _has_index(bind, "photos", "ix_photos_status_created_at_id"):
+        op.drop_index("ix_photos_status_created_at_id", table_name="photos")
@@ -0,0 +1,77 @@
+"""Add FTS5 search index over photo uploader names and captions.
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "009"
+down_revision: Union[str, None] = "008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(bind, table_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    return table_name in inspector.get_table_names()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite" or _has_table(bind, "photos_fts"):
+        return
+
+    # Same DDL as photo_search.SEARCH_INDEX_DDL; triggers keep the index in sync.
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE photos_fts USING fts5(
+            uploader_name,
+            caption,
+            content = 'photos',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER photos_fts_insert AFTER INSERT ON photos BEGIN
+            INSERT INTO photos_fts (rowid, uploader_name, caption)
+            VALUES (new.rowid, new.uploader_name, new.caption);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER photos_fts_delete AFTER DELETE ON photos BEGIN
+            INSERT INTO photos_fts (photos_fts, rowid, uploader_name, caption)
+            VALUES ('delete', old.rowid, old.uploader_name, old.caption);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER photos_fts_update AFTER UPDATE OF uploader_name, caption ON photos BEGIN
+            INSERT INTO photos_fts (photos_fts, rowid, uploader_name, caption)
+            VALUES ('delete', old.rowid, old.uploader_name, old.caption);
+            INSERT INTO photos_fts (rowid, uploader_name, caption)
+            VALUES (new.rowid, new.uploader_name, new.caption);
+        END
+        """
+    )
+    op.execute("INSERT INTO photos_fts (photos_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+    op.execute("DROP TRIGGER IF EXISTS photos_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS photos_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS photos_fts_insert")
+    op.execute("DROP TABLE IF EXISTS photos_fts")
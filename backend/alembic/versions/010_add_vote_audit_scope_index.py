@@ -0,0 +1,46 @@
+"""Replace the vote_audits IP index with an (ip, scope) composite index.
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "010"
+down_revision: Union[str, None] = "009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_index(bind, table_name: str, index_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    indexes = {index["name"] for index in inspector.get_indexes(table_name)}
+    return index_name in indexes
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    # Lets the multi-group vote check seek the lowest and highest scope of an
+    # IP instead of scanning every vote it sent; covers lookups by IP alone too.
+    if not _has_index(bind, "vote_audits", "ix_vote_audits_ip_scope"):
+        op.create_index(
+            "ix_vote_audits_ip_scope",
+            "vote_audits",
+            ["ip_address", "scope_type", "scope_id"],
+            unique=False,
+        )
+    if _has_index(bind, "vote_audits", "ix_vote_audits_ip_address"):
+        op.drop_index("ix_vote_audits_ip_address", table_name="vote_audits")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if not _has_index(bind, "vote_audits", "ix_vote_audits_ip_address"):
+        op.create_index("ix_vote_audits_ip_address", "vote_audits", ["ip_address"], unique=False)
+    if _has_index(bind, "vote_audits", "ix_vote_audits_ip_scope"):
+        op.drop_index("ix_vote_audits_ip_scope", table_name="vote_audits")
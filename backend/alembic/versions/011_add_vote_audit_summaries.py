@@ -0,0 +1,58 @@
+"""Create vote_audit_summaries for compacted vote audit rows.
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "011"
+down_revision: Union[str, None] = "010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(bind, table_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    return table_name in inspector.get_table_names()
+
+
+def _has_index(bind, table_name: str, index_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    indexes = {index["name"] for index in inspector.get_indexes(table_name)}
+    return index_name in indexes
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if not _has_table(bind, "vote_audit_summaries"):
+        op.create_table(
+            "vote_audit_summaries",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("ip_address", sa.String(), nullable=False),
+            sa.Column("scope_type", sa.String(), nullable=False),
+            sa.Column("scope_id", sa.Integer(), nullable=False),
+            sa.Column("votes", sa.Integer(), nullable=False),
+            sa.Column("first_seen", sa.DateTime(), nullable=False),
+            sa.Column("last_seen", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    # Unique: compaction upserts one row per (ip, scope)
+    if not _has_index(bind, "vote_audit_summaries", "ix_vote_audit_summaries_ip_scope"):
+        op.create_index(
+            "ix_vote_audit_summaries_ip_scope",
+            "vote_audit_summaries",
+            ["ip_address", "scope_type", "scope_id"],
+            unique=True,
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if _has_table(bind, "vote_audit_summaries"):
+        op.drop_table("vote_audit_summaries")
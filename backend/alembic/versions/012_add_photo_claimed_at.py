@@ -0,0 +1,34 @@
+"""Add claimed_at to photos, for the upload queue shared by worker processes.
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "012"
+down_revision: Union[str, None] = "011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_column(bind, table_name: str, column_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    columns = {col["name"] for col in inspector.get_columns(table_name)}
+    return column_name in columns
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # Photos left "processing" without a claim time are claimed again right away.
+    if not _has_column(bind, "photos", "claimed_at"):
+        op.add_column("photos", sa.Column("claimed_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    # SQLite doesn't support easy column drops, and it's safer to leave it if we ever roll back app code.
+    pass
@@ -0,0 +1,101 @@
+"""Key the photo search index on an explicit photos.search_id column.
+
+The index of 009 points at the implicit rowid of `photos`, which VACUUM or a
+table rebuild may renumber since the primary key is a string.
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "013"
+down_revision: Union[str, None] = "012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_column(bind, table_name: str, column_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    columns = {col["name"] for col in inspector.get_columns(table_name)}
+    return column_name in columns
+
+
+def _has_index(bind, table_name: str, index_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    indexes = {index["name"] for index in inspector.get_indexes(table_name)}
+    return index_name in indexes
+
+
+def _has_table(bind, table_name: str) -> bool:
+    inspector = sa.inspect(bind)
+    return table_name in inspector.get_table_names()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not _has_column(bind, "photos", "search_id"):
+        op.add_column("photos", sa.Column("search_id", sa.Integer(), nullable=True))
+    if bind.dialect.name == "sqlite":
+        op.execute("UPDATE photos SET search_id = rowid WHERE search_id IS NULL")
+    if not _has_index(bind, "photos", "ix_photos_search_id"):
+        op.create_index("ix_photos_search_id", "photos", ["search_id"], unique=True)
+
+    if bind.dialect.name != "sqlite" or not _has_table(bind, "photos_fts"):
+        return
+
+    # Same DDL as photo_search.SEARCH_INDEX_DDL, replacing the rowid-keyed index of 009.
+    op.execute("DROP TRIGGER IF EXISTS photos_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS photos_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS photos_fts_insert")
+    op.execute("DROP TABLE photos_fts")
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE photos_fts USING fts5(
+            uploader_name,
+            caption,
+            content = 'photos',
+            content_rowid = 'search_id',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER photos_fts_insert AFTER INSERT ON photos BEGIN
+            UPDATE photos SET search_id = (SELECT COALESCE(MAX(search_id), 0) + 1 FROM photos)
+            WHERE rowid = new.rowid AND new.search_id IS NULL;
+            INSERT INTO photos_fts (rowid, uploader_name, caption)
+            SELECT search_id, uploader_name, caption FROM photos WHERE rowid = new.rowid;
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER photos_fts_delete AFTER DELETE ON photos BEGIN
+            INSERT INTO photos_fts (photos_fts, rowid, uploader_name, caption)
+            VALUES ('delete', old.search_id, old.uploader_name, old.caption);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER photos_fts_update AFTER UPDATE OF uploader_name, caption ON photos BEGIN
+            INSERT INTO photos_fts (photos_fts, rowid, uploader_name, caption)
+            VALUES ('delete', old.search_id, old.uploader_name, old.caption);
+            INSERT INTO photos_fts (rowid, uploader_name, caption)
+            VALUES (new.search_id, new.uploader_name, new.caption);
+        END
+        """
+    )
+    op.execute("INSERT INTO photos_fts (photos_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    # The search index of 009 is rebuilt by downgrading to 008 and upgrading again.
+    pass
@@ -0,0 +1,171 @@
+"""Optional async database access for the RSVP and photo routers.
+
+With `DB_ASYNC=1` the endpoints of `routers/rsvp.py` and `routers/photos.py`
+run as coroutines on an `AsyncSession` (aiosqlite for SQLite, psycopg's
+async mode for PostgreSQL) instead of occupying one of the 40 threads of
+Starlette's threadpool each while they wait on the database.
+
+The handlers themselves stay written against a sync `Session`: `db_endpoint`
+runs them through `AsyncSession.run_sync`, where SQLAlchemy drives the same
+ORM code on the async driver. With `DB_ASYNC=0` (the default) they stay
+sync endpoints.
+"""
+
+import asyncio
+import functools
+import inspect
+import os
+from typing import Callable
+
+from fastapi import Depends
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from db import (
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    SQLITE_PROFILE,
+    _apply_sqlite_pragmas,
+    get_db,
+)
+
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+
+# Async driver for each backend; psycopg 3 serves both modes
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "psycopg"}
+
+
+def async_url(url: str) -> str:
+    """Rewrite `url` to use the async driver of its backend.
+
+    Args:
+        url: SQLAlchemy database URL, e.g. ``sqlite:///./wedding.db``.
+
+    Returns:
+        The URL with the async driver, e.g. ``sqlite+aiosqlite:///./wedding.db``.
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        return url
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def create_async_db_engine(url: str = DATABASE_URL, sqlite_profile: str = SQLITE_PROFILE):
+    """Async counterpart of `db.create_db_engine`, with the same settings.
+
+    Args:
+        url: SQLAlchemy database URL (sync or async driver).
+        sqlite_profile: "tuned" or "default" (see `db.SQLITE_PROFILE`).
+
+    Returns:
+        The configured AsyncEngine.
+    """
+    # Imported here: sqlalchemy.ext.asyncio adds ~90 ms to startup with DB_ASYNC off
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = async_url(url)
+    if make_url(url).get_backend_name() == "sqlite":
+        engine = create_async_engine(url)
+        if sqlite_profile == "tuned":
+            event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        return engine
+    return create_async_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = create_async_db_engine()
+    # Objects stay loaded after commit: once run_sync returns, an expired
+    # attribute could no longer be reloaded while FastAPI serializes the response.
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    """Dependency that provides an async database session.
+
+    Yields:
+        AsyncSession: SQLAlchemy async database session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def db_endpoint(handler: Callable) -> Callable:
+    """Serve a sync endpoint taking `db: Session` from an AsyncSession when DB_ASYNC is on.
+
+    Apply below the route decorator. The returned coroutine has the
+    handler's signature with `db` injected by `get_async_db`, and calls the
+    handler inside `AsyncSession.run_sync`.
+
+    With DB_ASYNC off the handler stays sync, but closes its session as soon
+    as it returns. FastAPI validates the response of a sync endpoint in the
+    threadpool too: a request still holding its pooled connection while it
+    waits for a thread, behind threads waiting for a connection, deadlocks
+    once there are more concurrent requests than connections.
+
+    Args:
+        handler: Endpoint function with a `db` parameter depending on `get_db`.
+
+    Returns:
+        The sync endpoint with DB_ASYNC off, else the async endpoint.
+    """
+    if not DB_ASYNC:
+        @functools.wraps(handler)
+        def sync_endpoint(*args, db: Session, **kwargs):
+            try:
+                return handler(*args, db=db, **kwargs)
+            finally:
+                db.close()
+
+        return sync_endpoint
+
+    signature = inspect.signature(handler)
+    parameters = [
+        param.replace(default=Depends(get_async_db)) if param.name == "db" else param
+        for param in signature.parameters.values()
+    ]
+
+    @functools.wraps(handler)
+    async def endpoint(*args, db, **kwargs):
+        return await db.run_sync(lambda session: handler(*args, db=session, **kwargs))
+
+    endpoint.__signature__ = signature.replace(parameters=parameters)
+    return endpoint
+
+
+# `db` dependency of async endpoints that call `run_db` themselves
+get_session = get_async_db if DB_ASYNC else get_db
+
+
+async def run_db(db, fn: Callable, *args, **kwargs):
+    """Call `fn(session, *args, **kwargs)` with a sync Session or inside an AsyncSession.
+
+    A sync Session is used from a worker thread, so that its blocking
+    queries don't hold up the event loop.
+
+    Args:
+        db: Session from `get_session`.
+        fn: Function taking a sync `Session` first.
+
+    Returns:
+        What `fn` returns.
+    """
+    if isinstance(db, Session):
+        return await asyncio.to_thread(fn, db, *args, **kwargs)
+    return await db.run_sync(fn, *args, **kwargs)
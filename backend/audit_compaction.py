@@ -0,0 +1,353 @@
+"""Retention for `vote_audits`: archive old rows and keep per-(ip, scope) summaries.
+
+`vote_audits` gains one row per guest per RSVP change and nothing ever
+deleted them. Rows older than `VOTE_AUDIT_RETENTION_DAYS` are compacted, in
+batches of `VOTE_AUDIT_COMPACT_BATCH`, oldest first. Each batch runs in its
+own transaction, which:
+
+- deletes the rows by id (``DELETE ... RETURNING``, so only rows still
+  there count)
+- adds them to `VoteAuditSummary`: one row per IP and family or guest with
+  the number of votes and the first and last one
+- appends them to a gzip-compressed JSON Lines file in
+  `VOTE_AUDIT_ARCHIVE_DIR`, synced to disk before the commit
+
+The summaries keep every (ip, scope) pair, so the multi-group check
+(`vote_scopes`) gives the same answers afterwards. Then `maintain` frees
+pages and refreshes the planner statistics: ``PRAGMA incremental_vacuum``
+and ``ANALYZE`` on SQLite, ``VACUUM (ANALYZE)`` on PostgreSQL. A full
+``VACUUM`` (`vacuum`) rewrites the whole file and is left to the CLI,
+`scripts/compact_vote_audits.py`.
+
+With `VOTE_AUDIT_COMPACT_INTERVAL_HOURS` set, the lifespan also runs the
+compaction and `maintain` on that schedule; with several backend processes,
+the one holding the ``audit_compaction`` `shared_state` lock runs it and the
+others skip that round.
+"""
+
+import asyncio
+import gzip
+import itertools
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import bindparam, case, delete, select, update
+from sqlalchemy.engine import Engine
+
+import shared_state
+from db import engine
+from models import VoteAudit, VoteAuditSummary
+
+logger = logging.getLogger(__name__)
+
+VOTE_AUDIT_RETENTION_DAYS = int(os.getenv("VOTE_AUDIT_RETENTION_DAYS", "30"))
+VOTE_AUDIT_ARCHIVE_DIR = Path(os.getenv("VOTE_AUDIT_ARCHIVE_DIR", "/data/audit_archive"))
+VOTE_AUDIT_COMPACT_BATCH = int(os.getenv("VOTE_AUDIT_COMPACT_BATCH", "2000"))
+# Free pages returned to the OS per run, on SQLite databases in incremental auto_vacuum mode
+VOTE_AUDIT_VACUUM_PAGES = int(os.getenv("VOTE_AUDIT_VACUUM_PAGES", "10000"))
+# 0 disables the scheduled run; the CLI still works
+VOTE_AUDIT_COMPACT_INTERVAL_HOURS = float(os.getenv("VOTE_AUDIT_COMPACT_INTERVAL_HOURS", "0"))
+
+_audits = VoteAudit.__table__
+_summaries = VoteAuditSummary.__table__
+_schedule_task: asyncio.Task | None = None
+
+
+def _upsert_statement(dialect: str):
+    """INSERT ... ON CONFLICT on (ip, scope) adding to an existing summary (SQLite, PostgreSQL)."""
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+
+    statement = insert(_summaries)
+    new = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=["ip_address", "scope_type", "scope_id"],
+        set_={
+            "votes": _summaries.c.votes + new.votes,
+            "first_seen": case(
+                (new.first_seen < _summaries.c.first_seen, new.first_seen),
+                else_=_summaries.c.first_seen,
+            ),
+            "last_seen": case(
+                (new.last_seen > _summaries.c.last_seen, new.last_seen),
+                else_=_summaries.c.last_seen,
+            ),
+        },
+    )
+
+
+def _summary_key(values) -> tuple:
+    """(ip, scope type, scope id) of a summary row or dict."""
+    return values["ip_address"], values["scope_type"], values["scope_id"]
+
+
+def _add_summaries(connection, summaries: list[dict]) -> None:
+    """Add `summaries` to the existing ones of the same (ip, scope), or insert them.
+
+    SQLite and PostgreSQL do it in one ``INSERT ... ON CONFLICT``. Other
+    databases look the pairs up first, then update or insert; a summary
+    inserted concurrently for the same pair makes the unique index fail the
+    transaction, and its rows are compacted on the next run.
+    """
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        connection.execute(_upsert_statement(dialect), summaries)
+        return
+
+    existing = {
+        _summary_key(row._mapping): row
+        for row in connection.execute(
+            select(_summaries).where(_summaries.c.ip_address.in_({s["ip_address"] for s in summaries}))
+        )
+    }
+    updates, inserts = [], []
+    for summary in summaries:
+        current = existing.get(_summary_key(summary))
+        if current is None:
+            inserts.append(summary)
+            continue
+        updates.append({
+            "summary_id": current.id,
+            "new_votes": current.votes + summary["votes"],
+            "new_first_seen": min(current.first_seen, summary["first_seen"]),
+            "new_last_seen": max(current.last_seen, summary["last_seen"]),
+        })
+    if updates:
+        connection.execute(
+            update(_summaries)
+            .where(_summaries.c.id == bindparam("summary_id"))
+            .values(votes=bindparam("new_votes"), first_seen=bindparam("new_first_seen"),
+                    last_seen=bindparam("new_last_seen")),
+            updates,
+        )
+    if inserts:
+        connection.execute(_summaries.insert(), inserts)
+
+
+def _summarize(rows) -> list[dict]:
+    """Roll audit rows up into one summary row per (ip, scope)."""
+    summaries: dict[tuple, dict] = {}
+    for row in rows:
+        key = (row.ip_address, row.scope_type, row.scope_id)
+        summary = summaries.get(key)
+        if summary is None:
+            summaries[key] = {
+                "ip_address": row.ip_address,
+                "scope_type": row.scope_type,
+                "scope_id": row.scope_id,
+                "votes": 1,
+                "first_seen": row.created_at,
+                "last_seen": row.created_at,
+            }
+        else:
+            summary["votes"] += 1
+            if row.created_at < summary["first_seen"]:
+                summary["first_seen"] = row.created_at
+            elif row.created_at > summary["last_seen"]:
+                summary["last_seen"] = row.created_at
+    return list(summaries.values())
+
+
+def _archive_lines(rows) -> bytes:
+    """Audit rows as JSON Lines."""
+    return "".join(
+        json.dumps({
+            "id": row.id,
+            "ip_address": row.ip_address,
+            "scope_type": row.scope_type,
+            "scope_id": row.scope_id,
+            "guest_id": row.guest_id,
+            "created_at": row.created_at.isoformat(),
+        }) + "\n"
+        for row in rows
+    ).encode()
+
+
+def _compact_batch(bind: Engine, rows: list, archive: gzip.GzipFile) -> int:
+    """Move audit rows to the summaries and the archive.
+
+    Summaries and archive lines are prepared before the transaction, so the
+    write lock is only held for the SQL and the archive sync.
+
+    Returns:
+        Number of rows moved.
+    """
+    summaries, lines = _summarize(rows), _archive_lines(rows)
+    with bind.begin() as connection:
+        # By id, not by id range: a row with an id between them may have been
+        # committed after the SELECT (out-of-order sequence values on
+        # PostgreSQL, buffered audit writes), and it isn't in `rows`
+        ids = [row.id for row in rows]
+        if connection.dialect.delete_returning:
+            deleted = set(connection.scalars(
+                delete(_audits).where(_audits.c.id.in_(ids)).returning(_audits.c.id)
+            ))
+        else:
+            deleted = set(connection.scalars(
+                select(_audits.c.id).where(_audits.c.id.in_(ids)).with_for_update()
+            ))
+            connection.execute(delete(_audits).where(_audits.c.id.in_(deleted)))
+        if len(deleted) != len(rows):
+            # Some were deleted in the meantime (with their guest)
+            rows = [row for row in rows if row.id in deleted]
+            if not rows:
+                return 0
+            summaries, lines = _summarize(rows), _archive_lines(rows)
+        _add_summaries(connection, summaries)
+        archive.write(lines)
+        # On disk before the rows are gone from the database
+        archive.flush()
+        os.fsync(archive.fileobj.fileno())
+    return len(rows)
+
+
+def compact(
+    bind: Engine = engine,
+    before: datetime | None = None,
+    archive_dir: Path = VOTE_AUDIT_ARCHIVE_DIR,
+    batch_size: int = VOTE_AUDIT_COMPACT_BATCH,
+) -> dict:
+    """Archive and summarize the audit rows created before `before`.
+
+    Rows are taken in id order, which is creation order, up to the first
+    one inside the retention window.
+
+    Args:
+        bind: Engine of the database.
+        before: Cutoff (default: VOTE_AUDIT_RETENTION_DAYS ago, UTC).
+        archive_dir: Directory of the archive files.
+        batch_size: Rows per transaction.
+
+    Returns:
+        Rows compacted, batches and the archive file (None if nothing was old enough).
+    """
+    if before is None:
+        before = datetime.utcnow() - timedelta(days=VOTE_AUDIT_RETENTION_DAYS)
+    result = {"compacted": 0, "batches": 0, "archive": None}
+    archive = None
+    last_id = 0
+    try:
+        while True:
+            with bind.connect() as connection:
+                candidates = connection.execute(
+                    select(_audits).where(_audits.c.id > last_id).order_by(_audits.c.id).limit(batch_size)
+                ).all()
+            rows = list(itertools.takewhile(lambda row: row.created_at < before, candidates))
+            if not rows:
+                break
+
+            if archive is None:
+                archive_dir.mkdir(parents=True, exist_ok=True)
+                path = archive_dir / f"vote_audits-{datetime.utcnow():%Y%m%dT%H%M%S}-{rows[0].id}.jsonl.gz"
+                archive = gzip.open(path, "xb", compresslevel=6)
+                result["archive"] = str(path)
+            result["compacted"] += _compact_batch(bind, rows, archive)
+            result["batches"] += 1
+            last_id = rows[-1].id
+            if len(rows) < len(candidates):
+                break
+    finally:
+        if archive is not None:
+            archive.close()
+    return result
+
+
+def maintain(bind: Engine = engine, pages: int = VOTE_AUDIT_VACUUM_PAGES) -> dict:
+    """Return free pages to the OS and refresh planner statistics, without a full VACUUM.
+
+    On SQLite pages are only freed if the database is in incremental
+    auto_vacuum mode, which `vacuum` switches it to.
+
+    Args:
+        bind: Engine of the database.
+        pages: Max free pages to release (SQLite).
+
+    Returns:
+        Pages freed (SQLite) and free pages left.
+    """
+    if bind.dialect.name == "postgresql":
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM (ANALYZE) vote_audits, vote_audit_summaries")
+        return {}
+
+    connection = bind.raw_connection()
+    try:
+        sqlite = connection.driver_connection
+        free_before = sqlite.execute("PRAGMA freelist_count").fetchone()[0]
+        if sqlite.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:  # INCREMENTAL
+            # executescript steps the pragma to completion; execute frees one page
+            sqlite.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        sqlite.executescript("ANALYZE vote_audits; ANALYZE vote_audit_summaries")
+        free_after = sqlite.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        connection.close()
+    return {"pages_freed": free_before - free_after, "free_pages": free_after}
+
+
+def vacuum(bind: Engine = engine) -> None:
+    """Rewrite the whole database; blocks every writer while it runs.
+
+    On SQLite it also switches the database to incremental auto_vacuum, so
+    that `maintain` can free pages from then on.
+
+    Args:
+        bind: Engine of the database.
+    """
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if bind.dialect.name == "postgresql":
+            connection.exec_driver_sql("VACUUM (FULL, ANALYZE) vote_audits, vote_audit_summaries")
+            return
+        connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.exec_driver_sql("VACUUM")
+
+
+def run(bind: Engine = engine) -> dict | None:
+    """Compact with the configured retention, then `maintain`; blocking.
+
+    Returns:
+        What was done, or None if another process is already running it.
+    """
+    with shared_state.try_lock("audit_compaction") as acquired:
+        if not acquired:
+            return None
+        started = time.perf_counter()
+        result = compact(bind)
+        result |= maintain(bind)
+        result["seconds"] = round(time.perf_counter() - started, 2)
+        return result
+
+
+async def _scheduled():
+    """Run the compaction every VOTE_AUDIT_COMPACT_INTERVAL_HOURS."""
+    while True:
+        await asyncio.sleep(VOTE_AUDIT_COMPACT_INTERVAL_HOURS * 3600)
+        try:
+            result = await asyncio.to_thread(run)
+            if result is not None:
+                logger.info("Vote audit compaction: %s", result)
+        except Exception:
+            logger.exception("Vote audit compaction failed")
+
+
+async def start_schedule():
+    """Start the scheduled compaction (VOTE_AUDIT_COMPACT_INTERVAL_HOURS > 0 only)."""
+    global _schedule_task
+    if VOTE_AUDIT_COMPACT_INTERVAL_HOURS <= 0 or _schedule_task is not None:
+        return
+    _schedule_task = asyncio.create_task(_scheduled())
+
+
+async def stop_schedule():
+    """Cancel the scheduled compaction; a run already started finishes in its thread."""
+    global _schedule_task
+    if _schedule_task is None:
+        return
+    _schedule_task.cancel()
+    await asyncio.gather(_schedule_task, return_exceptions=True)
+    _schedule_task = None
@@ -0,0 +1,82 @@
+"""Version counter for the guest list (families and guests).
+
+Every committed write to families or guests bumps the version, detected by
+session hooks so no endpoint has to remember to. Readers use it to
+validate in-process caches (the pre-serialized guest-list responses) and to
+build the ETags of conditional GETs.
+
+The counter is a `shared_state` counter, so a write served by one worker
+process invalidates the caches of the others too.
+"""
+
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import shared_state
+from models import Family, Guest
+
+
+def current() -> int:
+    """Return the current guest-list version."""
+    return shared_state.counter("guest_list")
+
+
+def bump() -> int:
+    """Record a guest-list change; call after committing the write.
+
+    Returns:
+        The new version.
+    """
+    return shared_state.bump("guest_list")
+
+
+def etag(version: int | None = None) -> str:
+    """Strong ETag for responses derived from the guest list at `version`.
+
+    The counters restart at 0 with the backend; their token keeps ETags
+    from a previous run from matching.
+
+    Args:
+        version: Version the response was built from (default: current).
+    """
+    return f'"{shared_state.token()}-{current() if version is None else version}"'
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    """Flag sessions that flushed changes to families or guests."""
+    changed = chain(session.new, session.dirty, session.deleted)
+    if any(isinstance(obj, (Family, Guest)) for obj in changed):
+        session.info["guest_list_changed"] = True
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _track_bulk(context):
+    """Flag sessions that ran `Query.update()`/`delete()` on families or guests."""
+    if context.mapper.class_ in (Family, Guest):
+        context.session.info["guest_list_changed"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_orm_statement(orm_execute_state):
+    """Flag sessions that execute insert()/update()/delete() on families or guests."""
+    state = orm_execute_state
+    if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper is not None:
+        if state.bind_mapper.class_ in (Family, Guest):
+            state.session.info["guest_list_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session):
+    """Bump the version once the flagged changes are committed."""
+    if session.info.pop("guest_list_changed", False):
+        bump()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    """Drop the flag of changes that were rolled back."""
+    session.info.pop("guest_list_changed", None)
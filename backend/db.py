@@ -1,11 +1,122 @@
 """Database connection and session management."""
 
-from sqlalchemy import create_engine
+import os
+import sqlite3
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./wedding.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./wedding.db")
+# "tuned": WAL and the pragmas below on every connection; "default": driver defaults
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned")
+# How long a writer waits for the lock before "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(16 * 1024)))
+# SQLite file of an earlier deployment, copied to DATABASE_URL's file if that doesn't exist yet
+LEGACY_DATABASE_PATH = os.getenv("LEGACY_DATABASE_PATH", "")
+# Connection pool of server databases (PostgreSQL), per process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Test connections before use, so a database restart costs no failed request
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Replace connections older than this (seconds), before servers or proxies drop them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configure a new SQLite connection for concurrent readers and writers.
+
+    WAL lets readers proceed while a write is in progress, and with it
+    ``synchronous=NORMAL`` is still corruption-safe (only the last commits
+    may be lost on power failure).
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        # Negative values are KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL, sqlite_profile: str = SQLITE_PROFILE) -> Engine:
+    """Create an engine for `url`.
+
+    SQLite gets the connection profile, other databases (PostgreSQL through
+    ``postgresql+psycopg://``) a connection pool sized by the DB_POOL_* settings.
+
+    Args:
+        url: SQLAlchemy database URL.
+        sqlite_profile: "tuned" or "default" (see SQLITE_PROFILE).
+
+    Returns:
+        The configured Engine.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        # Sessions are used from uvicorn's threadpool
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        if sqlite_profile == "tuned":
+            event.listen(engine, "connect", _apply_sqlite_pragmas)
+        return engine
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
+
+def adopt_legacy_database(url: str = DATABASE_URL, legacy_path: str = LEGACY_DATABASE_PATH) -> bool:
+    """Copy the database of an earlier deployment to `url`'s file, once.
+
+    Deployments used to mount only ``backend/wedding.db`` into the container;
+    the database now lives in the mounted data directory. When the SQLite
+    file of `url` doesn't exist yet and `legacy_path` does, the legacy file
+    is copied there (with SQLite's backup API, so the copy is consistent)
+    and a marker is left next to it, so deleting the database on purpose
+    later starts a new one instead of copying the old one again. The legacy
+    file is only read.
+
+    Args:
+        url: SQLAlchemy URL of the database.
+        legacy_path: Path of the legacy SQLite file; empty to skip.
+
+    Returns:
+        True if the legacy database was copied.
+    """
+    parsed = make_url(url)
+    if not legacy_path or parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        return False
+    target, legacy = Path(parsed.database), Path(legacy_path)
+    marker = target.with_name(f".{target.name}.legacy-imported")
+    if target.exists() or marker.exists() or not legacy.is_file():
+        return False
+    partial = target.with_name(f"{target.name}.importing")
+    partial.unlink(missing_ok=True)
+    # immutable: the legacy file may sit on a read-only mount, without its -shm
+    source = sqlite3.connect(f"file:{legacy}?mode=ro&immutable=1", uri=True)
+    copy = sqlite3.connect(partial)
+    try:
+        source.backup(copy)
+    finally:
+        copy.close()
+        source.close()
+    os.replace(partial, target)
+    marker.touch()
+    return True
+
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
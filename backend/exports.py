@@ -0,0 +1,218 @@
+"""Streaming CSV and XLSX exports of the guest list with RSVPs.
+
+Guests are read with `yield_per`, a server-side cursor on PostgreSQL and
+incremental `fetchmany` on SQLite, and encoded one batch at a time. An
+export of 100k guests therefore needs about as much memory as one of 100,
+and the first bytes go out as soon as the first batch is read. The XLSX
+file is built with the standard library only: one worksheet of inline
+strings, zipped as it is written.
+"""
+
+import csv
+import io
+import os
+import re
+import zipfile
+from typing import Iterable, Iterator
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Family, Guest
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_COLUMNS = (
+    "guest_id",
+    "name",
+    "family",
+    "attendance",
+    "ceremony",
+    "lunch",
+    "allergens",
+    "dietary_notes",
+    "admin_notes",
+    "updated_at",
+)
+
+# Characters XML 1.0 doesn't allow, even escaped
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+# First characters that make spreadsheet apps read a CSV cell as a formula
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _yes_no(value: bool | None) -> str:
+    """RSVP flag as a spreadsheet value ("" when the guest hasn't answered)."""
+    return "" if value is None else ("yes" if value else "no")
+
+
+def guest_rows(db: Session) -> Iterator[list[tuple]]:
+    """Yield the export rows in batches of EXPORT_BATCH_SIZE.
+
+    Families come first, sorted by name, then individual guests. Closes
+    `db` when done: the response outlives the request's `get_db` scope.
+
+    Args:
+        db: Database session
+
+    Yields:
+        Lists of rows with the values of EXPORT_COLUMNS.
+    """
+    query = (
+        select(
+            Guest.id,
+            Guest.name,
+            Family.family_name,
+            Guest.attendance_choice,
+            Guest.attend_ceremony,
+            Guest.attend_lunch,
+            Guest.allergens,
+            Guest.dietary_notes,
+            Guest.admin_notes,
+            Guest.updated_at,
+        )
+        .outerjoin(Family, Guest.family_id == Family.id)
+        .order_by(Guest.family_id.is_(None), Family.family_name, Guest.family_id, Guest.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    try:
+        for partition in db.execute(query).partitions():
+            yield [
+                (
+                    row.id,
+                    row.name,
+                    row.family_name or "",
+                    row.attendance_choice or "",
+                    _yes_no(row.attend_ceremony),
+                    _yes_no(row.attend_lunch),
+                    ", ".join(row.allergens or []),
+                    row.dietary_notes or "",
+                    row.admin_notes or "",
+                    row.updated_at.isoformat(sep=" ", timespec="seconds") if row.updated_at else "",
+                )
+                for row in partition
+            ]
+    finally:
+        db.close()
+
+
+def _csv_cell(value):
+    """Neutralize text that a spreadsheet app would run as a formula (CSV injection).
+
+    Names and dietary notes come from guests, so a note like
+    ``=HYPERLINK(...)`` must open as text: a leading ``'`` makes Excel and
+    LibreOffice show it as typed.
+    """
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(batches: Iterable[list[tuple]]) -> Iterator[bytes]:
+    """Encode row batches as UTF-8 CSV with a header, one chunk per batch.
+
+    Starts with a byte order mark so that Excel detects the encoding. Text
+    cells starting like a formula are prefixed with ``'`` (`_csv_cell`);
+    the XLSX export doesn't need it, its strings are never formulas.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue().encode()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_cell(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink:
+    """Write-only, unseekable file object collecting what `zipfile` writes."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        """Return and forget everything written so far."""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="RSVP" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_row(values: tuple) -> str:
+    """One worksheet row: numbers as numbers, everything else as inline strings."""
+    cells = []
+    for value in values:
+        if isinstance(value, int):
+            cells.append(f"<c><v>{value}</v></c>")
+        else:
+            text = escape(_XML_INVALID.sub("", str(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f"<row>{''.join(cells)}</row>"
+
+
+def xlsx_chunks(batches: Iterable[list[tuple]]) -> Iterator[bytes]:
+    """Encode row batches as an XLSX workbook with a header row, one chunk per batch."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in _XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        # Unknown size up front: allow ZIP64 in case the sheet passes 4 GiB
+        with workbook.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                .encode()
+            )
+            sheet.write(_xlsx_row(EXPORT_COLUMNS).encode())
+            yield sink.drain()
+            for batch in batches:
+                sheet.write("".join(_xlsx_row(row) for row in batch).encode())
+                yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
@@ -1,24 +1,49 @@
 """Image processing utilities for the photo gallery.
 
-Handles EXIF rotation, resizing, thumbnail generation, HEIC conversion,
-and metadata stripping for uploaded photos.
+Handles EXIF rotation, resizing, thumbnail generation, responsive
+WebP/AVIF variants, HEIC conversion, and metadata stripping for uploaded
+photos.
 """
 
+import hashlib
 import io
+import os
 import uuid
 from pathlib import Path
+from typing import BinaryIO, NamedTuple
 
-from PIL import Image, ImageOps
+from PIL import Image, ImageOps, features
 
-PHOTOS_DIR = Path("/data/photos")
+PHOTOS_DIR = Path(os.getenv("PHOTOS_DIR", "/data/photos"))
 ORIGINALS_DIR = PHOTOS_DIR / "originals"
 THUMBS_DIR = PHOTOS_DIR / "thumbs"
+VARIANTS_DIR = PHOTOS_DIR / "variants"
+# Raw uploads waiting for processing; kept outside PHOTOS_DIR because nginx
+# serves that tree publicly and raw files still carry EXIF/GPS metadata.
+INCOMING_DIR = Path(os.getenv("PHOTO_INCOMING_DIR", "/data/incoming"))
 
 MAX_ORIGINAL_SIZE = 2048
 THUMB_SIZE = 400
 ORIGINAL_QUALITY = 85
 THUMB_QUALITY = 80
 
+# Responsive variants: longest side in pixels, largest first, and output formats.
+VARIANT_SIZES = sorted(
+    (int(size) for size in os.getenv("PHOTO_VARIANT_SIZES", "2048,1600,800,400,200").split(",")),
+    reverse=True,
+)
+# Formats this Pillow build cannot encode (e.g. AVIF before Pillow 11.3) are skipped.
+VARIANT_FORMATS = [
+    fmt for fmt in os.getenv("PHOTO_VARIANT_FORMATS", "webp").split(",")
+    if fmt in features.modules and features.check_module(fmt)
+]
+VARIANT_QUALITY = {"webp": 80, "avif": 60}
+
+# Decode JPEGs at a reduced DCT scale when the output is smaller (set to 0 to disable).
+DRAFT_DECODE = os.getenv("PHOTO_DRAFT_DECODE", "1") == "1"
+# Filter for variants/thumbnail derived from the already downscaled original.
+DERIVED_RESAMPLE = Image.BICUBIC
+
 ALLOWED_MIME_TYPES = {
     "image/jpeg",
     "image/png",
@@ -27,50 +52,241 @@ ALLOWED_MIME_TYPES = {
     "image/heif",
 }
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# ISO BMFF brands used by HEIC/HEIF files (iPhone photos)
+_HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"}
+
+
+class ProcessedPhoto(NamedTuple):
+    """Result of `process_upload`.
+
+    Attributes:
+        photo_id: UUID4 hex string used as the filename (without extension)
+        width: Width of the processed original in pixels
+        height: Height of the processed original in pixels
+        file_size: Size of the processed original in bytes
+        variants: Saved variants as {"format", "width", "height"} dicts, largest first
+        perceptual_hash: 64-bit dHash of the image as 16 hex chars
+    """
+    photo_id: str
+    width: int
+    height: int
+    file_size: int
+    variants: list[dict]
+    perceptual_hash: str
+
 
 def ensure_dirs():
     """Create photo storage directories if they don't exist."""
     ORIGINALS_DIR.mkdir(parents=True, exist_ok=True)
     THUMBS_DIR.mkdir(parents=True, exist_ok=True)
+    VARIANTS_DIR.mkdir(parents=True, exist_ok=True)
+    INCOMING_DIR.mkdir(parents=True, exist_ok=True)
+
+
+_heif_registered = False
 
 
 def _register_heif():
-    """Register HEIF/HEIC opener with Pillow if available."""
+    """Register HEIF/HEIC opener with Pillow if available.
+
+    Called on the first HEIC upload rather than at import: pillow_heif loads
+    libheif, which most uploads (and every other request) never need.
+    """
+    global _heif_registered
+    if _heif_registered:
+        return
     try:
         from pillow_heif import register_heif_opener
         register_heif_opener()
     except ImportError:
         pass
+    _heif_registered = True
+
+
+def incoming_path(photo_id: str) -> Path:
+    """Path where the raw upload for `photo_id` waits for processing."""
+    return INCOMING_DIR / photo_id
+
+
+def sniff_image_type(header: bytes) -> str | None:
+    """Detect the image type from the first bytes of a file.
+
+    Args:
+        header: At least the first 12 bytes of the file.
+
+    Returns:
+        MIME type of a supported image format, or None if unrecognised.
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:8] == b"ftyp" and header[8:12] in _HEIF_BRANDS:
+        return "image/heic"
+    return None
+
+
+def save_upload_stream(
+    source: BinaryIO, destination: Path, max_size: int
+) -> tuple[str, int, str]:
+    """Copy an uploaded file to disk chunk by chunk.
+
+    The image type is sniffed from the first chunk and the size limit is
+    enforced while copying, so invalid uploads are rejected without reading
+    them fully and only one chunk is held in memory at a time. The SHA-256
+    of the content is computed on the way for duplicate detection.
+
+    Args:
+        source: Readable binary file object positioned at the start.
+        destination: Path to write the upload to.
+        max_size: Maximum allowed size in bytes.
+
+    Returns:
+        Tuple of (mime_type, size, sha256 hex digest) of the saved upload.
 
+    Raises:
+        ValueError: If the file is not a supported image or exceeds max_size.
+    """
+    size = 0
+    mime_type = None
+    digest = hashlib.sha256()
+    try:
+        with open(destination, "wb") as out:
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                if mime_type is None:
+                    mime_type = sniff_image_type(chunk[:16])
+                    if mime_type is None:
+                        raise ValueError("File is not a supported image")
+                size += len(chunk)
+                if size > max_size:
+                    raise ValueError(
+                        f"File too large. Maximum size is {max_size // (1024 * 1024)}MB."
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+        if mime_type is None:
+            raise ValueError("File is empty")
+    except BaseException:
+        destination.unlink(missing_ok=True)
+        raise
+    return mime_type, size, digest.hexdigest()
+
+
+def variant_filename(photo_id: str, width: int, fmt: str) -> str:
+    """Filename of a responsive variant inside VARIANTS_DIR."""
+    return f"{photo_id}_{width}w.{fmt}"
+
+
+def _downscale_steps(img: Image.Image):
+    """Yield the variant ladder of `img`, largest first, without duplicates.
 
-_register_heif()
+    Each step is resized from the previous one, so every resize works on the
+    smallest possible input; the cheaper DERIVED_RESAMPLE filter is enough
+    for these small reductions.
+
+    Args:
+        img: Decoded, EXIF-transposed RGB/L image (not modified).
+
+    Yields:
+        Images whose longest side is each of VARIANT_SIZES (or smaller when
+        the source is smaller than the step).
+    """
+    current = img
+    seen_sizes = set()
+    for size in VARIANT_SIZES:
+        if max(current.size) > size:
+            current = ImageOps.contain(current, (size, size), DERIVED_RESAMPLE)
+        if current.size in seen_sizes:
+            # Source smaller than this step: it would duplicate a larger variant
+            continue
+        seen_sizes.add(current.size)
+        yield current
 
 
-def process_upload(file_bytes: bytes) -> tuple[str, int, int, int]:
+def _save_variant(img: Image.Image, photo_id: str) -> list[dict]:
+    """Encode one ladder step in every VARIANT_FORMATS.
+
+    Returns:
+        List of {"format", "width", "height"} dicts for the saved files.
+    """
+    width, height = img.size
+    variants = []
+    for fmt in VARIANT_FORMATS:
+        img.save(
+            VARIANTS_DIR / variant_filename(photo_id, width, fmt),
+            fmt.upper(),
+            quality=VARIANT_QUALITY.get(fmt, 80),
+        )
+        variants.append({"format": fmt, "width": width, "height": height})
+    return variants
+
+
+def perceptual_hash(img: Image.Image) -> str:
+    """64-bit difference hash (dHash) of an image.
+
+    Near-identical images (re-encoded, resized, shared through a chat app)
+    get the same hash, unlike a hash of the file bytes.
+
+    Returns:
+        Hash as 16 hex chars.
+    """
+    pixels = img.convert("L").resize((9, 8), Image.BILINEAR).tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            offset = row * 9 + col
+            bits = (bits << 1) | (pixels[offset] > pixels[offset + 1])
+    return f"{bits:016x}"
+
+
+def _draft_box(size: tuple[int, int], longest: int) -> tuple[int, int]:
+    """Size that fits `size` into a `longest` x `longest` box, keeping aspect ratio."""
+    scale = longest / max(size)
+    return max(1, int(size[0] * scale)), max(1, int(size[1] * scale))
+
+
+def process_upload(source: bytes | str | Path, photo_id: str | None = None) -> ProcessedPhoto:
     """Process an uploaded image file.
 
-    Fixes EXIF rotation, resizes to max 2048px, generates a 400px thumbnail,
-    and strips EXIF metadata (including GPS data) for privacy.
+    Fixes EXIF rotation, resizes to max 2048px, generates a 400px thumbnail
+    and the responsive variant ladder (VARIANT_SIZES x VARIANT_FORMATS), and
+    strips EXIF metadata (including GPS data) for privacy.
 
     Args:
-        file_bytes: Raw bytes of the uploaded image file.
+        source: Raw bytes of the uploaded image, or the path of a file
+            holding them (preferred: avoids copying the upload in memory).
+        photo_id: ID to store the photo under; a new UUID4 hex when omitted.
 
     Returns:
-        Tuple of (photo_id, width, height, file_size) where photo_id is a
-        UUID4 hex string used as the filename (without extension).
+        ProcessedPhoto describing the saved files.
 
     Raises:
         ValueError: If the image cannot be opened or processed.
     """
-    photo_id = uuid.uuid4().hex
+    photo_id = photo_id or uuid.uuid4().hex
 
     try:
-        img = Image.open(io.BytesIO(file_bytes))
+        if isinstance(source, bytes):
+            header = source[:16]
+        else:
+            with open(source, "rb") as f:
+                header = f.read(16)
+        if sniff_image_type(header) == "image/heic":
+            _register_heif()
+        img = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
     except Exception as exc:
         raise ValueError(f"Cannot open image: {exc}") from exc
 
-    # Fix EXIF rotation (critical for phone photos)
-    img = ImageOps.exif_transpose(img)
+    # Let libjpeg decode at the largest 1/2, 1/4 or 1/8 scale that still
+    # covers the output size: a 48 MP photo never materialises at full size.
+    if DRAFT_DECODE and img.format == "JPEG":
+        img.draft("RGB", _draft_box(img.size, MAX_ORIGINAL_SIZE))
+
+    # Fix EXIF rotation (critical for phone photos); in place to avoid a copy
+    ImageOps.exif_transpose(img, in_place=True)
 
     # Convert to RGB if needed (e.g. RGBA PNGs, palette images)
     if img.mode not in ("RGB", "L"):
@@ -85,17 +301,26 @@ def process_upload(file_bytes: bytes) -> tuple[str, int, int, int]:
     img.save(original_path, "JPEG", quality=ORIGINAL_QUALITY)
     file_size = original_path.stat().st_size
 
-    # Generate thumbnail
-    thumb = img.copy()
-    thumb.thumbnail((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
+    # Variants, each derived from the previous step; the thumbnail comes from
+    # the smallest step that is still at least THUMB_SIZE
+    variants = []
+    thumb_source = img
+    for step in _downscale_steps(img):
+        variants.extend(_save_variant(step, photo_id))
+        if max(step.size) >= THUMB_SIZE:
+            thumb_source = step
+
+    thumb = thumb_source
+    if max(thumb.size) > THUMB_SIZE:
+        thumb = ImageOps.contain(thumb, (THUMB_SIZE, THUMB_SIZE), DERIVED_RESAMPLE)
     thumb_path = THUMBS_DIR / f"{photo_id}.jpg"
     thumb.save(thumb_path, "JPEG", quality=THUMB_QUALITY)
 
-    return photo_id, width, height, file_size
+    return ProcessedPhoto(photo_id, width, height, file_size, variants, perceptual_hash(thumb))
 
 
 def delete_photo_files(photo_id: str):
-    """Delete original and thumbnail files for a photo.
+    """Delete original, thumbnail, variant and pending raw files for a photo.
 
     Args:
         photo_id: UUID hex string identifying the photo.
@@ -104,3 +329,6 @@ def delete_photo_files(photo_id: str):
     thumb_path = THUMBS_DIR / f"{photo_id}.jpg"
     original_path.unlink(missing_ok=True)
     thumb_path.unlink(missing_ok=True)
+    for variant_path in VARIANTS_DIR.glob(f"{photo_id}_*"):
+        variant_path.unlink(missing_ok=True)
+    incoming_path(photo_id).unlink(missing_ok=True)
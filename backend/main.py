@@ -1,49 +1,73 @@
 """FastAPI application entry point for the wedding website backend."""
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import inspect, text
 
-from db import engine, Base
-from image_utils import ensure_dirs as ensure_photo_dirs
+import audit_compaction
+import shared_state
+import vote_audit_buffer
+import vote_scopes
+from async_db import async_engine
+from db import SessionLocal, engine
+from image_utils import PHOTOS_DIR, ensure_dirs as ensure_photo_dirs
+from migrations import upgrade_schema
+from photo_processing import shutdown as shutdown_photo_pool, start_workers, stop_workers
 from routers import rsvp, photos, admin
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-
-def ensure_guest_columns():
-    """Add backward-compatible columns to existing SQLite DBs."""
-    inspector = inspect(engine)
-    if "guests" not in inspector.get_table_names():
-        return
 
-    existing_columns = {column["name"] for column in inspector.get_columns("guests")}
-    statements = []
+def _upgrade_schema() -> None:
+    # One worker process at a time; the others then find the schema current
+    with shared_state.lock("migrations"):
+        upgrade_schema()
 
-    if "attendance_choice" not in existing_columns:
-        statements.append("ALTER TABLE guests ADD COLUMN attendance_choice VARCHAR")
-    if "attend_ceremony" not in existing_columns:
-        statements.append("ALTER TABLE guests ADD COLUMN attend_ceremony BOOLEAN")
-    if "attend_lunch" not in existing_columns:
-        statements.append("ALTER TABLE guests ADD COLUMN attend_lunch BOOLEAN")
-    if "allergens" not in existing_columns:
-        # JSON payload is serialized in SQLite as text.
-        statements.append("ALTER TABLE guests ADD COLUMN allergens TEXT")
 
-    if not statements:
-        return
+def _warm_vote_scopes() -> None:
+    db = SessionLocal()
+    try:
+        vote_scopes.warm(db)
+    finally:
+        db.close()
 
-    with engine.begin() as connection:
-        for stmt in statements:
-            connection.execute(text(stmt))
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare storage and schema, and run the background workers while serving.
 
-ensure_guest_columns()
-ensure_photo_dirs()
-
-app = FastAPI(title="Wedding RSVP API", version="1.0.0")
+    Nothing here runs at import time, so importing the app (tools, tests,
+    uvicorn's reloader) stays cheap.
+    """
+    ensure_photo_dirs()
+    # Counters shared with the other worker processes (WEB_CONCURRENCY > 1)
+    shared_state.attach()
+    # A revision check only; Alembic runs if the database is behind
+    await asyncio.to_thread(_upgrade_schema)
+    # IPs already known to vote for several groups (one index scan)
+    await asyncio.to_thread(_warm_vote_scopes)
+    # Background photo workers (async upload mode only)
+    await start_workers()
+    # Batched vote audit writes (buffered mode only)
+    await vote_audit_buffer.start_flusher()
+    # Vote audit retention (only if VOTE_AUDIT_COMPACT_INTERVAL_HOURS is set)
+    await audit_compaction.start_schedule()
+    yield
+    await audit_compaction.stop_schedule()
+    # Write the audit rows still queued before the engine goes away
+    await vote_audit_buffer.stop_flusher()
+    # Stop photo workers and the processing pool, letting running jobs finish
+    await stop_workers()
+    shutdown_photo_pool()
+    # Closing the last connection checkpoints the SQLite WAL into wedding.db,
+    # which matters when only that file is mounted from the host.
+    engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+app = FastAPI(title="Wedding RSVP API", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS for frontend
 app.add_middleware(
@@ -64,8 +88,9 @@ app.include_router(rsvp.router)
 app.include_router(photos.router)
 app.include_router(admin.router)
 
-# Serve uploaded photos directly (used in dev; nginx serves them in prod)
-app.mount("/photos", StaticFiles(directory="/data/photos"), name="photos")
+# Serve uploaded photos directly (used in dev; nginx serves them in prod).
+# The directory is created by the lifespan, after this runs.
+app.mount("/photos", StaticFiles(directory=PHOTOS_DIR, check_dir=False), name="photos")
 
 
 @app.get("/")
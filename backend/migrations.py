@@ -0,0 +1,69 @@
+"""Bring the database schema up to date at startup.
+
+Equivalent to `alembic upgrade head`, but cheaper on the common path: the
+database's revision is compared with the head of `alembic/versions` first
+(one query), and Alembic only runs when the database is behind.
+
+Usage:
+    python migrations.py
+"""
+
+import logging
+from pathlib import Path
+
+from sqlalchemy.engine import Engine
+
+from db import adopt_legacy_database, engine
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_DIR = Path(__file__).resolve().parent / "alembic"
+
+
+def _alembic_config(bind: Engine):
+    """Alembic config for `bind`, without alembic.ini's logging setup."""
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIR))
+    url = bind.url.render_as_string(hide_password=False)
+    config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    return config
+
+
+def upgrade_schema(bind: Engine = engine) -> bool:
+    """Upgrade the database to the latest revision if it is behind.
+
+    For the app's own database, first copies the database of an earlier
+    deployment into place if there is one (see `db.adopt_legacy_database`).
+
+    Args:
+        bind: Engine of the database to migrate.
+
+    Returns:
+        True if migrations ran, False if the schema was already current.
+    """
+    if bind is engine and adopt_legacy_database():
+        logger.warning("Copied the legacy database to %s", engine.url.database)
+    # Imported here so that importing the app doesn't pay for Alembic
+    from alembic import command
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    config = _alembic_config(bind)
+    head = ScriptDirectory.from_config(config).get_current_head()
+    with bind.connect() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+    if current == head:
+        return False
+    command.upgrade(config, "head")
+    # A migration rebuilding `photos` (render_as_batch) drops its search triggers
+    from photo_search import ensure_search_index
+
+    ensure_search_index(bind)
+    return True
+
+
+if __name__ == "__main__":
+    upgraded = upgrade_schema()
+    print("Database schema upgraded" if upgraded else "Database schema is current")
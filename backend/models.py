@@ -1,7 +1,7 @@
 """SQLAlchemy database models for the wedding RSVP system."""
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, JSON
 from sqlalchemy.orm import relationship
 
 from db import Base
@@ -70,6 +70,17 @@ class Photo(Base):
         file_size: Size of the processed file in bytes
         width: Width of the processed image in pixels
         height: Height of the processed image in pixels
+        variants: Responsive variants as [{"format", "width", "height"}, ...]
+        content_hash: SHA-256 of the uploaded file, for duplicate detection
+        perceptual_hash: dHash of the processed image, for near-duplicate detection
+        status: Processing state: "pending", "processing", "ready", "failed"
+            or "duplicate"
+        status_detail: Reason for a failed processing attempt, or the ID of
+            the existing photo for a duplicate
+        claimed_at: When a background worker took the photo for processing
+            (async upload mode)
+        search_id: Stable integer key of the photo in the `photos_fts`
+            search index (SQLite), set by its insert trigger
         created_at: Timestamp when the photo was uploaded
     """
     __tablename__ = "photos"
@@ -82,16 +93,57 @@ class Photo(Base):
     file_size = Column(Integer, nullable=False)
     width = Column(Integer, nullable=True)
     height = Column(Integer, nullable=True)
+    variants = Column(JSON, nullable=True, default=list)
+    content_hash = Column(String, nullable=True, index=True)
+    perceptual_hash = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="ready", server_default="ready")
+    status_detail = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    search_id = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Backs the gallery listing: ready photos ordered by (created_at, id)
+    __table_args__ = (
+        Index("ix_photos_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_photos_search_id", "search_id", unique=True),
+    )
+
 
 class VoteAudit(Base):
     """Tracks RSVP updates by client IP to detect multi-group voting."""
     __tablename__ = "vote_audits"
 
     id = Column(Integer, primary_key=True, index=True)
-    ip_address = Column(String, nullable=False, index=True)
+    ip_address = Column(String, nullable=False)
     scope_type = Column(String, nullable=False)  # "family" or "guest"
     scope_id = Column(Integer, nullable=False)
     guest_id = Column(Integer, ForeignKey("guests.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Backs the multi-group check: the lowest and highest scope an IP voted
+    # for are one index seek each, however many votes it sent
+    __table_args__ = (
+        Index("ix_vote_audits_ip_scope", "ip_address", "scope_type", "scope_id"),
+    )
+
+
+class VoteAuditSummary(Base):
+    """Votes of one IP for one family or guest, rolled up from compacted `VoteAudit` rows.
+
+    Written by `audit_compaction`; the raw rows go to the on-disk archive.
+    """
+    __tablename__ = "vote_audit_summaries"
+
+    id = Column(Integer, primary_key=True)
+    ip_address = Column(String, nullable=False)
+    scope_type = Column(String, nullable=False)
+    scope_id = Column(Integer, nullable=False)
+    votes = Column(Integer, nullable=False)
+    first_seen = Column(DateTime, nullable=False)
+    last_seen = Column(DateTime, nullable=False)
+
+    # One row per (ip, scope); also serves the multi-group check like
+    # ix_vote_audits_ip_scope does for the raw rows
+    __table_args__ = (
+        Index("ix_vote_audit_summaries_ip_scope", "ip_address", "scope_type", "scope_id", unique=True),
+    )
@@ -0,0 +1,441 @@
+"""Execution of CPU-bound photo processing off the event loop.
+
+`image_utils.process_upload` decodes, resizes and re-encodes images, which
+takes hundreds of milliseconds per photo. Running it inline in an async
+endpoint stalls every other request, so uploads are dispatched to an
+executor instead. The mode is selected with `PHOTO_EXECUTOR`:
+
+- ``process`` (default): a `ProcessPoolExecutor` that scales across cores
+- ``thread``: a `ThreadPoolExecutor` (Pillow releases the GIL while resizing)
+- ``inline``: run in the calling coroutine (legacy behaviour, useful for debugging)
+
+With `PHOTO_UPLOAD_MODE=async` uploads are accepted before processing: the
+raw file is written to `image_utils.INCOMING_DIR`, a `Photo` row is created
+in the ``pending`` state and background workers process it. The photos
+table is the queue: a worker claims the oldest pending photo with one
+UPDATE, so with several backend processes each photo is processed once,
+whichever process accepted it. The accepting process wakes its own
+workers; idle workers of the other processes look for work every
+`PHOTO_QUEUE_POLL_INTERVAL` seconds. A photo whose worker died while
+processing it (``processing`` for more than `PHOTO_CLAIM_TIMEOUT` seconds)
+is claimed again.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+
+import image_utils
+import shared_state
+from db import SessionLocal
+from image_utils import ProcessedPhoto
+from models import Photo
+
+logger = logging.getLogger(__name__)
+
+PHOTO_EXECUTOR = os.getenv("PHOTO_EXECUTOR", "process")
+# Per backend process: the cores are shared with the other workers
+PHOTO_WORKERS = int(os.getenv(
+    "PHOTO_WORKERS", str(min(4, max(1, (os.cpu_count() or 1) // shared_state.WEB_CONCURRENCY)))
+))
+# Max jobs running or waiting in the executor before uploads are rejected with 503.
+PHOTO_QUEUE_MAX = int(os.getenv("PHOTO_QUEUE_MAX", str(PHOTO_WORKERS * 4)))
+PHOTO_UPLOAD_MODE = os.getenv("PHOTO_UPLOAD_MODE", "sync")
+# Max accepted uploads waiting for a background worker in async mode.
+PHOTO_PENDING_MAX = int(os.getenv("PHOTO_PENDING_MAX", "500"))
+# Seconds between queue checks of idle workers; uploads to the same process wake them at once
+PHOTO_QUEUE_POLL_INTERVAL = float(os.getenv(
+    "PHOTO_QUEUE_POLL_INTERVAL", "1" if shared_state.multi_process() else "30"
+))
+# Seconds after which a photo still "processing" is taken back from its worker
+PHOTO_CLAIM_TIMEOUT = float(os.getenv("PHOTO_CLAIM_TIMEOUT", "600"))
+# Also treat uploads whose perceptual hash differs by at most
+# PHOTO_DEDUP_PERCEPTUAL_DISTANCE bits as duplicates (re-encoded/resized copies).
+PHOTO_DEDUP_PERCEPTUAL = os.getenv("PHOTO_DEDUP_PERCEPTUAL", "0") == "1"
+PHOTO_DEDUP_PERCEPTUAL_DISTANCE = int(os.getenv("PHOTO_DEDUP_PERCEPTUAL_DISTANCE", "4"))
+
+
+class ProcessingBusyError(Exception):
+    """Raised when the processing queue is full and the upload should be retried."""
+
+
+_executor: Executor | None = None
+_executor_lock = threading.Lock()
+_in_flight = 0
+
+# Photos claimed by this process's workers and not finished yet
+_claimed: set[str] = set()
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+_worker_tasks: list[asyncio.Task] = []
+
+
+def _get_executor() -> Executor | None:
+    """Return the shared executor, creating it on first use."""
+    global _executor
+    if PHOTO_EXECUTOR == "inline":
+        return None
+    with _executor_lock:
+        if _executor is None:
+            if PHOTO_EXECUTOR == "thread":
+                _executor = ThreadPoolExecutor(
+                    max_workers=PHOTO_WORKERS, thread_name_prefix="photo"
+                )
+            else:
+                # Spawn instead of fork: the server process holds DB connections
+                # and event loop state that must not leak into the workers.
+                _executor = ProcessPoolExecutor(
+                    max_workers=PHOTO_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return _executor
+
+
+async def _execute(
+    source: bytes | Path, photo_id: str | None = None
+) -> ProcessedPhoto:
+    """Run `process_upload` on the executor without any backpressure check."""
+    executor = _get_executor()
+    if executor is None:
+        return image_utils.process_upload(source, photo_id)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(executor, image_utils.process_upload, source, photo_id)
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        raise
+
+
+def _discard_executor(executor: Executor):
+    """Drop a broken executor, so that the next job starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_process_upload(
+    source: bytes | Path, photo_id: str | None = None
+) -> ProcessedPhoto:
+    """Run `image_utils.process_upload` on the configured executor.
+
+    Args:
+        source: Raw image bytes or, preferably, the path of the saved upload
+            (only the path is sent to worker processes).
+        photo_id: ID to store the photo under; a new UUID4 hex when omitted.
+
+    Returns:
+        ProcessedPhoto describing the saved files.
+
+    Raises:
+        ProcessingBusyError: If `PHOTO_QUEUE_MAX` jobs are already in flight.
+        ValueError: If the image cannot be opened or processed.
+    """
+    global _in_flight
+    if _in_flight >= PHOTO_QUEUE_MAX:
+        raise ProcessingBusyError("Photo processing queue is full")
+
+    _in_flight += 1
+    try:
+        return await _execute(source, photo_id)
+    finally:
+        _in_flight -= 1
+
+
+def queue_depth() -> int:
+    """Number of processing jobs of this process currently running or waiting."""
+    return _in_flight + len(_claimed)
+
+
+def async_mode_enabled() -> bool:
+    """Whether uploads are accepted first and processed by background workers."""
+    return PHOTO_UPLOAD_MODE == "async"
+
+
+def check_queue_capacity():
+    """Check that another upload can be queued, before saving it; blocking.
+
+    Raises:
+        ProcessingBusyError: If `PHOTO_PENDING_MAX` photos are already waiting.
+    """
+    if not _worker_tasks:
+        raise RuntimeError("Photo workers are not running")
+    db = SessionLocal()
+    try:
+        waiting = db.scalar(select(func.count()).select_from(Photo).where(Photo.status == "pending"))
+    finally:
+        db.close()
+    if waiting >= PHOTO_PENDING_MAX:
+        raise ProcessingBusyError("Photo processing queue is full")
+
+
+def notify_workers():
+    """Wake this process's workers for a pending photo just committed; callable from any thread."""
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def find_duplicate(
+    db: Session, content_hash: str | None = None, perceptual_hash: str | None = None
+) -> Photo | None:
+    """Return an existing photo with the same content (or a similar perceptual) hash.
+
+    Content hashes are looked up through their index. The index isn't
+    unique and nothing locks between this lookup and the insert of the new
+    photo: two identical uploads racing each other can both be stored. Only
+    the gallery shows the copy, so it is left to the admin to delete.
+
+    Perceptual hashes are only compared when PHOTO_DEDUP_PERCEPTUAL is on,
+    by Hamming distance against every ready photo (`nearest_perceptual`).
+    That is O(photos) work: async callers should run this in a thread, or
+    compare off the event loop themselves. Failed and duplicate photos
+    never match, so a failed upload can be retried.
+
+    Args:
+        db: Database session.
+        content_hash: SHA-256 of the uploaded file.
+        perceptual_hash: dHash of the processed image.
+
+    Returns:
+        The oldest matching Photo, or None.
+    """
+    if content_hash:
+        return (
+            db.query(Photo)
+            .filter(
+                Photo.content_hash == content_hash,
+                Photo.status.in_(("pending", "processing", "ready")),
+            )
+            .order_by(Photo.created_at)
+            .first()
+        )
+    if perceptual_hash and PHOTO_DEDUP_PERCEPTUAL:
+        photo_id = nearest_perceptual(perceptual_candidates(db), perceptual_hash)
+        if photo_id is not None:
+            return db.query(Photo).filter(Photo.id == photo_id).first()
+    return None
+
+
+def perceptual_candidates(db: Session) -> list[tuple[str, str]]:
+    """IDs and perceptual hashes of the ready photos, oldest first."""
+    return [
+        tuple(row) for row in db.query(Photo.id, Photo.perceptual_hash)
+        .filter(Photo.perceptual_hash.isnot(None), Photo.status == "ready")
+        .order_by(Photo.created_at)
+    ]
+
+
+def nearest_perceptual(candidates: list[tuple[str, str]], perceptual_hash: str) -> str | None:
+    """ID of the first candidate within PHOTO_DEDUP_PERCEPTUAL_DISTANCE bits of `perceptual_hash`.
+
+    Args:
+        candidates: (id, perceptual hash) pairs from `perceptual_candidates`.
+        perceptual_hash: dHash of the processed image.
+
+    Returns:
+        The photo ID, or None if no candidate is close enough.
+    """
+    target = int(perceptual_hash, 16)
+    for photo_id, other in candidates:
+        if (int(other, 16) ^ target).bit_count() <= PHOTO_DEDUP_PERCEPTUAL_DISTANCE:
+            return photo_id
+    return None
+
+
+def _set_status(photo_id: str, status: str, **fields):
+    """Update the processing state (and optional metadata) of a photo row."""
+    db = SessionLocal()
+    try:
+        db.query(Photo).filter(Photo.id == photo_id).update({"status": status, **fields})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _finish(photo_id: str, result: ProcessedPhoto):
+    """Mark a processed photo ready, or as a duplicate of a perceptually equal one."""
+    db = SessionLocal()
+    try:
+        duplicate = find_duplicate(db, perceptual_hash=result.perceptual_hash)
+        photo = db.query(Photo).filter(Photo.id == photo_id).first()
+        if photo is None:
+            return
+        if duplicate is not None and duplicate.id != photo_id:
+            image_utils.delete_photo_files(photo_id)
+            photo.status = "duplicate"
+            photo.status_detail = duplicate.id
+        else:
+            photo.status = "ready"
+            photo.status_detail = None
+            photo.width = result.width
+            photo.height = result.height
+            photo.file_size = result.file_size
+            photo.variants = result.variants
+            photo.perceptual_hash = result.perceptual_hash
+        ready = photo.status == "ready"
+        db.commit()
+    finally:
+        db.close()
+    if ready:
+        # Gallery totals cached by every process
+        shared_state.bump("photos")
+
+
+def _claim() -> str | None:
+    """Take the oldest queued photo for this worker.
+
+    Queued photos are the pending ones and those still processing after
+    PHOTO_CLAIM_TIMEOUT (or since before claims were recorded).
+
+    Returns:
+        The ID of the claimed photo, now "processing", or None if none is queued.
+    """
+    now = datetime.utcnow()
+    claimable = or_(
+        Photo.status == "pending",
+        and_(
+            Photo.status == "processing",
+            or_(Photo.claimed_at.is_(None), Photo.claimed_at < now - timedelta(seconds=PHOTO_CLAIM_TIMEOUT)),
+        ),
+    )
+    db = SessionLocal()
+    try:
+        oldest = select(Photo.id).where(claimable).order_by(Photo.created_at).limit(1)
+        if db.get_bind().dialect.name == "postgresql":
+            oldest = oldest.with_for_update(skip_locked=True)
+        # `claimable` again: of two workers picking the same photo, only one updates it
+        photo_id = db.execute(
+            update(Photo)
+            .where(Photo.id == oldest.scalar_subquery(), claimable)
+            .values(status="processing", claimed_at=now)
+            .returning(Photo.id)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        db.commit()
+        return photo_id
+    finally:
+        db.close()
+
+
+async def _process_pending(photo_id: str):
+    """Process one claimed upload and record the outcome on its `Photo` row.
+
+    Any error marks the photo failed, and the raw upload is always deleted:
+    a photo that can't be processed must not be claimed again and again. If
+    even the failure can't be recorded, the row is reclaimed after
+    PHOTO_CLAIM_TIMEOUT and fails then, its raw file being gone.
+    """
+    raw_path = image_utils.incoming_path(photo_id)
+    if not raw_path.exists():
+        await asyncio.to_thread(
+            _set_status, photo_id, "failed", status_detail="Upload lost before processing"
+        )
+        return
+    try:
+        result = await _execute(raw_path, photo_id)
+        await asyncio.to_thread(_finish, photo_id, result)
+    except (OSError, ValueError) as exc:
+        logger.warning("Processing photo %s failed: %s", photo_id, exc)
+        await _fail(photo_id, str(exc))
+    except Exception:
+        logger.exception("Unexpected error processing photo %s", photo_id)
+        await _fail(photo_id, "Unexpected error while processing the photo")
+    # Not when cancelled: `stop_workers` puts the photo back in the queue
+    raw_path.unlink(missing_ok=True)
+
+
+async def _fail(photo_id: str, detail: str):
+    """Mark a photo failed and delete the files written for it so far."""
+    await asyncio.to_thread(image_utils.delete_photo_files, photo_id)
+    try:
+        await asyncio.to_thread(_set_status, photo_id, "failed", status_detail=detail)
+    except Exception:
+        logger.exception("Marking photo %s failed did not work either", photo_id)
+
+
+async def _worker():
+    """Claim and process queued photos forever."""
+    while True:
+        # Cleared before looking, so a wakeup for a photo committed meanwhile isn't lost
+        _wakeup.clear()
+        try:
+            photo_id = await asyncio.to_thread(_claim)
+        except Exception:
+            logger.exception("Claiming a queued photo failed")
+            photo_id = None
+        if photo_id is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=PHOTO_QUEUE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        _claimed.add(photo_id)
+        try:
+            await _process_pending(photo_id)
+        except Exception:
+            logger.exception("Unexpected error processing photo %s", photo_id)
+        # Left in `_claimed` when cancelled, for `stop_workers` to release
+        _claimed.discard(photo_id)
+
+
+def _release(photo_ids: list[str]):
+    """Put photos whose processing was interrupted back in the queue."""
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Photo)
+            .where(Photo.id.in_(photo_ids), Photo.status == "processing")
+            .values(status="pending", claimed_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def start_workers():
+    """Start the background workers (async mode only).
+
+    Photos left pending by a previous run are simply claimed; those left
+    processing once PHOTO_CLAIM_TIMEOUT has passed.
+    """
+    global _loop, _wakeup
+    if not async_mode_enabled() or _worker_tasks:
+        return
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    for _ in range(PHOTO_WORKERS):
+        _worker_tasks.append(asyncio.create_task(_worker()))
+
+
+async def stop_workers():
+    """Cancel the background workers and put the photos they were processing back in the queue."""
+    global _loop, _wakeup
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
+    _loop = _wakeup = None
+    if _claimed:
+        await asyncio.to_thread(_release, list(_claimed))
+        _claimed.clear()
+
+
+def shutdown():
+    """Shut down the executor, waiting for running jobs to finish."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
@@ -0,0 +1,166 @@
+"""Full-text search over photo uploader names and captions.
+
+On SQLite the `photos_fts` FTS5 table indexes `uploader_name` and `caption`
+of every photo. Triggers on `photos` keep it in sync on insert, update and
+delete, so no application code has to maintain it. The ``unicode61``
+tokenizer with ``remove_diacritics 2`` makes "Nicolò" match "nicolo", and
+prefix indexes keep search-as-you-type queries ("giu" for "Giulia") cheap.
+
+Databases without FTS5 (or not on SQLite) fall back to ``ILIKE '%term%'``.
+"""
+
+import logging
+import re
+
+from sqlalchemy import column, inspect, literal_column, or_, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from models import Photo
+
+logger = logging.getLogger(__name__)
+
+# External-content table: the index points at photos.search_id and reads
+# the text back from `photos`, so nothing is stored twice and deletes are
+# O(1). Not at photos.rowid: VACUUM may renumber it (the primary key is a
+# string), and a table rebuild by a migration would too. search_id is an
+# ordinary column, copied as is; the insert trigger sets it, one above the
+# highest so far (one seek in ix_photos_search_id).
+SEARCH_INDEX_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS photos_fts USING fts5(
+        uploader_name,
+        caption,
+        content = 'photos',
+        content_rowid = 'search_id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS photos_fts_insert AFTER INSERT ON photos BEGIN
+        UPDATE photos SET search_id = (SELECT COALESCE(MAX(search_id), 0) + 1 FROM photos)
+        WHERE rowid = new.rowid AND new.search_id IS NULL;
+        INSERT INTO photos_fts (rowid, uploader_name, caption)
+        SELECT search_id, uploader_name, caption FROM photos WHERE rowid = new.rowid;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS photos_fts_delete AFTER DELETE ON photos BEGIN
+        INSERT INTO photos_fts (photos_fts, rowid, uploader_name, caption)
+        VALUES ('delete', old.search_id, old.uploader_name, old.caption);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS photos_fts_update AFTER UPDATE OF uploader_name, caption ON photos BEGIN
+        INSERT INTO photos_fts (photos_fts, rowid, uploader_name, caption)
+        VALUES ('delete', old.search_id, old.uploader_name, old.caption);
+        INSERT INTO photos_fts (rowid, uploader_name, caption)
+        VALUES (new.search_id, new.uploader_name, new.caption);
+    END
+    """,
+)
+# Re-reads every photo
+SEARCH_INDEX_REBUILD = "INSERT INTO photos_fts (photos_fts) VALUES ('rebuild')"
+
+_photos_fts = table("photos_fts", column("rowid"))
+# Search availability per database URL, filled on first use
+_fts_available: dict[str, bool] = {}
+_TERM_RE = re.compile(r"\w+")
+
+
+def ensure_search_index(engine: Engine) -> bool:
+    """Create and backfill the FTS index if the database supports it.
+
+    Also re-creates its triggers if they are missing: a migration rebuilding
+    the `photos` table (``render_as_batch``) drops them.
+
+    Args:
+        engine: Engine of the database holding `photos`.
+
+    Returns:
+        True if full-text search is available.
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    existed = "photos_fts" in inspect(engine).get_table_names()
+    try:
+        with engine.begin() as connection:
+            # Photos inserted while the triggers were missing
+            connection.execute(text(
+                "UPDATE photos SET search_id = rowid + (SELECT COALESCE(MAX(search_id), 0) FROM photos) "
+                "WHERE search_id IS NULL"
+            ))
+            for statement in SEARCH_INDEX_DDL:
+                connection.execute(text(statement))
+            if not existed:
+                connection.execute(text(SEARCH_INDEX_REBUILD))
+    except OperationalError as exc:  # sqlite3 built without FTS5
+        logger.warning("Photo full-text search unavailable, using ILIKE: %s", exc)
+        _fts_available[str(engine.url)] = False
+        return False
+    _fts_available[str(engine.url)] = True
+    return True
+
+
+def rebuild_search_index(engine: Engine):
+    """Re-index every photo, e.g. after photos were changed while the triggers were missing.
+
+    Args:
+        engine: Engine of the database holding `photos`.
+    """
+    if ensure_search_index(engine):
+        with engine.begin() as connection:
+            connection.execute(text(SEARCH_INDEX_REBUILD))
+
+
+def _search_available(db: Session) -> bool:
+    """Whether the `photos_fts` table exists in the session's database."""
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _fts_available:
+        _fts_available[key] = (
+            bind.dialect.name == "sqlite"
+            and "photos_fts" in inspect(bind).get_table_names()
+        )
+    return _fts_available[key]
+
+
+def fts_query(search: str) -> str | None:
+    """Turn free text into an FTS5 query matching every word as a prefix.
+
+    Args:
+        search: Text typed in the gallery search box.
+
+    Returns:
+        Query such as ``"giulia"* AND "rossi"*``, or None if `search` has no words.
+    """
+    terms = _TERM_RE.findall(search)
+    if not terms:
+        return None
+    return " AND ".join(f'"{term}"*' for term in terms)
+
+
+def search_condition(db: Session, search: str):
+    """Build a filter on `Photo` matching `search` in uploader name or caption.
+
+    Args:
+        db: Database session (to check whether the FTS index exists).
+        search: Text typed in the gallery search box.
+
+    Returns:
+        SQLAlchemy condition for `Query.filter`.
+    """
+    match = fts_query(search)
+    if match and _search_available(db):
+        matching_rowids = select(_photos_fts.c.rowid).where(
+            literal_column("photos_fts").op("MATCH")(match)
+        )
+        return Photo.search_id.in_(matching_rowids)
+
+    pattern = f"%{search}%"
+    return or_(
+        Photo.uploader_name.ilike(pattern),
+        Photo.caption.ilike(pattern),
+    )
@@ -0,0 +1,311 @@
+"""Sliding-window rate limiting for the upload and RSVP endpoints.
+
+Each limiter allows `limit` hits per `window` seconds and key (client IP).
+It uses the sliding window counter: hits are counted in fixed windows, and
+the count of the previous window is weighted by how much of it still
+overlaps the sliding window ending now. That needs three numbers per key
+and O(1) work per hit, where a log of timestamps grows with the limit.
+Rejected hits are not counted.
+
+The counters live in a backend, selected with `RATE_LIMIT_BACKEND`
+(default: ``memory``, ``sqlite`` with several worker processes):
+
+- ``memory``: per process, in an LRU map of at most
+  `RATE_LIMIT_MAX_KEYS` keys. Idle keys are dropped once their windows are
+  over, the least recently seen first when the map is full
+- ``sqlite``: a small SQLite file (`RATE_LIMIT_SQLITE_PATH`, not the app
+  database; by default in `SHARED_STATE_DIR`) shared by every worker
+  process on the host
+- ``redis``: a Redis-compatible server (Redis, Valkey, KeyDB) at
+  `RATE_LIMIT_REDIS_URL`, shared across hosts; needs the ``redis`` package
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import shared_state
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sqlite" if shared_state.multi_process() else "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", str(shared_state.SHARED_STATE_DIR / "rate_limits.db"))
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a key is over its limit.
+
+    Attributes:
+        retry_after: Seconds until the next hit would be allowed.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def sliding_window(
+    state: tuple[int, int, int] | None, limit: int, window: float, now: float
+) -> tuple[tuple[int, int, int] | None, float]:
+    """Apply one hit to a key's counters.
+
+    Args:
+        state: (window index, hits in the previous window, hits in the
+            current one) of the last hit, or None for a new key.
+        limit: Hits allowed per window.
+        window: Window length in seconds.
+        now: Current time in seconds.
+
+    Returns:
+        The new state (None if the hit is rejected: the state is unchanged)
+        and the seconds to wait (0 if the hit is allowed).
+    """
+    index = int(now // window)
+    offset = now - index * window
+    previous = current = 0
+    if state is not None:
+        if state[0] == index:
+            previous, current = state[1], state[2]
+        elif state[0] == index - 1:
+            previous = state[2]
+
+    if previous * (1 - offset / window) + current + 1 <= limit:
+        return (index, previous, current + 1), 0.0
+
+    # Rejected: wait until the previous window's weight has decayed enough
+    if current + 1 > limit:
+        # Not before the next window, where `current` becomes the previous count
+        wait_fraction = 1 - (limit - 1) / current
+        retry_after = window - offset + window * wait_fraction
+    else:
+        wait_fraction = 1 - (limit - 1 - current) / previous
+        retry_after = window * wait_fraction - offset
+    # Never 0, which means allowed
+    return None, max(retry_after, 0.001)
+
+
+class MemoryBackend:
+    """Counters of this process, in an LRU map bounded to `max_keys` keys."""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # {key: (window index, previous, current, window)}, least recent first
+        self._entries: OrderedDict[str, tuple[int, int, int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> float:
+        """Count a hit for `key` if allowed; return the seconds to wait (0 if allowed)."""
+        entries = self._entries
+        with self._lock:
+            state, retry_after = sliding_window(entries.get(key), limit, window, now)
+            if state is not None:
+                entries[key] = (*state, window)
+                entries.move_to_end(key)
+                self._evict(now)
+            return retry_after
+
+    def _evict(self, now: float) -> None:
+        """Drop expired keys from the LRU end, then the least recent ones over `max_keys`."""
+        entries = self._entries
+        while entries:
+            key = next(iter(entries))
+            index, _, _, window = entries[key]
+            # Both counts are zero once the window after the last hit is over
+            if (index + 2) * window > now and len(entries) <= self.max_keys:
+                break
+            del entries[key]
+            self.evicted += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """Counters in a SQLite file, shared by the processes of one host.
+
+    Each hit is one short IMMEDIATE transaction on the file; expired keys
+    are deleted every `cleanup_every` hits.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = RATE_LIMIT_SQLITE_PATH, cleanup_every: int = 1000):
+        self.path = path
+        self.cleanup_every = cleanup_every
+        self._local = threading.local()
+        self._hits = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Counters: losing the last writes to a power cut is fine
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                " key TEXT PRIMARY KEY, window_index INTEGER NOT NULL,"
+                " previous INTEGER NOT NULL, current INTEGER NOT NULL, expires_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_rate_limits_expires_at ON rate_limits (expires_at)")
+            self._local.connection = connection
+        return connection
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> float:
+        """Count a hit for `key` if allowed; return the seconds to wait (0 if allowed)."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT window_index, previous, current FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            state, retry_after = sliding_window(row, limit, window, now)
+            if state is not None:
+                connection.execute(
+                    "INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?, ?, ?)",
+                    (key, *state, (state[0] + 2) * window),
+                )
+            self._hits += 1
+            if self._hits % self.cleanup_every == 0:
+                connection.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return retry_after
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT count(*) FROM rate_limits").fetchone()[0]
+
+
+# KEYS[1]: counter hash; ARGV: limit, window, now. Same arithmetic as
+# `sliding_window`, run atomically on the server. Returns
+# {allowed (0/1), previous, current, offset} for the retry computation.
+_REDIS_HIT = """
+local limit, window, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local index = math.floor(now / window)
+local offset = now - index * window
+local state = redis.call('HMGET', KEYS[1], 'i', 'p', 'c')
+local previous, current = 0, 0
+if state[1] then
+    local last = tonumber(state[1])
+    if last == index then
+        previous, current = tonumber(state[2]), tonumber(state[3])
+    elseif last == index - 1 then
+        previous = tonumber(state[3])
+    end
+end
+if previous * (1 - offset / window) + current + 1 <= limit then
+    redis.call('HSET', KEYS[1], 'i', index, 'p', previous, 'c', current + 1)
+    redis.call('PEXPIREAT', KEYS[1], math.ceil((index + 2) * window * 1000))
+    return {1, previous, current + 1, tostring(offset)}
+end
+return {0, previous, current, tostring(offset)}
+"""
+
+
+class RedisBackend:
+    """Counters on a Redis-compatible server, updated by a Lua script; keys expire by TTL."""
+
+    name = "redis"
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis package (pip install redis)") from exc
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_HIT)
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> float:
+        """Count a hit for `key` if allowed; return the seconds to wait (0 if allowed)."""
+        allowed, previous, current, offset = self._script(keys=[f"rate_limit:{key}"], args=[limit, window, now])
+        if allowed:
+            return 0.0
+        # Recompute the wait locally from the server's counters
+        index = math.floor(now / window)
+        _, retry_after = sliding_window((index, int(previous), int(current)), limit, window,
+                                        index * window + float(offset))
+        return retry_after
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._client.scan_iter("rate_limit:*"))
+
+
+BACKENDS = {"memory": MemoryBackend, "sqlite": SQLiteBackend, "redis": RedisBackend}
+
+_backend = None
+_backend_lock = threading.Lock()
+_limiters: list["RateLimiter"] = []
+
+
+def get_backend():
+    """The backend selected by RATE_LIMIT_BACKEND, created on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if RATE_LIMIT_BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {RATE_LIMIT_BACKEND}")
+            _backend = BACKENDS[RATE_LIMIT_BACKEND]()
+        return _backend
+
+
+class RateLimiter:
+    """Allow `limit` hits per `window` seconds per key.
+
+    Args:
+        name: Prefix of the keys, so limiters can share a backend.
+        limit: Hits allowed per window; 0 disables the limiter.
+        window: Window length in seconds.
+        backend: Where the counters live (default: `get_backend()`).
+    """
+
+    def __init__(self, name: str, limit: int, window: float, backend=None):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self._backend = backend
+        self.allowed = 0
+        self.rejected = 0
+        _limiters.append(self)
+
+    @property
+    def backend(self):
+        return self._backend or get_backend()
+
+    def check(self, key: str) -> None:
+        """Count a hit for `key`.
+
+        Raises:
+            RateLimitExceeded: If `key` is over the limit; the hit isn't counted.
+        """
+        if self.limit <= 0:
+            return
+        retry_after = self.backend.hit(f"{self.name}:{key}", self.limit, self.window, time.time())
+        if retry_after:
+            self.rejected += 1
+            raise RateLimitExceeded(retry_after)
+        self.allowed += 1
+
+
+def stats() -> dict:
+    """Hits per limiter of this process, for the admin metrics endpoint."""
+    result = {"backend": RATE_LIMIT_BACKEND}
+    if isinstance(_backend, MemoryBackend):
+        result |= {"keys": len(_backend), "max_keys": _backend.max_keys, "evicted": _backend.evicted}
+    for limiter in _limiters:
+        result[limiter.name] = {
+            "limit": limiter.limit,
+            "window": limiter.window,
+            "allowed": limiter.allowed,
+            "rejected": limiter.rejected,
+        }
+    return result
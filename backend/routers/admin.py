@@ -1,14 +1,25 @@
 """Admin API endpoints for managing the guest list and families."""
 
 import os
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Header, status
-from sqlalchemy.orm import Session
+from types import SimpleNamespace
+from typing import Annotated, Literal
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session, joinedload
 
+import rate_limit
+import shared_state
+import vote_audit_buffer
+import vote_scopes
 from db import get_db
-from models import Family, Guest
-from routers.rsvp import _apply_attendance_flags
+from exports import csv_chunks, guest_rows, xlsx_chunks
+from models import Family, Guest, VoteAudit, VoteAuditSummary
+from routers.rsvp import _apply_attendance_flags, response_cache_stats
 from schemas import (
+    AdminBatchRequest,
+    AdminBatchResponse,
+    AdminBatchResult,
     AdminDataResponse,
     AdminGuestResponse,
     AdminGuestUpdate,
@@ -33,13 +44,35 @@ async def verify_admin(x_admin_password: Annotated[str | None, Header()] = None)
     return True
 
 
+def _set_guest_fields(guest: Guest, fields: dict) -> None:
+    """Set the fields of an `AdminGuestUpdate` on `guest`.
+
+    Per-event attendance goes through the shared logic of the rsvp router,
+    which also derives the legacy `attending`/`attendance_choice` fields.
+
+    Args:
+        guest: Guest to update, or a plain object with its fields
+        fields: Fields set in the update, from `model_dump(exclude_unset=True)`
+    """
+    fields = dict(fields)
+    if "attend_ceremony" in fields or "attend_lunch" in fields:
+        next_ceremony = fields.pop("attend_ceremony", guest.attend_ceremony)
+        next_lunch = fields.pop("attend_lunch", guest.attend_lunch)
+        _apply_attendance_flags(guest, next_ceremony, next_lunch)
+        # Derived from the per-event flags above
+        fields.pop("attending", None)
+
+    for field, value in fields.items():
+        setattr(guest, field, value)
+
+
 @router.get("/data", response_model=AdminDataResponse)
 def get_admin_data(
     admin: bool = Depends(verify_admin),
     db: Session = Depends(get_db)
 ):
     """Get all families and individual guests with full details."""
-    families = db.query(Family).all()
+    families = db.query(Family).options(joinedload(Family.guests)).all()
     individuals = db.query(Guest).filter(Guest.family_id.is_(None)).all()
     return {
         "families": families,
@@ -47,6 +80,47 @@ def get_admin_data(
     }
 
 
+EXPORT_FORMATS = {
+    "csv": ("text/csv", csv_chunks),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", xlsx_chunks),
+}
+
+
+@router.get("/export")
+def export_guests(
+    format: Literal["csv", "xlsx"] = Query("csv"),
+    admin: bool = Depends(verify_admin),
+    db: Session = Depends(get_db)
+):
+    """Download every guest with their RSVP (per event, allergens, notes) as CSV or XLSX.
+
+    The file is streamed while the guests are read, batch by batch, instead
+    of being built in memory first.
+    """
+    media_type, encode = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        encode(guest_rows(db)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="rsvp.{format}"'},
+    )
+
+
+@router.get("/metrics")
+def get_metrics(admin: bool = Depends(verify_admin)):
+    """Cache counters of the public read endpoints and the vote check, the audit queue and rate limits.
+
+    Counters are those of the worker process that answers, except
+    `shared_state` (common to all of them) and sqlite/redis rate limits.
+    """
+    return {
+        "shared_state": shared_state.stats(),
+        "response_cache": response_cache_stats(),
+        "vote_scopes": vote_scopes.stats(),
+        "vote_audit_buffer": vote_audit_buffer.stats(),
+        "rate_limit": rate_limit.stats(),
+    }
+
+
 @router.patch("/guests/{guest_id}", response_model=AdminGuestResponse)
 def admin_update_guest(
     guest_id: int,
@@ -67,21 +141,7 @@ def admin_update_guest(
         if not family:
             raise HTTPException(status_code=400, detail="Target family not found")
 
-    # Handle attendance sync using the shared logic from rsvp router
-    if "attend_ceremony" in updated_fields or "attend_lunch" in updated_fields:
-        next_ceremony = updated_fields.get("attend_ceremony", guest.attend_ceremony)
-        next_lunch = updated_fields.get("attend_lunch", guest.attend_lunch)
-        _apply_attendance_flags(guest, next_ceremony, next_lunch)
-        
-        # Remove from updated_fields to avoid redundant setattr below
-        updated_fields.pop("attend_ceremony", None)
-        updated_fields.pop("attend_lunch", None)
-        # Also pop legacy 'attending' if present in update, as _apply_attendance_flags handles it
-        updated_fields.pop("attending", None)
-
-    for field, value in updated_fields.items():
-        setattr(guest, field, value)
-
+    _set_guest_fields(guest, updated_fields)
     db.commit()
     db.refresh(guest)
     return guest
@@ -99,16 +159,7 @@ def admin_create_guest(
         
     guest_dict = guest_data.model_dump(exclude_unset=True)
     new_guest = Guest(name=guest_dict.pop("name"))
-    
-    # If attendance is provided, apply it via the sync logic
-    if "attend_ceremony" in guest_dict or "attend_lunch" in guest_dict:
-        ceremony = guest_dict.pop("attend_ceremony", None)
-        lunch = guest_dict.pop("attend_lunch", None)
-        _apply_attendance_flags(new_guest, ceremony, lunch)
-        guest_dict.pop("attending", None)
-
-    for field, value in guest_dict.items():
-        setattr(new_guest, field, value)
+    _set_guest_fields(new_guest, guest_dict)
 
     db.add(new_guest)
     db.commit()
@@ -127,11 +178,27 @@ def admin_delete_guest(
     if not guest:
         raise HTTPException(status_code=404, detail="Guest not found")
     
+    _delete_guest_votes(db, [guest_id])
     db.delete(guest)
     db.commit()
+    vote_scopes.clear()
     return None
 
 
+def _delete_guest_votes(db: Session, guest_ids) -> None:
+    """Delete the vote audit rows of guests about to be deleted.
+
+    Removes their raw `VoteAudit` rows and the compacted `VoteAuditSummary`
+    rows of votes for them as individual guests. Call `vote_scopes.clear()`
+    after committing: some IPs may no longer have votes for several groups.
+    """
+    db.execute(delete(VoteAudit).where(VoteAudit.guest_id.in_(guest_ids)))
+    db.execute(
+        delete(VoteAuditSummary)
+        .where(VoteAuditSummary.scope_type == "guest", VoteAuditSummary.scope_id.in_(guest_ids))
+    )
+
+
 @router.post("/families", response_model=AdminFamilyResponse, status_code=status.HTTP_201_CREATED)
 def admin_create_family(
     family_data: FamilyBase,
@@ -183,3 +250,186 @@ def admin_delete_family(
     db.delete(family)
     db.commit()
     return None
+
+
+GUEST_OPS = ("update_guest", "move_guest", "delete_guest")
+# Guest fields a batch can change
+BATCH_GUEST_COLUMNS = (
+    Guest.id,
+    Guest.name,
+    Guest.family_id,
+    Guest.attending,
+    Guest.attendance_choice,
+    Guest.attend_ceremony,
+    Guest.attend_lunch,
+    Guest.allergens,
+    Guest.dietary_notes,
+    Guest.admin_notes,
+)
+FAMILY_OPS = ("update_family", "delete_family")
+
+
+@router.post("/batch", response_model=AdminBatchResponse)
+def admin_batch(
+    batch: AdminBatchRequest,
+    admin: bool = Depends(verify_admin),
+    db: Session = Depends(get_db)
+):
+    """Apply many guest and family operations in one transaction.
+
+    Operations run in order with the semantics of the single-item endpoints
+    (deleting a family keeps its members as individual guests).
+    `create_guest` and `move_guest` can target a family created earlier in
+    the batch through its `ref`. The whole batch is validated before
+    anything is written, then applied with a constant number of bulk
+    statements: new rows and row changes go out as executemany batches,
+    deletes as `WHERE id IN (...)`.
+
+    Returns:
+        The result of each operation, with the ID of the guest or family it
+        created or changed.
+
+    Raises:
+        HTTPException: 400 with the per-operation results if any operation
+            is invalid; nothing is applied then.
+    """
+    operations = batch.operations
+    results = [
+        AdminBatchResult(index=index, op=op.op, id=getattr(op, "id", None))
+        for index, op in enumerate(operations)
+    ]
+
+    # Load every referenced guest and check every referenced family, once
+    guest_ids = {op.id for op in operations if op.op in GUEST_OPS}
+    family_ids = {op.id for op in operations if op.op in FAMILY_OPS}
+    for op in operations:
+        if op.op == "move_guest":
+            target = op.family_id
+        elif op.op in ("create_guest", "update_guest"):
+            target = op.guest.family_id
+        else:
+            continue
+        if target is not None:
+            family_ids.add(target)
+    # Plain copies of the rows: changes are written back with one bulk
+    # UPDATE instead of an UPDATE per guest at flush
+    guests = {
+        row.id: SimpleNamespace(**row._asdict())
+        for row in db.execute(select(*BATCH_GUEST_COLUMNS).where(Guest.id.in_(guest_ids)))
+    } if guest_ids else {}
+    original = {guest_id: dict(vars(guest)) for guest_id, guest in guests.items()}
+    existing_families = set(
+        db.scalars(select(Family.id).where(Family.id.in_(family_ids)))
+    ) if family_ids else set()
+
+    refs: set[str] = set()
+    deleted_guests: set[int] = set()
+    deleted_families: set[int] = set()
+
+    def target_error(family_id: int | None, family_ref: str | None) -> str | None:
+        if family_ref is not None:
+            if family_id is not None:
+                return "Give family_id or family_ref, not both"
+            if family_ref not in refs:
+                return f"Unknown family_ref {family_ref!r}"
+        elif family_id is not None and (family_id not in existing_families or family_id in deleted_families):
+            return "Target family not found"
+        return None
+
+    for result, op in zip(results, operations):
+        if op.op in GUEST_OPS and (op.id not in guests or op.id in deleted_guests):
+            result.error = "Guest not found"
+        elif op.op in FAMILY_OPS and (op.id not in existing_families or op.id in deleted_families):
+            result.error = "Family not found"
+        elif op.op == "create_guest":
+            result.error = (
+                "Guest name is required" if not op.guest.name
+                else target_error(op.guest.family_id, op.family_ref)
+            )
+        elif op.op == "update_guest":
+            result.error = target_error(op.guest.family_id, None)
+        elif op.op == "move_guest":
+            result.error = target_error(op.family_id, op.family_ref)
+        elif op.op == "create_family" and op.ref is not None:
+            if op.ref in refs:
+                result.error = f"Duplicate ref {op.ref!r}"
+            refs.add(op.ref)
+        elif op.op == "delete_guest":
+            deleted_guests.add(op.id)
+        elif op.op == "delete_family":
+            deleted_families.add(op.id)
+    if any(result.error for result in results):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Batch not applied",
+                "results": [result.model_dump(exclude_none=True) for result in results],
+            },
+        )
+
+    # New families first, so that guests can be put in them by ID
+    new_families = [index for index, op in enumerate(operations) if op.op == "create_family"]
+    ref_ids = {}
+    if new_families:
+        created_ids = db.scalars(
+            insert(Family).returning(Family.id, sort_by_parameter_order=True),
+            [{"family_name": operations[index].family_name} for index in new_families],
+        ).all()
+        for index, family_id in zip(new_families, created_ids):
+            results[index].id = family_id
+            if operations[index].ref is not None:
+                ref_ids[operations[index].ref] = family_id
+
+    new_guests = {}
+    renames = {}
+    for index, op in enumerate(operations):
+        if op.op == "create_guest":
+            # Every new row sets the same columns, so they go out as one batch
+            guest = SimpleNamespace(**{
+                column.key: [] if column.key == "allergens" else None
+                for column in BATCH_GUEST_COLUMNS[1:]
+            })
+            _set_guest_fields(guest, op.guest.model_dump(exclude_unset=True))
+            if op.family_ref is not None:
+                guest.family_id = ref_ids[op.family_ref]
+            new_guests[index] = guest
+        elif op.op == "update_guest" and op.id not in deleted_guests:
+            _set_guest_fields(guests[op.id], op.guest.model_dump(exclude_unset=True))
+        elif op.op == "move_guest" and op.id not in deleted_guests:
+            guests[op.id].family_id = ref_ids[op.family_ref] if op.family_ref is not None else op.family_id
+        elif op.op == "update_family" and op.id not in deleted_families:
+            renames[op.id] = op.family_name
+    if new_guests:
+        created_ids = db.scalars(
+            insert(Guest).returning(Guest.id, sort_by_parameter_order=True),
+            [vars(guest) for guest in new_guests.values()],
+        ).all()
+        for index, guest_id in zip(new_guests, created_ids):
+            results[index].id = guest_id
+
+    changes = []
+    for guest_id, guest in guests.items():
+        changed = {
+            field: value for field, value in vars(guest).items() if value != original[guest_id][field]
+        }
+        if changed and guest_id not in deleted_guests:
+            changes.append({"id": guest_id, **changed})
+    if changes:
+        # Rows with the same changed fields share an executemany
+        changes.sort(key=lambda row: tuple(row))
+        db.execute(update(Guest), changes)
+    if renames:
+        db.execute(update(Family), [{"id": family_id, "family_name": name} for family_id, name in renames.items()])
+    if deleted_families:
+        db.execute(
+            update(Guest).where(Guest.family_id.in_(deleted_families)).values(family_id=None)
+        )
+        db.execute(delete(Family).where(Family.id.in_(deleted_families)))
+    if deleted_guests:
+        _delete_guest_votes(db, deleted_guests)
+        db.execute(delete(Guest).where(Guest.id.in_(deleted_guests)))
+    db.commit()
+    if deleted_guests:
+        # Some IPs may no longer have votes for several groups
+        vote_scopes.clear()
+    return AdminBatchResponse(results=results)
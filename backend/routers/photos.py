@@ -3,31 +3,105 @@
 Handles photo uploads, listing, and deletion for the wedding gallery.
 """
 
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import os
+import threading
 import time
-from collections import defaultdict
+import uuid
+from collections import OrderedDict
+from datetime import datetime
 from math import ceil
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile
-from sqlalchemy import func, or_
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile
+from fastapi.routing import APIRoute
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm import Session
 
+import rate_limit
+import shared_state
+from async_db import db_endpoint, get_session, run_db
 from db import get_db
 from image_utils import (
     ALLOWED_MIME_TYPES,
     delete_photo_files,
-    process_upload,
+    incoming_path,
+    save_upload_stream,
+    variant_filename,
 )
 from models import Photo
-from schemas import PhotoListResponse, PhotoResponse
+from photo_search import search_condition
+from photo_processing import (
+    PHOTO_DEDUP_PERCEPTUAL,
+    ProcessingBusyError,
+    async_mode_enabled,
+    check_queue_capacity,
+    find_duplicate,
+    nearest_perceptual,
+    notify_workers,
+    perceptual_candidates,
+    run_process_upload,
+)
+from schemas import PhotoListResponse, PhotoResponse, PhotoStatusResponse, PhotoVariant
 
-router = APIRouter(prefix="/api/photos", tags=["photos"])
+logger = logging.getLogger(__name__)
 
 MAX_FILE_SIZE = 15 * 1024 * 1024  # 15 MB
+# Allowance for multipart boundaries and the caption/uploader form fields
+MAX_BODY_SIZE = MAX_FILE_SIZE + 64 * 1024
 RATE_LIMIT_WINDOW = 3600  # 1 hour in seconds
 RATE_LIMIT_MAX = 30  # max uploads per window per IP
+# Seconds a photo count is reused before COUNT(*) runs again
+PHOTO_COUNT_CACHE_TTL = float(os.getenv("PHOTO_COUNT_CACHE_TTL", "30"))
+# Distinct searches whose count is kept; the key is the raw query string
+PHOTO_COUNT_CACHE_SIZE = int(os.getenv("PHOTO_COUNT_CACHE_SIZE", "256"))
+
+
+class LimitedBodyRoute(APIRoute):
+    """Route that rejects request bodies larger than MAX_BODY_SIZE while streaming.
+
+    The limit is checked against Content-Length up front and against the
+    bytes actually received, so oversized uploads are cut off before the
+    multipart parser spools them completely.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        too_large = HTTPException(status_code=413, detail="File too large. Maximum size is 15MB.")
+
+        async def limited_handler(request: Request):
+            content_length = request.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > MAX_BODY_SIZE:
+                raise too_large
+
+            received = 0
+            receive = request.receive
+
+            async def limited_receive():
+                nonlocal received
+                message = await receive()
+                received += len(message.get("body", b""))
+                if received > MAX_BODY_SIZE:
+                    raise too_large
+                return message
+
+            return await handler(Request(request.scope, limited_receive))
+
+        return limited_handler
+
+
+router = APIRouter(prefix="/api/photos", tags=["photos"], route_class=LimitedBodyRoute)
 
-# Simple in-memory rate limiter: {ip: [timestamp, ...]}
-_upload_timestamps: dict[str, list[float]] = defaultdict(list)
+_upload_limiter = rate_limit.RateLimiter("photo_upload", RATE_LIMIT_MAX, RATE_LIMIT_WINDOW)
+
+# Cached gallery totals: {search: (photos version, expires_at, count)}, least recent first
+_count_cache: OrderedDict[str | None, tuple[int, float, int]] = OrderedDict()
+# "photos" version the entries were last checked against
+_count_cache_version = 0
+_count_cache_lock = threading.Lock()
 
 
 def _check_rate_limit(ip: str):
@@ -39,14 +113,74 @@ def _check_rate_limit(ip: str):
     Raises:
         HTTPException: 429 if rate limit exceeded.
     """
-    now = time.time()
-    cutoff = now - RATE_LIMIT_WINDOW
-    timestamps = _upload_timestamps[ip]
-    # Prune old entries
-    _upload_timestamps[ip] = [t for t in timestamps if t > cutoff]
-    if len(_upload_timestamps[ip]) >= RATE_LIMIT_MAX:
-        raise HTTPException(status_code=429, detail="Upload rate limit exceeded. Try again later.")
-    _upload_timestamps[ip].append(now)
+    try:
+        _upload_limiter.check(ip)
+    except rate_limit.RateLimitExceeded as exc:
+        raise HTTPException(
+            status_code=429,
+            detail="Upload rate limit exceeded. Try again later.",
+            headers={"Retry-After": str(ceil(exc.retry_after))},
+        ) from exc
+
+
+def _encode_cursor(photo: Photo) -> str:
+    """Encode the keyset position after `photo` as an opaque cursor."""
+    raw = json.dumps([photo.created_at.isoformat(), photo.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Decode a cursor produced by `_encode_cursor`.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, photo_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(photo_id)
+    except (binascii.Error, ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
+
+def _count_photos(query, search: str | None) -> int:
+    """Count the photos matched by `query`, reusing a recent count for `search`.
+
+    A count is reused until it expires or the gallery changes, in any
+    worker process (the "photos" `shared_state` counter). At most
+    PHOTO_COUNT_CACHE_SIZE searches are kept, the least recently used
+    dropped first: every keystroke of a search-as-you-type is a new key.
+    Stale entries are dropped when read: all of them once the gallery
+    changed, an expired one when its search comes again.
+    """
+    global _count_cache_version
+    now = time.monotonic()
+    version = shared_state.counter("photos")
+    with _count_cache_lock:
+        if version != _count_cache_version:
+            _count_cache.clear()
+            _count_cache_version = version
+        cached = _count_cache.get(search)
+        if cached and cached[0] == version and cached[1] > now:
+            _count_cache.move_to_end(search)
+            return cached[2]
+        if cached:
+            del _count_cache[search]
+    total = query.with_entities(func.count(Photo.id)).scalar() or 0
+    if PHOTO_COUNT_CACHE_SIZE > 0:
+        with _count_cache_lock:
+            # Not if the gallery changed while counting
+            if version == _count_cache_version:
+                _count_cache[search] = (version, now + PHOTO_COUNT_CACHE_TTL, total)
+                _count_cache.move_to_end(search)
+                while len(_count_cache) > PHOTO_COUNT_CACHE_SIZE:
+                    _count_cache.popitem(last=False)
+    return total
+
+
+def _invalidate_counts():
+    """Drop cached photo totals, in every process, after the gallery changed."""
+    shared_state.bump("photos")
 
 
 def _photo_to_response(photo: Photo) -> PhotoResponse:
@@ -56,8 +190,17 @@ def _photo_to_response(photo: Photo) -> PhotoResponse:
         photo: Photo ORM model instance.
 
     Returns:
-        PhotoResponse with computed thumb_url and full_url.
+        PhotoResponse with computed thumb_url, full_url and variant URLs.
     """
+    variants = [
+        PhotoVariant(
+            url=f"/photos/variants/{variant_filename(photo.id, v['width'], v['format'])}",
+            width=v["width"],
+            height=v["height"],
+            format=v["format"],
+        )
+        for v in photo.variants or []
+    ]
     return PhotoResponse(
         id=photo.id,
         original_filename=photo.original_filename,
@@ -67,22 +210,108 @@ def _photo_to_response(photo: Photo) -> PhotoResponse:
         height=photo.height,
         thumb_url=f"/photos/thumbs/{photo.id}.jpg",
         full_url=f"/photos/originals/{photo.id}.jpg",
+        variants=variants,
+        status=photo.status,
         created_at=photo.created_at,
     )
 
 
+def _photo_to_status(photo: Photo, db: Session) -> PhotoStatusResponse:
+    """Convert a Photo model instance to a PhotoStatusResponse schema.
+
+    Args:
+        photo: Photo ORM model instance.
+        db: Database session (to resolve the original of a duplicate).
+
+    Returns:
+        PhotoStatusResponse, including the photo details once it is ready;
+        for a duplicate, the details of the photo it duplicates, or status
+        "failed" if that photo has since been deleted.
+    """
+    shown = None
+    if photo.status == "ready":
+        shown = photo
+    elif photo.status == "duplicate":
+        shown = db.query(Photo).filter(Photo.id == photo.status_detail).first()
+        if shown is None:
+            return PhotoStatusResponse(
+                id=photo.id,
+                status="failed",
+                detail="The photo this upload duplicates was deleted",
+            )
+    return PhotoStatusResponse(
+        id=photo.id,
+        status=photo.status,
+        detail=photo.status_detail,
+        photo=_photo_to_response(shown) if shown else None,
+    )
+
+
+async def _find_similar(db, perceptual_hash: str | None) -> Photo | None:
+    """`find_duplicate` by perceptual hash, comparing the hashes in a worker thread.
+
+    With DB_ASYNC on, `run_db` runs on the event loop, which the comparison
+    against every ready photo would hold up.
+    """
+    if not (perceptual_hash and PHOTO_DEDUP_PERCEPTUAL):
+        return None
+    candidates = await run_db(db, perceptual_candidates)
+    photo_id = await asyncio.to_thread(nearest_perceptual, candidates, perceptual_hash)
+    if photo_id is None:
+        return None
+    return await run_db(db, lambda session: session.query(Photo).filter(Photo.id == photo_id).first())
+
+
+def _save_photo(db: Session, photo: Photo):
+    """Insert `photo` and reload its server-side defaults."""
+    db.add(photo)
+    db.commit()
+    db.refresh(photo)
+
+
+def _busy_error() -> HTTPException:
+    """Build the 503 returned when the processing queue is full."""
+    return HTTPException(
+        status_code=503,
+        detail="Server busy processing photos. Try again shortly.",
+        headers={"Retry-After": "5"},
+    )
+
+
+async def _discard_files(photo_id: str):
+    """Delete the files written for `photo_id`, off the event loop; logs failures."""
+    try:
+        await asyncio.to_thread(delete_photo_files, photo_id)
+    except OSError as exc:
+        logger.warning("Deleting the files of photo %s failed: %s", photo_id, exc)
+
+
+def _storage_error() -> HTTPException:
+    """Build the 500 returned when the photo files can't be written (disk full, permissions)."""
+    return HTTPException(status_code=500, detail="Could not store the photo. Try again later.")
+
+
 @router.post("", response_model=PhotoResponse)
 async def upload_photo(
     request: Request,
+    response: Response,
     file: UploadFile = File(...),
     uploader_name: str | None = Form(None),
     caption: str | None = Form(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
 ):
     """Upload a photo to the gallery.
 
+    In async upload mode the raw file is stored and queued, and the photo is
+    returned with status "pending" and HTTP 202; poll
+    `GET /api/photos/{photo_id}/status` until it is "ready".
+
+    An upload whose bytes match an existing photo is not processed again:
+    the existing photo is returned instead.
+
     Args:
         request: FastAPI request (for client IP).
+        response: FastAPI response (to set 202 in async mode).
         file: Uploaded image file (multipart).
         uploader_name: Optional name of the uploader.
         caption: Optional photo caption.
@@ -92,98 +321,214 @@ async def upload_photo(
         PhotoResponse with the uploaded photo details.
 
     Raises:
-        HTTPException: 400 for invalid file type/size, 429 for rate limit.
+        HTTPException: 400 for invalid file type/size, 413 for an oversized
+            request body, 429 for rate limit, 500 if the files can't be
+            written, 503 if the processing queue is full.
     """
-    client_ip = request.headers.get("x-real-ip", request.client.host)
-    _check_rate_limit(client_ip)
+    client_ip = request.headers.get("x-real-ip") or (request.client.host if request.client else "unknown")
+    # The shared backends do file or network I/O
+    await asyncio.to_thread(_check_rate_limit, client_ip)
 
     # Validate content type
     content_type = file.content_type or ""
     if content_type not in ALLOWED_MIME_TYPES:
         raise HTTPException(status_code=400, detail=f"File type not allowed: {content_type}")
 
-    # Read and validate size
-    file_bytes = await file.read()
-    if len(file_bytes) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="File too large. Maximum size is 15MB.")
-
-    # Process image
+    # Stream to disk, sniffing the type and enforcing the size limit per chunk
+    photo_id = uuid.uuid4().hex
+    raw_path = incoming_path(photo_id)
+    await file.seek(0)
     try:
-        photo_id, width, height, file_size = process_upload(file_bytes)
+        mime_type, upload_size, content_hash = await asyncio.to_thread(
+            save_upload_stream, file.file, raw_path, MAX_FILE_SIZE
+        )
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except OSError as exc:
+        logger.warning("Saving upload %s failed: %s", photo_id, exc)
+        raise _storage_error() from exc
+
+    # Same bytes already uploaded (retry, group chat share): skip processing
+    existing = await run_db(db, find_duplicate, content_hash=content_hash)
+    if existing:
+        raw_path.unlink(missing_ok=True)
+        return _photo_to_response(existing)
 
-    # Save metadata to DB
     photo = Photo(
         id=photo_id,
         original_filename=file.filename or "unknown",
         uploader_name=uploader_name.strip() if uploader_name else None,
         caption=caption.strip() if caption else None,
-        mime_type=content_type,
-        file_size=file_size,
-        width=width,
-        height=height,
+        mime_type=mime_type,
+        content_hash=content_hash,
     )
-    db.add(photo)
-    db.commit()
-    db.refresh(photo)
+
+    if async_mode_enabled():
+        # Accept now, process later: the raw upload is already on disk, and
+        # the pending row is the queue entry any worker process can claim
+        try:
+            await asyncio.to_thread(check_queue_capacity)
+        except ProcessingBusyError as exc:
+            raw_path.unlink(missing_ok=True)
+            raise _busy_error() from exc
+        photo.file_size = upload_size
+        photo.status = "pending"
+        await run_db(db, _save_photo, photo)
+        notify_workers()
+        response.status_code = 202
+        return _photo_to_response(photo)
+
+    # Process image off the event loop
+    try:
+        result = await run_process_upload(raw_path, photo_id)
+    except ProcessingBusyError as exc:
+        raise _busy_error() from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except OSError as exc:
+        logger.warning("Processing photo %s failed: %s", photo_id, exc)
+        # Variants written before the error
+        await _discard_files(photo_id)
+        raise _storage_error() from exc
+    finally:
+        raw_path.unlink(missing_ok=True)
+
+    existing = await _find_similar(db, result.perceptual_hash)
+    if existing:
+        await _discard_files(photo_id)
+        return _photo_to_response(existing)
+
+    photo.width = result.width
+    photo.height = result.height
+    photo.file_size = result.file_size
+    photo.variants = result.variants
+    photo.perceptual_hash = result.perceptual_hash
+
+    # Save metadata to DB
+    await run_db(db, _save_photo, photo)
+    _invalidate_counts()
 
     return _photo_to_response(photo)
 
 
 @router.get("", response_model=PhotoListResponse)
+@db_endpoint
 def list_photos(
     page: int = 1,
     per_page: int = 20,
     search: str | None = Query(None),
+    cursor: str | None = Query(None),
+    include_total: bool | None = Query(None),
     db: Session = Depends(get_db),
 ):
-    """List photos with pagination, newest first.
+    """List photos newest first, by page number or by cursor.
+
+    Page mode (no `cursor`) uses OFFSET, which gets slower the deeper the
+    page. Cursor mode continues after the `next_cursor` of the previous
+    response with a keyset lookup on (created_at, id), so every page costs
+    the same. Every response carries `next_cursor` (None on the last page),
+    so clients can start with page 1 and follow cursors from there.
 
     Args:
-        page: Page number (1-indexed).
+        page: Page number (1-indexed), ignored when `cursor` is given.
         per_page: Number of photos per page (max 100).
-        search: Optional search string to filter by uploader_name or caption.
+        search: Optional search string matched (by word prefix, ignoring
+            accents) against uploader_name and caption.
+        cursor: Opaque `next_cursor` from a previous response.
+        include_total: Whether to count the matching photos (defaults to
+            True in page mode and False in cursor mode). Counts are cached
+            for PHOTO_COUNT_CACHE_TTL seconds, for up to
+            PHOTO_COUNT_CACHE_SIZE searches.
         db: Database session.
 
     Returns:
-        PhotoListResponse with paginated photo list.
+        PhotoListResponse with the photos of the page.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed.
     """
-    per_page = min(per_page, 100)
+    per_page = min(max(per_page, 1), 100)
     page = max(page, 1)
+    if include_total is None:
+        include_total = cursor is None
 
-    query = db.query(Photo)
+    query = db.query(Photo).filter(Photo.status == "ready")
 
     if search:
-        pattern = f"%{search}%"
-        query = query.filter(
-            or_(
-                Photo.uploader_name.ilike(pattern),
-                Photo.caption.ilike(pattern),
-            )
+        query = query.filter(search_condition(db, search))
+
+    total = total_pages = None
+    if include_total:
+        total = _count_photos(query, search)
+        total_pages = ceil(total / per_page) if total > 0 else 1
+
+    page_query = query.order_by(Photo.created_at.desc(), Photo.id.desc())
+    if cursor:
+        # A row-value comparison lets SQLite seek the index directly; the
+        # equivalent OR of two conditions degrades to a scan on deep pages.
+        page_query = page_query.filter(
+            tuple_(Photo.created_at, Photo.id) < tuple_(*_decode_cursor(cursor))
         )
+    else:
+        page_query = page_query.offset((page - 1) * per_page)
 
-    total = query.with_entities(func.count(Photo.id)).scalar() or 0
-    total_pages = ceil(total / per_page) if total > 0 else 1
-
-    photos = (
-        query
-        .order_by(Photo.created_at.desc())
-        .offset((page - 1) * per_page)
-        .limit(per_page)
-        .all()
-    )
+    # One extra row tells whether there is a next page without counting
+    photos = page_query.limit(per_page + 1).all()
+    has_more = len(photos) > per_page
+    photos = photos[:per_page]
 
     return PhotoListResponse(
         photos=[_photo_to_response(p) for p in photos],
         total=total,
-        page=page,
+        page=None if cursor else page,
         per_page=per_page,
         total_pages=total_pages,
+        next_cursor=_encode_cursor(photos[-1]) if has_more else None,
     )
 
 
+@router.get("/status", response_model=list[PhotoStatusResponse])
+@db_endpoint
+def get_photos_status(
+    ids: list[str] = Query(..., max_length=100),
+    db: Session = Depends(get_db),
+):
+    """Get the processing status of several photos at once.
+
+    Args:
+        ids: Photo UUIDs (repeat the `ids` query parameter, max 100).
+        db: Database session.
+
+    Returns:
+        Status of each known photo; unknown IDs are omitted.
+    """
+    photos = db.query(Photo).filter(Photo.id.in_(ids)).all()
+    return [_photo_to_status(p, db) for p in photos]
+
+
+@router.get("/{photo_id}/status", response_model=PhotoStatusResponse)
+@db_endpoint
+def get_photo_status(photo_id: str, db: Session = Depends(get_db)):
+    """Get the processing status of an uploaded photo.
+
+    Args:
+        photo_id: UUID hex string of the photo.
+        db: Database session.
+
+    Returns:
+        PhotoStatusResponse with the photo details once processing is done.
+
+    Raises:
+        HTTPException: 404 if photo not found.
+    """
+    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    return _photo_to_status(photo, db)
+
+
 @router.delete("/{photo_id}")
+@db_endpoint
 def delete_photo(photo_id: str, db: Session = Depends(get_db)):
     """Delete a photo by ID (admin use).
 
@@ -204,5 +549,6 @@ def delete_photo(photo_id: str, db: Session = Depends(get_db)):
     delete_photo_files(photo_id)
     db.delete(photo)
     db.commit()
+    _invalidate_counts()
 
     return {"detail": "Photo deleted"}
@@ -1,11 +1,26 @@
 """RSVP API endpoints for managing guest attendance."""
 
-from fastapi import APIRouter, Depends, HTTPException, Request, Response
-from sqlalchemy.orm import Session
+import math
+import os
+import threading
+from collections.abc import Callable
+from datetime import datetime
 
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import String, and_, case, cast, func
+from sqlalchemy.orm import Session, joinedload
+
+import data_version
+import rate_limit
+import vote_audit_buffer
+import vote_scopes
+from async_db import db_endpoint
 from db import get_db
-from models import Family, Guest, VoteAudit
+from models import Family, Guest
 from schemas import (
+    ALLERGEN_OPTIONS,
+    EventStats,
     GuestResponse,
     GuestUpdate,
     FamilyResponse,
@@ -19,6 +34,111 @@ MULTI_GROUP_WARNING = (
     "accettano su questa pagina, comunicaci solo la tua partecipazione"
 )
 
+# Guest-list responses may be stored but must be revalidated with their ETag
+GUEST_LIST_CACHE_CONTROL = os.getenv("GUEST_LIST_CACHE_CONTROL", "no-cache")
+
+# RSVP writes allowed per client IP and window (seconds); 0 disables the limit
+RSVP_RATE_LIMIT_MAX = int(os.getenv("RSVP_RATE_LIMIT_MAX", "0"))
+RSVP_RATE_LIMIT_WINDOW = float(os.getenv("RSVP_RATE_LIMIT_WINDOW", "600"))
+_rsvp_limiter = rate_limit.RateLimiter("rsvp", RSVP_RATE_LIMIT_MAX, RSVP_RATE_LIMIT_WINDOW)
+
+# Pre-serialized JSON bodies of the public guest-list reads, valid while the
+# guest list is unchanged: {key: (data version, body)}
+_response_cache: dict[str, tuple[int, bytes]] = {}
+_response_cache_counters: dict[str, dict[str, int]] = {}
+_response_cache_lock = threading.Lock()
+
+_families_adapter = TypeAdapter(list[FamilyResponse])
+_guests_adapter = TypeAdapter(list[GuestResponse])
+
+
+def _guest_list_response(request: Request, key: str, build: Callable[[], bytes]) -> Response:
+    """Serve a read derived from the guest list, from cache when possible.
+
+    Honors If-None-Match with a 304. Otherwise returns the cached JSON body
+    for `key` if it was built at the current data version, or builds it with
+    `build` (the only step that touches the database and Pydantic).
+
+    Args:
+        request: Incoming request, checked for If-None-Match.
+        key: Cache key of the endpoint.
+        build: Returns the JSON body from the database.
+
+    Returns:
+        JSON response with ETag and Cache-Control headers, or a 304.
+    """
+    # Read the version before querying: a write racing with `build` only
+    # makes the entry look older than it is, forcing a rebuild.
+    version = data_version.current()
+    headers = {"ETag": data_version.etag(version), "Cache-Control": GUEST_LIST_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if headers["ETag"] in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+
+    cached = _response_cache.get(key)
+    hit = cached is not None and cached[0] == version
+    if hit:
+        body = cached[1]
+    else:
+        body = build()
+        _response_cache[key] = (version, body)
+    with _response_cache_lock:
+        counters = _response_cache_counters.setdefault(key, {"hits": 0, "misses": 0})
+        counters["hits" if hit else "misses"] += 1
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def response_cache_stats() -> dict:
+    """Hit/miss counters of the guest-list response cache, for monitoring."""
+    with _response_cache_lock:
+        return {
+            "data_version": data_version.current(),
+            "endpoints": {key: dict(counters) for key, counters in _response_cache_counters.items()},
+        }
+
+
+def _count_where(condition):
+    """SUM(CASE ...) counting the rows matching `condition` (0 on an empty table)."""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _compute_stats(db: Session) -> RSVPStats:
+    """Compute all RSVP stats with a single aggregate query over guests."""
+    allergens = sorted(ALLERGEN_OPTIONS)
+    # JSON lists are stored as text, e.g. ["glutine", "uova"]
+    allergens_text = cast(Guest.allergens, String)
+    at_lunch = Guest.attend_lunch.is_(True)
+    row = db.query(
+        func.count(Guest.id),
+        _count_where(Guest.attending.is_(True)),
+        _count_where(Guest.attending.is_(False)),
+        _count_where(Guest.attending.is_(None)),
+        _count_where(Guest.attend_ceremony.is_(True)),
+        _count_where(Guest.attend_ceremony.is_(False)),
+        _count_where(Guest.attend_ceremony.is_(None)),
+        _count_where(at_lunch),
+        _count_where(Guest.attend_lunch.is_(False)),
+        _count_where(Guest.attend_lunch.is_(None)),
+        *(
+            _count_where(and_(at_lunch, allergens_text.like(f'%"{allergen}"%')))
+            for allergen in allergens
+        ),
+    ).one()
+
+    return RSVPStats(
+        total_guests=row[0],
+        confirmed=row[1],
+        declined=row[2],
+        pending=row[3],
+        ceremony=EventStats(attending=row[4], declined=row[5], pending=row[6]),
+        lunch=EventStats(attending=row[7], declined=row[8], pending=row[9]),
+        allergens={
+            allergen: count for allergen, count in zip(allergens, row[10:]) if count
+        },
+    )
+
 
 def _sync_legacy_attendance_fields(guest: Guest) -> None:
     """Derive legacy fields from per-event booleans."""
@@ -99,66 +219,102 @@ def _vote_scope_for_guest(guest: Guest) -> tuple[str, int]:
     return ("guest", guest.id)
 
 
+def _check_rsvp_rate_limit(request: Request) -> None:
+    """Enforce RSVP_RATE_LIMIT_MAX writes per window for the client IP.
+
+    Raises:
+        HTTPException: 429 with Retry-After if the IP is over the limit.
+    """
+    try:
+        _rsvp_limiter.check(_get_client_ip(request))
+    except rate_limit.RateLimitExceeded as exc:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many RSVP updates. Try again later.",
+            headers={"Retry-After": str(math.ceil(exc.retry_after))},
+        ) from exc
+
+
 def _attach_multi_group_warning_if_needed(
     db: Session, request: Request, response: Response, scope_type: str, scope_id: int
 ) -> None:
     """Set response header if same IP is voting across different groups."""
     ip_address = _get_client_ip(request)
-
-    existing_other_scope = (
-        db.query(VoteAudit.id)
-        .filter(
-            VoteAudit.ip_address == ip_address,
-            (VoteAudit.scope_type != scope_type) | (VoteAudit.scope_id != scope_id),
-        )
-        .first()
-    )
-
-    if existing_other_scope:
+    if vote_audit_buffer.other_scope_pending(
+        ip_address, scope_type, scope_id
+    ) or vote_scopes.other_scope_exists(db, ip_address, scope_type, scope_id):
         response.headers["X-RSVP-Warning"] = MULTI_GROUP_WARNING
 
 
 def _record_vote_audit(
     db: Session, request: Request, scope_type: str, scope_id: int, guest_id: int
 ) -> None:
-    """Persist one audit row per vote update."""
-    db.add(
-        VoteAudit(
-            ip_address=_get_client_ip(request),
-            scope_type=scope_type,
-            scope_id=scope_id,
-            guest_id=guest_id,
-        )
+    """Record one audit row per vote update (see `vote_audit_buffer`)."""
+    vote_audit_buffer.record(
+        db,
+        [
+            {
+                "ip_address": _get_client_ip(request),
+                "scope_type": scope_type,
+                "scope_id": scope_id,
+                "guest_id": guest_id,
+                "created_at": datetime.utcnow(),
+            }
+        ],
     )
 
 
 @router.get("/families", response_model=list[FamilyResponse])
-def list_families(db: Session = Depends(get_db)):
+@db_endpoint
+def list_families(request: Request, db: Session = Depends(get_db)):
     """Get all families with their guests.
 
+    Served from the pre-serialized response cache; a matching If-None-Match
+    gets a 304.
+
     Args:
+        request: Incoming request
         db: Database session
 
     Returns:
         List of families with nested guest information
     """
-    return db.query(Family).all()
+    def build() -> bytes:
+        # One LEFT JOIN instead of one lazy guest load per family
+        families = db.query(Family).options(joinedload(Family.guests)).all()
+        return _families_adapter.dump_json(
+            _families_adapter.validate_python(families, from_attributes=True)
+        )
+
+    return _guest_list_response(request, "families", build)
 
 
 @router.get("/guests", response_model=list[GuestResponse])
-def list_guests(db: Session = Depends(get_db)):
+@db_endpoint
+def list_guests(request: Request, db: Session = Depends(get_db)):
     """Get all individual guests (those without a family).
 
+    Served from the pre-serialized response cache; a matching If-None-Match
+    gets a 304.
+
     Args:
+        request: Incoming request
         db: Database session
 
     Returns:
         List of guests without family association
     """
-    return db.query(Guest).filter(Guest.family_id.is_(None)).all()
+    def build() -> bytes:
+        guests = db.query(Guest).filter(Guest.family_id.is_(None)).all()
+        return _guests_adapter.dump_json(
+            _guests_adapter.validate_python(guests, from_attributes=True)
+        )
+
+    return _guest_list_response(request, "guests", build)
 
 
 @router.patch("/guests/{guest_id}", response_model=GuestResponse)
+@db_endpoint
 def update_guest(
     guest_id: int,
     update: GuestUpdate,
@@ -177,8 +333,9 @@ def update_guest(
         Updated guest information
 
     Raises:
-        HTTPException: If guest not found
+        HTTPException: If guest not found, 429 over the RSVP rate limit
     """
+    _check_rsvp_rate_limit(request)
     guest = db.query(Guest).filter(Guest.id == guest_id).first()
     if not guest:
         raise HTTPException(status_code=404, detail="Guest not found")
@@ -230,6 +387,7 @@ def update_guest(
 
 
 @router.patch("/families/{family_id}/guests", response_model=FamilyResponse)
+@db_endpoint
 def update_family_guests(
     family_id: int,
     update: FamilyGuestsUpdate,
@@ -248,9 +406,17 @@ def update_family_guests(
         Updated family with guest information
 
     Raises:
-        HTTPException: If family not found
+        HTTPException: If family not found, 429 over the RSVP rate limit
     """
-    family = db.query(Family).filter(Family.id == family_id).first()
+    _check_rsvp_rate_limit(request)
+    # Family and all its guests in one query; guests of other families are
+    # ignored, as before.
+    family = (
+        db.query(Family)
+        .options(joinedload(Family.guests))
+        .filter(Family.id == family_id)
+        .first()
+    )
     if not family:
         raise HTTPException(status_code=404, detail="Family not found")
 
@@ -262,48 +428,55 @@ def update_family_guests(
         scope_id=family_id,
     )
 
+    guests_by_id = {guest.id: guest for guest in family.guests}
+    now = datetime.utcnow()
+    ip_address = _get_client_ip(request)
+    audits = []
     for guest_id, attendance_value in update.guest_updates.items():
-        guest = db.query(Guest).filter(
-            Guest.id == guest_id, Guest.family_id == family_id
-        ).first()
-        if guest:
-            if isinstance(attendance_value, str) or attendance_value is None:
-                ceremony, lunch = _flags_from_attendance_choice(attendance_value)
-                _apply_attendance_flags(guest, ceremony, lunch)
-            else:
-                ceremony, lunch = _flags_from_legacy_attending(attendance_value)
-                _apply_attendance_flags(guest, ceremony, lunch)
-            _record_vote_audit(
-                db=db,
-                request=request,
-                scope_type="family",
-                scope_id=family_id,
-                guest_id=guest.id,
-            )
+        guest = guests_by_id.get(guest_id)
+        if guest is None:
+            continue
+        if isinstance(attendance_value, str) or attendance_value is None:
+            ceremony, lunch = _flags_from_attendance_choice(attendance_value)
+        else:
+            ceremony, lunch = _flags_from_legacy_attending(attendance_value)
+        _apply_attendance_flags(guest, ceremony, lunch)
+        if db.is_modified(guest):
+            # Set explicitly (instead of onupdate) so the response needs no reload
+            guest.updated_at = now
+        audits.append(
+            {
+                "ip_address": ip_address,
+                "scope_type": "family",
+                "scope_id": family_id,
+                "guest_id": guest.id,
+                "created_at": now,
+            }
+        )
 
+    vote_audit_buffer.record(db, audits)
+    # Serialize before commit expires the loaded objects
+    result = FamilyResponse.model_validate(family)
     db.commit()
-    db.refresh(family)
-    return family
+    return result
 
 
 @router.get("/rsvp/stats", response_model=RSVPStats)
-def get_stats(db: Session = Depends(get_db)):
-    """Get RSVP statistics.
+@db_endpoint
+def get_stats(request: Request, db: Session = Depends(get_db)):
+    """Get RSVP statistics, cached until the next guest write.
+
+    Served from the pre-serialized response cache; a matching If-None-Match
+    gets a 304.
 
     Args:
+        request: Incoming request
         db: Database session
 
     Returns:
-        Statistics including total guests, confirmed, declined, and pending
+        Statistics including total guests, confirmed, declined, pending,
+        per-event counts and allergen tallies of the lunch guests
     """
-    total = db.query(Guest).count()
-    confirmed = db.query(Guest).filter(Guest.attending == True).count()
-    declined = db.query(Guest).filter(Guest.attending == False).count()
-    pending = db.query(Guest).filter(Guest.attending.is_(None)).count()
-
-    return RSVPStats(
-        total_guests=total,
-        confirmed=confirmed,
-        declined=declined,
-        pending=pending,
+    return _guest_list_response(
+        request, "stats", lambda: _compute_stats(db).model_dump_json().encode()
     )
@@ -1,9 +1,11 @@
 """Pydantic schemas for request/response validation."""
 
 from datetime import datetime
+from typing import Annotated, Literal, Union
 from pydantic import BaseModel, Field, field_validator
 
 ATTENDANCE_CHOICES = {"ceremony", "lunch", "decline"}
+ADMIN_BATCH_MAX_OPERATIONS = 5000
 ALLERGEN_OPTIONS = {
     "glutine",
     "lattosio",
@@ -122,6 +124,21 @@ class FamilyGuestsUpdate(BaseModel):
     guest_updates: dict[int, bool | str | None]
 
 
+class PhotoVariant(BaseModel):
+    """A resized copy of a photo, usable as a `srcset` candidate.
+
+    Attributes:
+        url: URL of the variant image
+        width: Width in pixels (the `w` descriptor in srcset)
+        height: Height in pixels
+        format: Image format ("webp" or "avif")
+    """
+    url: str
+    width: int
+    height: int
+    format: str
+
+
 class PhotoResponse(BaseModel):
     """Schema for a single photo response.
 
@@ -134,6 +151,8 @@ class PhotoResponse(BaseModel):
         height: Image height in pixels
         thumb_url: URL to the thumbnail image
         full_url: URL to the full-size image
+        variants: Responsive variants, largest first (empty for older photos)
+        status: Processing state ("pending", "processing", "ready", "failed")
         created_at: Upload timestamp
     """
     id: str
@@ -144,27 +163,60 @@ class PhotoResponse(BaseModel):
     height: int | None
     thumb_url: str
     full_url: str
+    variants: list[PhotoVariant] = []
+    status: str = "ready"
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class PhotoStatusResponse(BaseModel):
+    """Processing status of an uploaded photo.
+
+    Attributes:
+        id: Photo UUID
+        status: Processing state ("pending", "processing", "ready",
+            "duplicate", "failed")
+        detail: Failure reason when status is "failed"
+        photo: Full photo details once status is "ready"
+    """
+    id: str
+    status: str
+    detail: str | None = None
+    photo: PhotoResponse | None = None
+
+
 class PhotoListResponse(BaseModel):
     """Paginated list of photos.
 
     Attributes:
         photos: List of photo objects
-        total: Total number of photos
-        page: Current page number
+        total: Total number of photos (None unless requested in cursor mode)
+        page: Current page number (None in cursor mode)
         per_page: Items per page
-        total_pages: Total number of pages
+        total_pages: Total number of pages (None when total is not counted)
+        next_cursor: Cursor for the next page, None on the last page
     """
     photos: list[PhotoResponse]
-    total: int
-    page: int
+    total: int | None = None
+    page: int | None = None
     per_page: int
-    total_pages: int
+    total_pages: int | None = None
+    next_cursor: str | None = None
+
+
+class EventStats(BaseModel):
+    """Schema for per-event RSVP counts.
+
+    Attributes:
+        attending: Number of guests attending the event
+        declined: Number of guests not attending the event
+        pending: Number of guests who haven't answered for the event
+    """
+    attending: int = 0
+    declined: int = 0
+    pending: int = 0
 
 
 class RSVPStats(BaseModel):
@@ -175,11 +227,17 @@ class RSVPStats(BaseModel):
         confirmed: Number of guests confirmed attending
         declined: Number of guests who declined
         pending: Number of guests who haven't responded
+        ceremony: Counts for the ceremony
+        lunch: Counts for the lunch
+        allergens: Number of lunch guests per allergen option
     """
     total_guests: int
     confirmed: int
     declined: int
     pending: int
+    ceremony: EventStats = Field(default_factory=EventStats)
+    lunch: EventStats = Field(default_factory=EventStats)
+    allergens: dict[str, int] = Field(default_factory=dict)
 
 
 class AdminGuestUpdate(GuestUpdate):
@@ -207,3 +265,107 @@ class AdminDataResponse(BaseModel):
     """Consolidated view of all data for the admin dashboard."""
     families: list[AdminFamilyResponse]
     individuals: list[AdminGuestResponse]
+
+
+class AdminCreateGuestOp(BaseModel):
+    """Batch operation creating a guest, optionally in a family created earlier in the batch.
+
+    Attributes:
+        guest: Fields of the new guest (`name` is required)
+        family_ref: `ref` of a `create_family` operation earlier in the batch
+    """
+    op: Literal["create_guest"]
+    guest: AdminGuestUpdate
+    family_ref: str | None = None
+
+
+class AdminUpdateGuestOp(BaseModel):
+    """Batch operation updating a guest, like `PATCH /api/admin/guests/{id}`."""
+    op: Literal["update_guest"]
+    id: int
+    guest: AdminGuestUpdate
+
+
+class AdminMoveGuestOp(BaseModel):
+    """Batch operation moving a guest to another family, or out of any family.
+
+    Attributes:
+        id: Guest ID
+        family_id: Target family, None to make the guest an individual
+        family_ref: `ref` of a `create_family` operation earlier in the batch,
+            instead of `family_id`
+    """
+    op: Literal["move_guest"]
+    id: int
+    family_id: int | None = None
+    family_ref: str | None = None
+
+
+class AdminDeleteGuestOp(BaseModel):
+    """Batch operation deleting a guest (and its vote audits)."""
+    op: Literal["delete_guest"]
+    id: int
+
+
+class AdminCreateFamilyOp(BaseModel):
+    """Batch operation creating a family.
+
+    Attributes:
+        family_name: Display name of the new family
+        ref: Name later operations of the batch use to refer to the new family
+    """
+    op: Literal["create_family"]
+    family_name: str
+    ref: str | None = None
+
+
+class AdminUpdateFamilyOp(BaseModel):
+    """Batch operation renaming a family."""
+    op: Literal["update_family"]
+    id: int
+    family_name: str
+
+
+class AdminDeleteFamilyOp(BaseModel):
+    """Batch operation deleting a family; its members become individual guests."""
+    op: Literal["delete_family"]
+    id: int
+
+
+AdminBatchOperation = Annotated[
+    Union[
+        AdminCreateGuestOp,
+        AdminUpdateGuestOp,
+        AdminMoveGuestOp,
+        AdminDeleteGuestOp,
+        AdminCreateFamilyOp,
+        AdminUpdateFamilyOp,
+        AdminDeleteFamilyOp,
+    ],
+    Field(discriminator="op"),
+]
+
+
+class AdminBatchRequest(BaseModel):
+    """Operations applied in order, all or none, by `POST /api/admin/batch`."""
+    operations: list[AdminBatchOperation] = Field(..., max_length=ADMIN_BATCH_MAX_OPERATIONS)
+
+
+class AdminBatchResult(BaseModel):
+    """Outcome of one batch operation.
+
+    Attributes:
+        index: Position of the operation in the request
+        op: Operation type
+        id: ID of the guest or family created or changed
+        error: Why the operation was rejected (the batch is then not applied)
+    """
+    index: int
+    op: str
+    id: int | None = None
+    error: str | None = None
+
+
+class AdminBatchResponse(BaseModel):
+    """Per-operation results of an applied batch."""
+    results: list[AdminBatchResult]
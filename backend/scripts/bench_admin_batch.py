@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Compare 1,000 admin operations sent one per request vs as one batch.
+
+Seeds two identical databases (500 families of 3 guests plus individual
+guests), then applies the same random mix of operations to each: guest
+creations, RSVP/notes updates, moves between families, family creations and
+renames, and guest deletions. The first database gets one request per
+operation on the single-item endpoints, the second one
+`POST /api/admin/batch`. Reports wall time and SQL statements for both, and
+checks that both databases end up with the same guest list.
+
+Usage:
+    python scripts/bench_admin_batch.py [--operations 1000] [--families 500]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+import _bench
+from check_query_counts import count_statements, seed_families
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operations", type=int, default=1_000, help="Operations to apply")
+    parser.add_argument("--families", type=int, default=500, help="Families to seed")
+    return parser.parse_args()
+
+
+def make_operations(count: int, guest_ids: list[int], family_ids: list[int], seed: int = 0) -> list[dict]:
+    """Random batch operations on existing guests and families."""
+    rng = random.Random(seed)
+    guest_ids = list(guest_ids)
+    operations = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.25:
+            operations.append({"op": "create_guest",
+                               "guest": {"name": f"Nuovo {i}", "family_id": rng.choice(family_ids)}})
+        elif roll < 0.6:
+            guest = {"admin_notes": f"tavolo {rng.randint(1, 30)}"}
+            if rng.random() < 0.5:
+                guest |= {"attend_ceremony": rng.random() < 0.8, "attend_lunch": rng.random() < 0.7}
+            operations.append({"op": "update_guest", "id": rng.choice(guest_ids), "guest": guest})
+        elif roll < 0.8:
+            operations.append({"op": "move_guest", "id": rng.choice(guest_ids), "family_id": rng.choice(family_ids)})
+        elif roll < 0.85:
+            operations.append({"op": "create_family", "family_name": f"Nuova famiglia {i}"})
+        elif roll < 0.95:
+            operations.append({"op": "update_family", "id": rng.choice(family_ids), "family_name": f"Famiglia {i}"})
+        else:
+            operations.append({"op": "delete_guest", "id": guest_ids.pop(rng.randrange(len(guest_ids)))})
+    return operations
+
+
+def send_one(client, operation: dict, headers: dict) -> None:
+    """Apply `operation` with the matching single-item admin endpoint."""
+    op = operation["op"]
+    if op == "create_guest":
+        response = client.post("/api/admin/guests", json=operation["guest"], headers=headers)
+    elif op == "update_guest":
+        response = client.patch(f"/api/admin/guests/{operation['id']}", json=operation["guest"], headers=headers)
+    elif op == "move_guest":
+        response = client.patch(f"/api/admin/guests/{operation['id']}",
+                                json={"family_id": operation["family_id"]}, headers=headers)
+    elif op == "create_family":
+        response = client.post("/api/admin/families", json={"family_name": operation["family_name"]}, headers=headers)
+    elif op == "update_family":
+        response = client.patch(f"/api/admin/families/{operation['id']}",
+                                json={"family_name": operation["family_name"]}, headers=headers)
+    else:
+        response = client.delete(f"/api/admin/guests/{operation['id']}", headers=headers)
+    response.raise_for_status()
+
+
+def guest_list(client, headers: dict) -> list:
+    """The admin view of the guest list, without timestamps."""
+    data = client.get("/api/admin/data", headers=headers).json()
+    guests = [guest for family in data["families"] for guest in family["guests"]] + data["individuals"]
+    for guest in guests:
+        guest.pop("updated_at")
+    families = sorted((family["id"], family["family_name"]) for family in data["families"])
+    return [families, sorted(guests, key=lambda guest: guest["id"])]
+
+
+def main() -> int:
+    args = parse_args()
+    from fastapi.testclient import TestClient
+
+    from routers import admin
+
+    headers = {"X-Admin-Password": admin.ADMIN_PASSWORD}
+    clients = {}
+    for mode in ("individual", "batch"):
+        session_factory = _bench.make_session_factory(f"admin_{mode}.db")
+        seed_families(session_factory, args.families)
+        clients[mode] = (TestClient(_bench.build_app(session_factory, admin.router)), session_factory.kw["bind"])
+
+    client = clients["individual"][0]
+    data = client.get("/api/admin/data", headers=headers).json()
+    family_ids = [family["id"] for family in data["families"]]
+    guest_ids = [guest["id"] for family in data["families"] for guest in family["guests"]]
+    guest_ids += [guest["id"] for guest in data["individuals"]]
+    operations = make_operations(args.operations, guest_ids, family_ids)
+
+    client, engine = clients["individual"]
+    with count_statements(engine) as statements:
+        started = time.perf_counter()
+        for operation in operations:
+            send_one(client, operation, headers)
+        elapsed = time.perf_counter() - started
+    print(f"one request per operation  {elapsed:7.2f}s  {len(statements):6} statements  "
+          f"({args.operations} requests)")
+
+    client, engine = clients["batch"]
+    with count_statements(engine) as statements:
+        started = time.perf_counter()
+        response = client.post("/api/admin/batch", json={"operations": operations}, headers=headers)
+        elapsed = time.perf_counter() - started
+    response.raise_for_status()
+    print(f"one batch                  {elapsed:7.2f}s  {len(statements):6} statements  (1 request)")
+
+    same = guest_list(clients["individual"][0], headers) == guest_list(clients["batch"][0], headers)
+    print("same guest list afterwards: " + ("OK" if same else "FAIL"))
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Compare the sync and async database paths under many concurrent clients.
+
+Seeds families and ready photos, then lets N concurrent clients (500 by
+default, an invitation-link spike) send a mix of `GET /api/families`,
+`GET /api/rsvp/stats`, `GET /api/photos`, `GET /api/photos/{id}/status`
+and `PATCH /api/families/{id}/guests`. Reports requests/sec and latency
+percentiles for each `DB_ASYNC` mode. With `DB_ASYNC=0` every request
+holds one of the threadpool's 40 threads; with `DB_ASYNC=1` the endpoints
+are coroutines on an AsyncSession.
+
+Usage:
+    python scripts/bench_async_db.py [--clients 500] [--requests 10000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+import _bench
+from bench_photo_search import photo_rows
+from check_query_counts import seed_families
+
+MODES = ("0", "1")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=500, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=10_000, help="Total requests")
+    parser.add_argument("--families", type=int, default=200, help="Families to seed")
+    parser.add_argument("--photos", type=int, default=2_000, help="Ready photos to seed")
+    parser.add_argument("--writes", type=float, default=0.05, help="Share of RSVP updates")
+    parser.add_argument(
+        "--db-async",
+        choices=("all", *MODES),
+        default="all",
+        help="DB_ASYNC mode to measure (default: run each in a subprocess)",
+    )
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> None:
+    import httpx
+
+    from models import Photo
+    from routers import photos, rsvp
+
+    session_factory = _bench.make_session_factory("async_db.db")
+    seed_families(session_factory, args.families)
+    rows = photo_rows(args.photos)
+    db = session_factory()
+    db.execute(Photo.__table__.insert(), rows)
+    db.commit()
+    db.close()
+    photo_ids = [row["id"] for row in rows]
+
+    app = _bench.build_app(session_factory, rsvp.router, photos.router)
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    errors: dict[str, int] = {}
+    remaining = args.requests
+
+    transport = httpx.ASGITransport(app=app, client=("10.0.0.1", 1234))
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 timeout=None, limits=limits) as client:
+        families = (await client.get("/api/families")).json()
+
+        def next_request(rng: random.Random) -> tuple[str, str, dict]:
+            if rng.random() >= args.writes:
+                roll = rng.random()
+                if roll < 0.3:
+                    return "GET", "/api/families", {}
+                if roll < 0.4:
+                    return "GET", "/api/rsvp/stats", {}
+                if roll < 0.7:
+                    return "GET", "/api/photos", {"params": {"per_page": 20}}
+                return "GET", f"/api/photos/{rng.choice(photo_ids)}/status", {}
+            family = rng.choice(families)
+            updates = {guest["id"]: rng.choice(("ceremony", "lunch", "decline")) for guest in family["guests"]}
+            return "PATCH", f"/api/families/{family['id']}/guests", {"json": {"guest_updates": updates}}
+
+        async def client_loop(worker: int) -> None:
+            nonlocal remaining
+            rng = random.Random(worker)
+            while remaining > 0:
+                remaining -= 1
+                method, path, kwargs = next_request(rng)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, **kwargs)
+                except Exception as exc:  # noqa: BLE001 - app exceptions propagate through ASGITransport
+                    errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(i) for i in range(args.clients)))
+        elapsed = time.perf_counter() - started
+
+    print(f"DB_ASYNC={os.environ['DB_ASYNC']} clients={args.clients} requests={args.requests} "
+          f"elapsed={elapsed:.2f}s ({args.requests / elapsed:.0f} req/s) statuses={statuses} errors={errors}")
+    print(_bench.format_latencies("  all requests", latencies))
+
+
+def main() -> int:
+    args = parse_args()
+    if args.db_async == "all":
+        for mode in MODES:
+            cmd = [sys.executable, __file__, "--db-async", mode,
+                   "--clients", str(args.clients),
+                   "--requests", str(args.requests),
+                   "--families", str(args.families),
+                   "--photos", str(args.photos),
+                   "--writes", str(args.writes)]
+            subprocess.run(cmd, check=True)
+        return 0
+
+    # Read when async_db is imported, so set it first
+    os.environ["DB_ASYNC"] = args.db_async
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
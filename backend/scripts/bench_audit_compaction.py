@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Measure the vote audit compaction and the multi-group check before and after it.
+
+Seeds 1M audit rows spread over the last 90 days (the same IP mix as
+`bench_vote_audit.py`), times `vote_scopes.other_scope_exists` (map
+disabled) and `vote_scopes.warm`, then compacts everything older than the
+retention, runs `maintain` and a full `vacuum`, and times the checks again.
+Reports the database size and row counts at each step, and checks that the
+answers didn't change and that every compacted row is in the archive and
+counted in the summaries.
+
+Usage:
+    python scripts/bench_audit_compaction.py [--rows 1000000] [--days 90] [--retention-days 30]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import random
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import _bench
+from bench_vote_audit import SHARED_IP, seed_audits, time_checks
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Audit rows to seed")
+    parser.add_argument("--days", type=float, default=90, help="Days the rows are spread over")
+    parser.add_argument("--retention-days", type=float, default=30, help="Age of the rows compacted")
+    parser.add_argument("--checks", type=int, default=2_000, help="Checks to time per variant")
+    return parser.parse_args()
+
+
+def describe(label: str, engine) -> None:
+    """Print the database size and the audit row counts."""
+    from sqlalchemy import func, select
+
+    from models import VoteAudit, VoteAuditSummary
+
+    with engine.connect() as connection:
+        raw = connection.scalar(select(func.count()).select_from(VoteAudit))
+        summaries = connection.scalar(select(func.count()).select_from(VoteAuditSummary))
+        pages = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+    print(f"{label}: vote_audits={raw} vote_audit_summaries={summaries} "
+          f"database={pages * page_size / 1e6:.1f}MB")
+
+
+def measure(label: str, session_factory, samples: dict) -> dict:
+    """Time the check for each sample set and warm(); return the answers."""
+    import vote_scopes
+
+    answers = {}
+    db = session_factory()
+    vote_scopes.VOTE_SCOPE_CACHE_SIZE = 0
+    vote_scopes.clear()
+    for name, checks in samples.items():
+        latencies, answers[name] = time_checks(db, vote_scopes.other_scope_exists, checks)
+        print(_bench.format_latencies(f"  {label}, {name}", latencies))
+    vote_scopes.VOTE_SCOPE_CACHE_SIZE = 10_000
+    started = time.perf_counter()
+    answers["warm"] = vote_scopes.warm(db)
+    print(f"  {label}, warm(): {answers['warm']} IPs in {(time.perf_counter() - started) * 1000:.0f}ms")
+    vote_scopes.clear()
+    db.close()
+    return answers
+
+
+def main() -> int:
+    args = parse_args()
+    from sqlalchemy import func, select
+
+    import audit_compaction
+    from models import VoteAuditSummary
+
+    session_factory = _bench.make_session_factory("audit_compaction.db")
+    engine = session_factory.kw["bind"]
+    started = time.perf_counter()
+    scopes = seed_audits(session_factory, args.rows, days=args.days)
+    print(f"seeded {args.rows} audit rows over {args.days:g} days in {time.perf_counter() - started:.1f}s")
+    describe("before", engine)
+
+    rng = random.Random(1)
+    samples = {
+        "ordinary IPs": [(ip, scopes[ip]) for ip in rng.choices(sorted(scopes), k=args.checks)],
+        "shared IP": [(SHARED_IP, scopes[SHARED_IP])] * 50,
+    }
+    before = measure("before", session_factory, samples)
+
+    cutoff = datetime.utcnow() - timedelta(days=args.retention_days)
+    started = time.perf_counter()
+    result = audit_compaction.compact(engine, cutoff, _bench.WORK_DIR / "audit_archive")
+    print(f"compact: {result['compacted']} rows in {result['batches']} batches, "
+          f"{time.perf_counter() - started:.1f}s")
+    started = time.perf_counter()
+    maintenance = audit_compaction.maintain(engine)
+    print(f"maintain: {maintenance} in {time.perf_counter() - started:.1f}s")
+    describe("compacted", engine)
+    started = time.perf_counter()
+    audit_compaction.vacuum(engine)
+    print(f"vacuum: {time.perf_counter() - started:.1f}s")
+    describe("vacuumed", engine)
+
+    after = measure("after", session_factory, samples)
+
+    with gzip.open(result["archive"]) as archive:
+        archived = sum(1 for _ in archive)
+    with engine.connect() as connection:
+        summarized = connection.scalar(select(func.sum(VoteAuditSummary.votes)))
+    archive_size = Path(result["archive"]).stat().st_size
+    print(f"archive: {archived} rows in {archive_size / 1e6:.1f}MB; summaries: {summarized} votes")
+    ok = before == after and archived == summarized == result["compacted"]
+    print("same answers, nothing lost: " + ("OK" if ok else "FAIL"))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
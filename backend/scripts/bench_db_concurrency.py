@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Measure RSVP throughput and lock errors under concurrent reads and writes.
+
+Seeds a SQLite database with families and guests, then runs concurrent
+clients for a fixed time: writers send `PATCH /api/families/{id}/guests`
+and `PATCH /api/guests/{id}`, readers poll `GET /api/families`,
+`GET /api/guests` and `GET /api/rsvp/stats`. Reports requests per second,
+latency and how many requests failed with "database is locked", for each
+`SQLITE_PROFILE`.
+
+Usage:
+    python scripts/bench_db_concurrency.py [--seconds 10] [--writers 8] [--readers 8]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+import _bench
+from check_query_counts import seed_families
+
+PROFILES = ("default", "tuned")
+READ_PATHS = ("/api/families", "/api/guests", "/api/rsvp/stats")
+CHOICES = ("ceremony", "lunch", "decline")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10, help="Duration of each run")
+    parser.add_argument("--writers", type=int, default=8, help="Concurrent RSVP writers")
+    parser.add_argument("--readers", type=int, default=8, help="Concurrent guest-list readers")
+    parser.add_argument("--families", type=int, default=200, help="Families to seed")
+    parser.add_argument(
+        "--profile",
+        choices=("all", *PROFILES),
+        default="all",
+        help="SQLITE_PROFILE to measure (default: run each in a subprocess)",
+    )
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> None:
+    import httpx
+
+    from routers import rsvp
+
+    session_factory = _bench.make_session_factory("concurrency.db", args.profile)
+    seed_families(session_factory, args.families)
+    app = _bench.build_app(session_factory, rsvp.router)
+    latencies: dict[str, list[float]] = {"read": [], "write": []}
+    errors: dict[str, int] = {"locked": 0, "other": 0}
+
+    async def call(kind: str, client, method: str, path: str, **kwargs) -> None:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            response.raise_for_status()
+        except Exception as exc:  # noqa: BLE001 - app exceptions propagate through ASGITransport
+            errors["locked" if "database is locked" in str(exc) else "other"] += 1
+            return
+        latencies[kind].append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        families = (await client.get("/api/families")).json()
+        deadline = time.perf_counter() + args.seconds
+        # One IP for everyone, so the multi-device warning never fires
+        headers = {"x-real-ip": "10.0.0.1"}
+
+        async def writer(worker: int) -> None:
+            rng = random.Random(worker)
+            while time.perf_counter() < deadline:
+                family = rng.choice(families)
+                if rng.random() < 0.5:
+                    updates = {guest["id"]: rng.choice(CHOICES) for guest in family["guests"]}
+                    await call("write", client, "PATCH", f"/api/families/{family['id']}/guests",
+                               json={"guest_updates": updates}, headers=headers)
+                else:
+                    guest = rng.choice(family["guests"])
+                    await call("write", client, "PATCH", f"/api/guests/{guest['id']}",
+                               json={"attendance_choice": rng.choice(CHOICES)}, headers=headers)
+
+        async def reader(worker: int) -> None:
+            rng = random.Random(1000 + worker)
+            while time.perf_counter() < deadline:
+                await call("read", client, "GET", rng.choice(READ_PATHS))
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(writer(i) for i in range(args.writers)),
+            *(reader(i) for i in range(args.readers)),
+        )
+        elapsed = time.perf_counter() - started
+
+    done = len(latencies["read"]) + len(latencies["write"])
+    failed = errors["locked"] + errors["other"]
+    print(f"profile={args.profile} elapsed={elapsed:.1f}s "
+          f"throughput={done / elapsed:.0f} req/s "
+          f"(writes {len(latencies['write']) / elapsed:.0f}/s) "
+          f"locked={errors['locked']} ({errors['locked'] / max(done + failed, 1):.1%}) "
+          f"other_errors={errors['other']}")
+    print(_bench.format_latencies("  reads ", latencies["read"]))
+    print(_bench.format_latencies("  writes", latencies["write"]))
+
+
+def main() -> int:
+    args = parse_args()
+    if args.profile == "all":
+        for profile in PROFILES:
+            cmd = [sys.executable, __file__, "--profile", profile,
+                   "--seconds", str(args.seconds),
+                   "--writers", str(args.writers),
+                   "--readers", str(args.readers),
+                   "--families", str(args.families)]
+            subprocess.run(cmd, check=True)
+        return 0
+
+    os.environ["SQLITE_PROFILE"] = args.profile
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
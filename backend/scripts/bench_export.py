@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Compare the admin JSON dump with the streaming CSV/XLSX exports.
+
+Seeds guest lists of increasing size (families of 4 plus individual guests,
+with RSVPs, allergens and notes), then requests `GET /api/admin/data`,
+`GET /api/admin/export?format=csv` and `?format=xlsx` once each, driving the
+ASGI app directly so that the time to the first body chunk is visible.
+Reports time to first byte, total time, response size and the peak Python
+memory allocated while serving (tracemalloc, measured in a second request so
+its overhead doesn't skew the timings). The exports' peak should stay flat as
+the guest list grows.
+
+Usage:
+    python scripts/bench_export.py [--guests 10000 100000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+
+import _bench
+
+REQUESTS = (
+    ("admin/data (JSON)", "/api/admin/data", b""),
+    ("export csv", "/api/admin/export", b"format=csv"),
+    ("export xlsx", "/api/admin/export", b"format=xlsx"),
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--guests", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Guest list sizes to seed")
+    return parser.parse_args()
+
+
+def seed_guests(session_factory, count: int, seed: int = 0) -> None:
+    """Insert `count` guests, 80% of them in families of 4, with random RSVPs."""
+    from sqlalchemy import insert
+
+    from models import Family, Guest
+    from schemas import ALLERGEN_OPTIONS
+
+    rng = random.Random(seed)
+    allergens = sorted(ALLERGEN_OPTIONS)
+    db = session_factory()
+    family_ids = db.scalars(
+        insert(Family).returning(Family.id, sort_by_parameter_order=True),
+        [{"family_name": f"Famiglia {i}"} for i in range(int(count * 0.8) // 4)],
+    ).all()
+    rows = []
+    for i in range(count):
+        choice = rng.choice((None, "ceremony", "lunch", "decline"))
+        rows.append({
+            "name": f"Ospite {i}",
+            "family_id": family_ids[i // 4] if i // 4 < len(family_ids) else None,
+            "attendance_choice": choice,
+            "attend_ceremony": None if choice is None else choice != "decline",
+            "attend_lunch": None if choice is None else choice == "lunch",
+            "allergens": rng.sample(allergens, rng.choice((0, 0, 0, 1, 2))),
+            "dietary_notes": rng.choice((None, "vegetariano", "senza maiale")),
+            "admin_notes": rng.choice((None, None, "tavolo 4")),
+        })
+    db.execute(insert(Guest), rows)
+    db.commit()
+    db.close()
+
+
+async def fetch(app, path: str, query: bytes, headers: list) -> tuple[float, float, int]:
+    """GET `path` from `app`; return (seconds to first body byte, total seconds, body bytes)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query,
+        "root_path": "", "headers": headers, "client": ("10.0.0.1", 1234), "server": ("bench", 80),
+    }
+    first_byte = None
+    size = 0
+    started = time.perf_counter()
+
+    request_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # StreamingResponse listens for a disconnect while it streams
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal first_byte, size
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(message["body"])
+
+    await app(scope, receive, send)
+    disconnected.set()
+    return first_byte or 0.0, time.perf_counter() - started, size
+
+
+async def measure(app, headers: list) -> None:
+    for label, path, query in REQUESTS:
+        first_byte, total, size = await fetch(app, path, query, headers)
+        tracemalloc.start()
+        await fetch(app, path, query, headers)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {label:<20} first byte={first_byte * 1000:8.1f}ms  total={total * 1000:8.1f}ms  "
+              f"size={size / 1e6:6.1f}MB  peak alloc={peak / 1e6:7.1f}MB")
+
+
+def main() -> int:
+    args = parse_args()
+    from routers import admin
+
+    headers = [(b"x-admin-password", admin.ADMIN_PASSWORD.encode())]
+    for count in args.guests:
+        session_factory = _bench.make_session_factory(f"export_{count}.db")
+        seed_guests(session_factory, count)
+        app = _bench.build_app(session_factory, admin.router)
+        print(f"{count} guests:")
+        asyncio.run(measure(app, headers))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Micro-benchmark `image_utils.process_upload` over a corpus of photos.
+
+Each (file, mode) pair runs in a fresh subprocess so peak RSS is measured
+per image type. Modes compare JPEG draft decoding (`PHOTO_DRAFT_DECODE=1`)
+with full-resolution decoding (`PHOTO_DRAFT_DECODE=0`); other formats are
+unaffected by draft mode and serve as a control.
+
+Without `--corpus`, a synthetic corpus of phone-sized JPEG (12 and 48 MP),
+PNG and HEIC files is generated.
+
+Usage:
+    python scripts/bench_image_pipeline.py [--corpus DIR] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import _bench
+
+MODES = {"draft": "1", "full-decode": "0"}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", type=Path, default=None,
+                        help="Directory of sample images (default: generate one)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per image")
+    parser.add_argument("--child", type=Path, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def build_corpus(directory: Path) -> list[Path]:
+    """Write synthetic phone-like photos to `directory`."""
+    from PIL import Image
+
+    directory.mkdir(parents=True, exist_ok=True)
+    jpeg_12mp = _bench.sample_jpeg(4032, 3024, seed=1)
+    samples = {
+        "phone_12mp.jpg": jpeg_12mp,
+        "phone_48mp.jpg": _bench.sample_jpeg(8064, 6048, seed=2),
+    }
+    img = Image.open(io.BytesIO(jpeg_12mp))
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    samples["screenshot_12mp.png"] = buffer.getvalue()
+    try:
+        from pillow_heif import register_heif_opener
+
+        register_heif_opener()
+        buffer = io.BytesIO()
+        img.save(buffer, "HEIF", quality=80)
+        samples["iphone_12mp.heic"] = buffer.getvalue()
+    except ImportError:
+        print("pillow_heif not installed: skipping HEIC sample")
+
+    paths = []
+    for name, data in samples.items():
+        path = directory / name
+        path.write_bytes(data)
+        paths.append(path)
+    return paths
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process in MB.
+
+    Prefers VmHWM, which starts fresh at exec; ru_maxrss on Linux keeps the
+    peak of the parent that forked us.
+    """
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(path: Path, repeat: int) -> None:
+    """Process `path` `repeat` times and print timing and peak RSS as JSON."""
+    import image_utils
+
+    image_utils.ensure_dirs()
+    image_utils.process_upload(path)  # warm up codecs
+    started = time.perf_counter()
+    for _ in range(repeat):
+        photo_id, *_ = image_utils.process_upload(path)
+        image_utils.delete_photo_files(photo_id)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"ms": elapsed / repeat * 1000, "rss_mb": peak_rss_mb()}))
+
+
+def main() -> int:
+    args = parse_args()
+    if args.child:
+        run_child(args.child, args.repeat)
+        return 0
+
+    corpus = sorted(p for p in args.corpus.iterdir() if p.is_file()) if args.corpus \
+        else build_corpus(_bench.WORK_DIR / "corpus")
+
+    print(f"{'image':<24} {'size':>8} " + " ".join(f"{m + ' ms':>16} {m + ' RSS':>16}" for m in MODES))
+    for path in corpus:
+        cells = []
+        for flag in MODES.values():
+            env = {**os.environ, "PHOTO_DRAFT_DECODE": flag}
+            result = subprocess.run(
+                [sys.executable, __file__, "--child", str(path), "--repeat", str(args.repeat)],
+                env=env, check=True, capture_output=True, text=True,
+            )
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            cells.append(f"{stats['ms']:16.1f} {stats['rss_mb']:13.1f} MB")
+        size_mb = path.stat().st_size / 1024 / 1024
+        print(f"{path.name:<24} {size_mb:6.1f}MB " + " ".join(cells))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Compare deep-page latency of offset and cursor pagination on `GET /api/photos`.
+
+Seeds a SQLite database with N ready photos, then requests pages at
+increasing depths, once with `?page=` (OFFSET) and once with `?cursor=`
+(keyset on created_at, id). Also reports the cost of counting the total,
+uncached and cached.
+
+Usage:
+    python scripts/bench_photo_pagination.py [--sizes 10000 100000] [--repeat 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import _bench
+
+PER_PAGE = 20
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Gallery sizes to measure")
+    parser.add_argument("--repeat", type=int, default=20, help="Requests per measurement")
+    return parser.parse_args()
+
+
+def seed_photos(session_factory, count: int) -> None:
+    """Insert `count` ready photos, one second apart."""
+    from models import Photo
+
+    start = datetime(2026, 6, 1)
+    rows = [
+        {
+            "id": uuid.uuid4().hex,
+            "original_filename": f"{i}.jpg",
+            "uploader_name": f"Guest {i % 150}",
+            "mime_type": "image/jpeg",
+            "file_size": 500_000,
+            "width": 2048,
+            "height": 1536,
+            "variants": [],
+            "status": "ready",
+            "created_at": start + timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+    db = session_factory()
+    try:
+        db.execute(Photo.__table__.insert(), rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+def cursor_at(session_factory, depth: int) -> str | None:
+    """Cursor pointing just before the photo at offset `depth` (None for the first page)."""
+    from models import Photo
+    from routers.photos import _encode_cursor
+
+    if depth == 0:
+        return None
+    db = session_factory()
+    try:
+        photo = (
+            db.query(Photo)
+            .filter(Photo.status == "ready")
+            .order_by(Photo.created_at.desc(), Photo.id.desc())
+            .offset(depth - 1)
+            .first()
+        )
+        return _encode_cursor(photo)
+    finally:
+        db.close()
+
+
+async def measure(client, params: dict, repeat: int) -> list[float]:
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.get("/api/photos", params=params)
+        latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+    return latencies
+
+
+async def run_size(size: int, repeat: int) -> None:
+    import httpx
+
+    from routers import photos
+
+    session_factory = _bench.make_session_factory(f"pagination_{size}.db")
+    seed_photos(session_factory, size)
+    app = _bench.build_app(session_factory, photos.router)
+
+    print(f"--- {size} photos ---")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for depth in (0, size // 2, size - PER_PAGE):
+            page = depth // PER_PAGE + 1
+            offset_params = {"page": page, "per_page": PER_PAGE, "include_total": False}
+            cursor_params = {"per_page": PER_PAGE, "cursor": cursor_at(session_factory, depth)}
+            print(_bench.format_latencies(f"  offset page {page}",
+                                          await measure(client, offset_params, repeat)))
+            print(_bench.format_latencies(f"  cursor at {depth}",
+                                          await measure(client, cursor_params, repeat)))
+
+        photos.PHOTO_COUNT_CACHE_TTL = 0
+        params = {"per_page": PER_PAGE, "include_total": True}
+        print(_bench.format_latencies("  first page + COUNT(*)", await measure(client, params, repeat)))
+        photos.PHOTO_COUNT_CACHE_TTL = 60
+        photos._invalidate_counts()
+        print(_bench.format_latencies("  first page + cached total", await measure(client, params, repeat)))
+
+
+def main() -> int:
+    args = parse_args()
+    for size in args.sizes:
+        asyncio.run(run_size(size, args.repeat))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
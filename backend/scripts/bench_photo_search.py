@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Compare gallery search latency with the FTS5 index and with ILIKE.
+
+Seeds a SQLite database with N ready photos uploaded by ~150 guests with
+Italian names and captions, then times `GET /api/photos?search=...` for a
+few search-as-you-type queries (first page, no total, as the gallery asks
+for it), once through `photos_fts` and once with the ILIKE fallback. Also
+reports what the sync triggers add to inserts and deletes, and checks that
+counting the totals of many distinct searches keeps at most
+PHOTO_COUNT_CACHE_SIZE of them, and drops them once the gallery changed.
+
+Usage:
+    python scripts/bench_photo_search.py [--photos 50000] [--repeat 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import _bench
+
+FIRST_NAMES = ["Giulia", "Nicolò", "Caterina", "Edoardo", "Francesca", "Lucà", "Chiara",
+               "Matteo", "Sofia", "Andrea", "Beatrice", "Niccolò", "Marta", "Pietro"]
+LAST_NAMES = ["Rossi", "Bianchi", "D'Angelo", "Esposito", "Romano", "Colombo", "Ricci",
+              "Marino", "Greco", "Bruno", "Gallo", "Conti", "De Luca", "Mancini"]
+CAPTION_WORDS = ["sposi", "torta", "brindisi", "chiesa", "ballo", "tavolo", "fiori",
+                 "amici", "tramonto", "festa", "pranzo", "cerimonia", "abbraccio", "città"]
+QUERIES = ["gi", "giu", "nicolo", "nicolo d'ang", "torta sposi", "citta", "zzz"]
+GUESTS = 150
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--photos", type=int, default=50_000, help="Photos in the gallery")
+    parser.add_argument("--repeat", type=int, default=20, help="Requests per query")
+    return parser.parse_args()
+
+
+def photo_rows(count: int, seed: int = 0) -> list[dict]:
+    """Build `count` ready photo rows with random names and captions."""
+    rng = random.Random(seed)
+    guests = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(GUESTS)]
+    start = datetime(2026, 6, 1)
+    return [
+        {
+            "id": uuid.uuid4().hex,
+            "original_filename": f"{i}.jpg",
+            "uploader_name": rng.choice(guests),
+            "caption": " ".join(rng.sample(CAPTION_WORDS, 3)) if rng.random() < 0.6 else None,
+            "mime_type": "image/jpeg",
+            "file_size": 500_000,
+            "variants": [],
+            "status": "ready",
+            "created_at": start + timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+def timed_write(session_factory, statement, rows) -> float:
+    """Execute `statement` for `rows` in one transaction and return the elapsed seconds."""
+    db = session_factory()
+    try:
+        started = time.perf_counter()
+        db.execute(statement, rows)
+        db.commit()
+        return time.perf_counter() - started
+    finally:
+        db.close()
+
+
+async def run(args: argparse.Namespace) -> bool:
+    import httpx
+    from sqlalchemy import delete
+
+    import photo_search
+    from models import Photo
+    from routers import photos
+
+    session_factory = _bench.make_session_factory("search.db")
+    engine = session_factory.kw["bind"]
+    photo_search.ensure_search_index(engine)
+
+    rows = photo_rows(args.photos)
+    insert = Photo.__table__.insert()
+    elapsed = timed_write(session_factory, insert, rows)
+    print(f"seeded {args.photos} photos with FTS triggers in {elapsed:.2f}s")
+
+    # Trigger overhead: the same batch into a database without the index
+    plain_factory = _bench.make_session_factory("search_plain.db")
+    elapsed_plain = timed_write(plain_factory, insert, photo_rows(args.photos))
+    print(f"seeded {args.photos} photos without FTS in   {elapsed_plain:.2f}s")
+
+    extra = photo_rows(50, seed=1)
+    timed_write(session_factory, insert, extra)
+    started = time.perf_counter()
+    for row in extra:
+        timed_write(session_factory, delete(Photo).where(Photo.id == row["id"]), None)
+    per_delete = (time.perf_counter() - started) / len(extra) * 1000
+    print(f"single-photo delete with FTS trigger: {per_delete:.1f} ms")
+
+    app = _bench.build_app(session_factory, photos.router)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode, available in (("fts5", True), ("ilike", False)):
+            photo_search._fts_available[str(engine.url)] = available
+            print(f"--- {mode} ---")
+            for query in QUERIES:
+                latencies = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    response = await client.get(
+                        "/api/photos", params={"search": query, "include_total": False}
+                    )
+                    latencies.append(time.perf_counter() - started)
+                    response.raise_for_status()
+                response = await client.get(
+                    "/api/photos", params={"search": query, "include_total": True}
+                )
+                photos._invalidate_counts()
+                total = response.json()["total"]
+                print(_bench.format_latencies(f"  {query!r} ({total})", latencies))
+
+        # Search-as-you-type: every prefix is a new search with its own total
+        searches = 2 * photos.PHOTO_COUNT_CACHE_SIZE
+        for i in range(searches):
+            response = await client.get("/api/photos", params={"search": f"giu{i}", "include_total": True})
+            response.raise_for_status()
+        cached = len(photos._count_cache)
+        print(f"count cache after {searches} distinct searches: {cached} entries "
+              f"(max {photos.PHOTO_COUNT_CACHE_SIZE})")
+        photos._invalidate_counts()
+        (await client.get("/api/photos", params={"search": "giu", "include_total": True})).raise_for_status()
+        after_change = len(photos._count_cache)
+        print(f"count cache after a gallery change and one search: {after_change} entries")
+        return cached <= photos.PHOTO_COUNT_CACHE_SIZE and after_change == 1
+
+
+def main() -> int:
+    args = parse_args()
+    ok = asyncio.run(run(args))
+    print("count cache bounded: " + ("OK" if ok else "FAIL"))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Measure the rate limiter: memory for 100k client IPs, cost per hit, sharing across processes.
+
+1. Memory: hits from 100k distinct IPs over a simulated day, each IP active
+   for a few minutes, 10% of them uploading a lot, with the old per-IP
+   timestamp lists and with the memory backend (idle keys expiring only,
+   and also capped at 1k keys). Reports the Python memory held afterwards
+   (tracemalloc).
+2. Cost per hit of each backend (Redis only if `redis` is installed and
+   RATE_LIMIT_REDIS_URL answers).
+3. Sharing: 4 processes hit the same key; with the sqlite backend the total
+   allowed must equal the limit, with the memory backend each process
+   allows the full limit.
+
+Usage:
+    python scripts/bench_rate_limit.py [--ips 100000] [--hits 300000] [--hours 24]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import multiprocessing
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+
+import _bench
+
+LIMIT = 30
+WINDOW = 3600.0
+PROCESSES = 4
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ips", type=int, default=100_000, help="Distinct client IPs")
+    parser.add_argument("--hits", type=int, default=300_000, help="Hits spread over the IPs")
+    parser.add_argument("--hours", type=float, default=24, help="Simulated time the hits are spread over")
+    return parser.parse_args()
+
+
+class LegacyLimiter:
+    """The upload limiter before `rate_limit`: a list of timestamps per IP, never evicted."""
+
+    def __init__(self):
+        self.timestamps: dict[str, list[float]] = defaultdict(list)
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> float:
+        cutoff = now - window
+        self.timestamps[key] = [t for t in self.timestamps[key] if t > cutoff]
+        if len(self.timestamps[key]) >= limit:
+            return 1.0
+        self.timestamps[key].append(now)
+        return 0.0
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+def make_hits(ips: int, hits: int, hours: float, seed: int = 0) -> list[tuple[str, float]]:
+    """(ip, time) pairs over `hours`: each IP is active for a few minutes, 10% of them upload a lot."""
+    rng = random.Random(seed)
+    names = [f"10.{i // 65536}.{i // 256 % 256}.{i % 256}" for i in range(ips)]
+    arrivals = {name: rng.uniform(0, hours * 3600) for name in names}
+    keys = names + [rng.choice(names[: ips // 10]) for _ in range(hits - ips)]
+    hits = [(key, arrivals[key] + rng.uniform(0, 600)) for key in keys]
+    hits.sort(key=lambda hit: hit[1])
+    return hits
+
+
+def measure_memory(label: str, make_backend, hits: list) -> None:
+    gc.collect()
+    tracemalloc.start()
+    backend = make_backend()
+    started = time.perf_counter()
+    for key, now in hits:
+        backend.hit(key, LIMIT, WINDOW, now)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<32} keys kept={len(backend):<7} memory={current / 1e6:6.1f}MB  "
+          f"{elapsed / len(hits) * 1e6:5.1f}us/hit")
+
+
+def time_backend(label: str, backend, hits: list) -> None:
+    latencies = []
+    now = time.time()
+    for key, offset in hits:
+        started = time.perf_counter()
+        backend.hit(key, LIMIT, WINDOW, now + offset)
+        latencies.append(time.perf_counter() - started)
+    print(_bench.format_latencies(f"  {label}", latencies))
+
+
+def hammer(backend_name: str, path: str, hits: int, results) -> None:
+    """Hit one key `hits` times with a fresh backend; report the allowed count."""
+    import rate_limit
+
+    backend = rate_limit.SQLiteBackend(path) if backend_name == "sqlite" else rate_limit.MemoryBackend()
+    now = time.time()
+    results.put(sum(1 for _ in range(hits) if not backend.hit("shared-ip", LIMIT, WINDOW, now)))
+
+
+def measure_sharing(backend_name: str) -> bool:
+    path = str(_bench.WORK_DIR / "rate_limits.db")
+    for suffix in ("", "-wal", "-shm"):
+        (_bench.WORK_DIR / f"rate_limits.db{suffix}").unlink(missing_ok=True)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=hammer, args=(backend_name, path, LIMIT * 2, results))
+               for _ in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    allowed = sum(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    print(f"  {backend_name:<8} {PROCESSES} processes x {LIMIT * 2} hits on one key: "
+          f"{allowed} allowed (limit {LIMIT})")
+    return allowed == LIMIT
+
+
+def main() -> int:
+    args = parse_args()
+    import rate_limit
+
+    hits = make_hits(args.ips, args.hits, args.hours)
+    print(f"memory after {len(hits)} hits from {args.ips} IPs over {args.hours:g}h "
+          f"(limit {LIMIT}/{WINDOW:.0f}s):")
+    measure_memory("old timestamp lists", LegacyLimiter, hits)
+    measure_memory("memory backend", lambda: rate_limit.MemoryBackend(max_keys=10**9), hits)
+    measure_memory("memory backend, 1k keys max", lambda: rate_limit.MemoryBackend(max_keys=1_000), hits)
+
+    print("cost per hit:")
+    sample = hits[:20_000]
+    time_backend("memory", rate_limit.MemoryBackend(), sample)
+    time_backend("sqlite", rate_limit.SQLiteBackend(str(_bench.WORK_DIR / "rate_limits_timing.db")), sample)
+    try:
+        backend = rate_limit.RedisBackend()
+        backend.hit("bench-ping", LIMIT, WINDOW, time.time())
+    except Exception as exc:  # noqa: BLE001 - package missing or server down
+        print(f"  redis skipped: {exc}")
+    else:
+        time_backend("redis", backend, sample)
+
+    print("sharing across processes:")
+    measure_sharing("memory")
+    shared = measure_sharing("sqlite")
+    print("sqlite backend shares the limit: " + ("OK" if shared else "FAIL"))
+    return 0 if shared else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Time seeding a large guest list: the old wipe-and-reload vs the incremental sync.
+
+Writes an invitation file with N guests (10k by default; families of 2-6
+plus individual guests), then times:
+
+- the old `seed_data.py`: delete every guest and family, then insert them
+  again with a commit per family
+- `sync_guests` on an empty database
+- `sync_guests` rerun on the unchanged file (the usual container start)
+- `sync_guests` after editing 1% of the file (added, renamed and moved
+  guests), with RSVPs recorded for every guest beforehand
+
+and checks that the rerun changed nothing and that the edit kept the RSVP
+of every guest still in the file.
+
+Usage:
+    python scripts/bench_seed.py [--guests 10000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+import _bench
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--guests", type=int, default=10_000, help="Guests in the invitation file")
+    parser.add_argument("--edit", type=float, default=0.01, help="Share of guests edited before the last sync")
+    return parser.parse_args()
+
+
+def guest_list(count: int, seed: int = 0) -> tuple[list[dict], list[str]]:
+    """Families of 2-6 members holding ~80% of `count` guests, the rest individuals."""
+    rng = random.Random(seed)
+    families, individuals = [], []
+    total = 0
+    while total < count * 0.8:
+        size = rng.randint(2, 6)
+        i = len(families)
+        families.append({"name": f"Famiglia {i}", "members": [f"Ospite {i}.{j}" for j in range(size)]})
+        total += size
+    individuals = [f"Singolo {i}" for i in range(count - total)]
+    return families, individuals
+
+
+def write_invitations(path, families: list[dict], individuals: list[str]) -> None:
+    """Write the guest list in the format `parse_invitations` reads."""
+    with open(path, "w") as f:
+        for name in individuals:
+            f.write(f"{name}\n")
+        for fam in families:
+            f.write(f"\n# {fam['name']}\n")
+            f.write("".join(f"{member}\n" for member in fam["members"]))
+
+
+def edit(families: list[dict], individuals: list[str], share: float, seed: int = 1) -> None:
+    """Add, rename and move `share` of the guests in place, a third each."""
+    rng = random.Random(seed)
+    changes = max(3, int(share * (sum(len(fam["members"]) for fam in families) + len(individuals))))
+    for i in range(changes // 3):
+        rng.choice(families)["members"].append(f"Nuovo {i}")
+    for fam in rng.sample(families, changes // 3):
+        fam["members"][0] = fam["members"][0] + " (rinominato)"
+    for _ in range(changes // 3):
+        source, target = rng.sample(families, 2)
+        if len(source["members"]) > 1:
+            target["members"].append(source["members"].pop())
+
+
+def legacy_seed(session_factory, families: list[dict], individuals: list[str]) -> None:
+    """The seeding of `seed_data.py` before the incremental sync."""
+    from models import Family, Guest
+
+    db = session_factory()
+    db.query(Guest).delete()
+    db.query(Family).delete()
+    db.commit()
+    for fam_data in families:
+        family = Family(family_name=fam_data["name"])
+        db.add(family)
+        db.commit()
+        db.refresh(family)
+        for member_name in fam_data["members"]:
+            db.add(Guest(name=member_name, family_id=family.id))
+    for name in individuals:
+        db.add(Guest(name=name, family_id=None))
+    db.commit()
+    db.close()
+
+
+def sync(session_factory, path) -> tuple[float, dict]:
+    """Run the incremental sync from the file at `path`; return (seconds, stats)."""
+    from seed_data import parse_invitations, sync_guests
+
+    started = time.perf_counter()
+    families, individuals = parse_invitations(str(path))
+    db = session_factory()
+    try:
+        stats = sync_guests(db, families, individuals)
+        db.commit()
+    finally:
+        db.close()
+    return time.perf_counter() - started, stats
+
+
+def main() -> int:
+    args = parse_args()
+    from sqlalchemy import func, select, update
+
+    from models import Guest
+
+    families, individuals = guest_list(args.guests)
+    path = _bench.WORK_DIR / "invitation.txt"
+    write_invitations(path, families, individuals)
+    print(f"{args.guests} guests: {len(families)} families, {len(individuals)} individuals")
+
+    session_factory = _bench.make_session_factory("seed_legacy.db")
+    legacy_seed(session_factory, families, individuals)
+    started = time.perf_counter()
+    legacy_seed(session_factory, families, individuals)
+    print(f"  wipe and reload (old)        {time.perf_counter() - started:8.2f}s  (all RSVPs lost)")
+
+    session_factory = _bench.make_session_factory("seed_sync.db")
+    elapsed, stats = sync(session_factory, path)
+    print(f"  sync, empty database         {elapsed:8.2f}s  {stats}")
+    elapsed, stats = sync(session_factory, path)
+    print(f"  sync, unchanged file         {elapsed:8.2f}s  {stats}")
+    unchanged = stats["guests_added"] == stats["guests_moved"] == stats["families_added"] == 0
+
+    db = session_factory()
+    db.execute(update(Guest).values(attendance_choice="ceremony", attend_ceremony=True))
+    db.commit()
+    db.close()
+    edit(families, individuals, args.edit)
+    write_invitations(path, families, individuals)
+    elapsed, stats = sync(session_factory, path)
+    print(f"  sync, {args.edit:.0%} of the file edited  {elapsed:8.2f}s  {stats}")
+
+    db = session_factory()
+    in_file = sum(len(fam["members"]) for fam in families) + len(individuals)
+    kept = db.scalar(select(func.count()).where(Guest.attendance_choice == "ceremony")) - stats["guests_stale"]
+    db.close()
+    # Everyone in the file kept their RSVP, except the renamed and new guests
+    expected = in_file - stats["guests_added"]
+    print(f"  RSVPs kept for {kept} of the {expected} guests still in the file")
+    ok = unchanged and kept == expected
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Measure the backend's cold start: import, lifespan startup and first requests.
+
+Starts fresh interpreters against a copy of the committed `wedding.db`
+brought to the latest revision, and in each one times `import main`, the
+lifespan startup (directories, schema revision check, workers) and the
+first `GET /api/families` and `GET /api/photos`. Also times one start on
+the database as committed, where the pending migrations run. Reports the
+median of each step and exits non-zero if the median cold start (import +
+startup + first request) exceeds the budget.
+
+Usage:
+    python scripts/bench_startup.py [--runs 5] [--budget-ms 2500]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+import _bench
+
+STEPS = ("import", "startup", "first_families", "first_photos")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start")
+    parser.add_argument("--budget-ms", type=float, default=2500,
+                        help="Max median of import + startup + first /api/families")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def child() -> None:
+    """Time one cold start in this (fresh) interpreter and print it as JSON."""
+    timings = {}
+    started = time.perf_counter()
+    import main
+    timings["import"] = time.perf_counter() - started
+
+    import asyncio
+
+    import httpx
+
+    async def run() -> None:
+        started = time.perf_counter()
+        async with main.app.router.lifespan_context(main.app):
+            timings["startup"] = time.perf_counter() - started
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for step, path in (("first_families", "/api/families"), ("first_photos", "/api/photos")):
+                    started = time.perf_counter()
+                    response = await client.get(path)
+                    timings[step] = time.perf_counter() - started
+                    response.raise_for_status()
+
+    asyncio.run(run())
+    print(json.dumps({step: seconds * 1000 for step, seconds in timings.items()}))
+
+
+def start(db_path) -> dict[str, float]:
+    """Run one child interpreter against `db_path` and return its timings in ms."""
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", PHOTO_EXECUTOR="thread")
+    output = subprocess.run(
+        [sys.executable, __file__, "--child"], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    args = parse_args()
+    if args.child:
+        child()
+        return 0
+
+    db_path = _bench.WORK_DIR / "startup.db"
+    shutil.copy(_bench.BACKEND_DIR / "wedding.db", db_path)
+    migrating = start(db_path)
+    print("start on the committed database (runs the pending migrations):")
+    print("  " + "  ".join(f"{step}={migrating[step]:.0f}ms" for step in STEPS))
+
+    runs = [start(db_path) for _ in range(args.runs)]
+    medians = {step: statistics.median(run[step] for run in runs) for step in STEPS}
+    print(f"start on a current database, median of {args.runs}:")
+    print("  " + "  ".join(f"{step}={medians[step]:.0f}ms" for step in STEPS))
+
+    cold_start = medians["import"] + medians["startup"] + medians["first_families"]
+    within = cold_start <= args.budget_ms
+    print(f"cold start {cold_start:.0f}ms, budget {args.budget_ms:.0f}ms: {'OK' if within else 'OVER BUDGET'}")
+    return 0 if within else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Measure gallery read latency while photos are being uploaded.
+
+Fires concurrent `POST /api/photos` uploads and, at the same time, a few
+clients polling `GET /api/photos`. Reports p50/p95/p99 latency of the reads
+for each `PHOTO_EXECUTOR` mode, showing how much image processing stalls
+the event loop.
+
+Usage:
+    python scripts/bench_upload_latency.py [--uploads 32] [--concurrency 8]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import _bench
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uploads", type=int, default=32, help="Total photos to upload")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent uploaders")
+    parser.add_argument("--readers", type=int, default=4, help="Concurrent gallery readers")
+    parser.add_argument(
+        "--executor",
+        choices=("all", *EXECUTOR_MODES),
+        default="all",
+        help="PHOTO_EXECUTOR mode to measure (default: run each in a subprocess)",
+    )
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> None:
+    import httpx
+
+    from image_utils import ensure_dirs
+    from routers import photos
+
+    ensure_dirs()
+    app = _bench.build_app(_bench.make_session_factory(), photos.router)
+    # Distinct photos, otherwise every upload after the first is deduplicated.
+    payloads = [_bench.sample_jpeg(seed=i) for i in range(args.uploads + 1)]
+    read_latencies: list[float] = []
+    upload_latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    uploads_left = args.uploads
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Warm up the executor so pool start-up is not counted.
+        await client.post("/api/photos", files={"file": ("warm.jpg", payloads.pop(), "image/jpeg")})
+
+        async def uploader(worker: int) -> None:
+            nonlocal uploads_left
+            while uploads_left > 0:
+                uploads_left -= 1
+                payload = payloads[uploads_left]
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/photos",
+                    files={"file": ("bench.jpg", payload, "image/jpeg")},
+                    headers={"x-real-ip": f"10.0.0.{worker}"},
+                )
+                upload_latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def reader(stop: asyncio.Event) -> None:
+            while not stop.is_set():
+                started = time.perf_counter()
+                await client.get("/api/photos", params={"per_page": 20})
+                read_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        stop = asyncio.Event()
+        readers = [asyncio.create_task(reader(stop)) for _ in range(args.readers)]
+        started = time.perf_counter()
+        await asyncio.gather(*(uploader(i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*readers)
+
+    from photo_processing import shutdown
+
+    shutdown()
+    print(f"executor={os.environ['PHOTO_EXECUTOR']} uploads={args.uploads} "
+          f"elapsed={elapsed:.2f}s ({args.uploads / elapsed:.1f} photos/s) statuses={statuses}")
+    print(_bench.format_latencies("  GET /api/photos", read_latencies))
+    print(_bench.format_latencies("  POST /api/photos", upload_latencies))
+
+
+def main() -> int:
+    args = parse_args()
+    if args.executor == "all":
+        for mode in EXECUTOR_MODES:
+            cmd = [sys.executable, __file__, "--executor", mode,
+                   "--uploads", str(args.uploads),
+                   "--concurrency", str(args.concurrency),
+                   "--readers", str(args.readers)]
+            subprocess.run(cmd, check=True)
+        return 0
+
+    os.environ["PHOTO_EXECUTOR"] = args.executor
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Measure server memory while many large photos are uploaded at once.
+
+Sends N concurrent uploads of a ~15 MB incompressible PNG through the
+photos router and reports the peak Python heap growth (tracemalloc) of the
+server process, plus the peak RSS of the server and of the processing
+workers. Image decoding runs in the worker processes, so the server figure
+isolates the cost of ingesting the uploads.
+
+Usage:
+    python scripts/bench_upload_memory.py [--uploads 16]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import os
+import resource
+import time
+import tracemalloc
+
+import _bench
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uploads", type=int, default=16, help="Concurrent uploads")
+    parser.add_argument("--side", type=int, default=2200,
+                        help="Side of the random PNG in pixels (2200 is ~14.5 MB)")
+    return parser.parse_args()
+
+
+def noise_png(side: int) -> bytes:
+    """Encode an incompressible PNG so the upload is as large as its pixels."""
+    from PIL import Image
+
+    img = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+async def run(args: argparse.Namespace) -> None:
+    import httpx
+
+    from image_utils import ensure_dirs
+    from photo_processing import shutdown
+    from routers import photos
+
+    ensure_dirs()
+    app = _bench.build_app(_bench.make_session_factory(), photos.router)
+    payload = noise_png(args.side)
+    print(f"payload: {len(payload) / 1024 / 1024:.1f} MB x {args.uploads} concurrent uploads")
+    # A trailing byte makes each upload distinct so none is deduplicated; the
+    # copies are made before tracing starts.
+    payloads = [payload + bytes([i % 256, i // 256]) for i in range(args.uploads)]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def upload(i: int) -> int:
+            response = await client.post(
+                "/api/photos",
+                files={"file": (f"{i}.png", payloads[i], "image/png")},
+                headers={"x-real-ip": f"10.1.{i // 250}.{i % 250}"},
+            )
+            return response.status_code
+
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(upload(i) for i in range(args.uploads)))
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    shutdown()
+    server_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"statuses: { {s: statuses.count(s) for s in set(statuses)} } in {elapsed:.1f}s")
+    print(f"server heap growth (tracemalloc peak): {(peak - baseline) / 1024 / 1024:8.1f} MB")
+    print(f"server peak RSS:                       {server_rss:8.1f} MB")
+    print(f"largest worker peak RSS:               {worker_rss:8.1f} MB")
+
+
+def main() -> int:
+    args = parse_args()
+    os.environ.setdefault("PHOTO_EXECUTOR", "process")
+    os.environ.setdefault("PHOTO_QUEUE_MAX", str(args.uploads))
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Time the multi-group vote check against a large `vote_audits` table.
+
+Seeds 1M audit rows: 20k IPs voting for their own family (5% of them also
+for a second one), plus one shared IP (a venue or mobile carrier NAT)
+with 100k votes for a single family. Then times the check an RSVP write
+runs, for ordinary IPs and for the shared one:
+
+- the old query (IP index only; `scope != current` filter)
+- `vote_scopes.other_scope_exists` on the (ip, scope) index, map disabled
+- the same after `vote_scopes.warm()`, with the multi-scope IP map
+
+and checks that all three give the same answers.
+
+Usage:
+    python scripts/bench_vote_audit.py [--rows 1000000] [--checks 2000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import _bench
+
+IPS = 20_000
+SHARED_IP = "100.64.0.1"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Audit rows to seed")
+    parser.add_argument("--checks", type=int, default=2_000, help="Checks to time per variant")
+    return parser.parse_args()
+
+
+def seed_audits(session_factory, rows: int, seed: int = 0, days: float = 0) -> dict[str, tuple[str, int]]:
+    """Insert `rows` audit rows, spread over the last `days`; return the scope each IP votes for first."""
+    from sqlalchemy import insert
+
+    from models import VoteAudit
+
+    rng = random.Random(seed)
+    scopes = {f"10.{i // 65536}.{i // 256 % 256}.{i % 256}": ("family", i) for i in range(IPS)}
+    second = {ip: ("guest", rng.randrange(100_000)) for ip in rng.sample(sorted(scopes), IPS // 20)}
+    scopes[SHARED_IP] = ("family", IPS)
+    ips = sorted(scopes)
+    now = datetime.utcnow()
+    db = session_factory()
+    batch = []
+    for i in range(rows):
+        ip = SHARED_IP if i < rows // 10 else rng.choice(ips)
+        scope_type, scope_id = second[ip] if ip in second and rng.random() < 0.3 else scopes[ip]
+        batch.append({"ip_address": ip, "scope_type": scope_type, "scope_id": scope_id,
+                      "guest_id": 1, "created_at": now - timedelta(days=days * (rows - i) / rows)})
+        if len(batch) == 50_000:
+            db.execute(insert(VoteAudit), batch)
+            batch.clear()
+    if batch:
+        db.execute(insert(VoteAudit), batch)
+    db.commit()
+    db.close()
+    return scopes
+
+
+def legacy_check(db, ip_address: str, scope_type: str, scope_id: int) -> bool:
+    """The check before the (ip, scope) index."""
+    from models import VoteAudit
+
+    return db.query(VoteAudit.id).filter(
+        VoteAudit.ip_address == ip_address,
+        (VoteAudit.scope_type != scope_type) | (VoteAudit.scope_id != scope_id),
+    ).first() is not None
+
+
+def time_checks(db, check, samples: list) -> tuple[list[float], list[bool]]:
+    latencies, answers = [], []
+    for ip, (scope_type, scope_id) in samples:
+        started = time.perf_counter()
+        answers.append(check(db, ip, scope_type, scope_id))
+        latencies.append(time.perf_counter() - started)
+    return latencies, answers
+
+
+def main() -> int:
+    args = parse_args()
+    from sqlalchemy import text
+
+    import vote_scopes
+
+    session_factory = _bench.make_session_factory("vote_audit.db")
+    started = time.perf_counter()
+    scopes = seed_audits(session_factory, args.rows)
+    print(f"seeded {args.rows} audit rows for {len(scopes)} IPs in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(1)
+    ordinary = [(ip, scopes[ip]) for ip in rng.choices(sorted(scopes), k=args.checks)]
+    shared = [(SHARED_IP, scopes[SHARED_IP])] * 50
+    db = session_factory()
+    results = {}
+
+    # The schema before: an index on ip_address only
+    db.execute(text("DROP INDEX ix_vote_audits_ip_scope"))
+    db.execute(text("CREATE INDEX ix_vote_audits_ip_address ON vote_audits (ip_address)"))
+    db.commit()
+    for label, samples in (("ordinary IPs", ordinary), ("shared IP", shared)):
+        latencies, results[("old", label)] = time_checks(db, legacy_check, samples)
+        print(_bench.format_latencies(f"old query, {label}", latencies))
+
+    db.execute(text("DROP INDEX ix_vote_audits_ip_address"))
+    db.execute(text("CREATE INDEX ix_vote_audits_ip_scope ON vote_audits (ip_address, scope_type, scope_id)"))
+    db.commit()
+    vote_scopes.VOTE_SCOPE_CACHE_SIZE = 0
+    for label, samples in (("ordinary IPs", ordinary), ("shared IP", shared)):
+        latencies, results[("index", label)] = time_checks(db, vote_scopes.other_scope_exists, samples)
+        print(_bench.format_latencies(f"index seeks, {label}", latencies))
+
+    vote_scopes.VOTE_SCOPE_CACHE_SIZE = 10_000
+    started = time.perf_counter()
+    warmed = vote_scopes.warm(db)
+    print(f"warm(): {warmed} multi-scope IPs in {(time.perf_counter() - started) * 1000:.0f}ms")
+    for label, samples in (("ordinary IPs", ordinary), ("shared IP", shared)):
+        latencies, results[("map", label)] = time_checks(db, vote_scopes.other_scope_exists, samples)
+        print(_bench.format_latencies(f"index + map, {label}", latencies))
+    print(f"map: {vote_scopes.stats()}")
+    db.close()
+
+    same = all(results[(variant, label)] == results[("old", label)]
+               for variant in ("index", "map") for label in ("ordinary IPs", "shared IP"))
+    print("same answers: " + ("OK" if same else "FAIL"))
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Compare RSVP writes with audit rows written inline vs by the write-behind buffer.
+
+Seeds families and guests, then runs concurrent writers for a fixed time
+sending `PATCH /api/families/{id}/guests` and `PATCH /api/guests/{id}` from
+a pool of client IPs, once per `VOTE_AUDIT_MODE`. Reports write throughput
+and latency, the flush counters of the buffered run, and checks that both
+runs end with one audit row per audited guest update, and none for a
+transaction that was rolled back.
+
+Usage:
+    python scripts/bench_vote_audit_buffer.py [--seconds 10] [--writers 16]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+
+import _bench
+from check_query_counts import seed_families
+
+MODES = ("sync", "buffered")
+CHOICES = ("ceremony", "lunch", "decline")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10, help="Duration of each run")
+    parser.add_argument("--writers", type=int, default=16, help="Concurrent RSVP writers")
+    parser.add_argument("--families", type=int, default=200, help="Families to seed")
+    return parser.parse_args()
+
+
+async def run(mode: str, args: argparse.Namespace) -> bool:
+    import httpx
+    from sqlalchemy import func, select
+
+    import vote_audit_buffer
+    from models import VoteAudit
+    from routers import rsvp
+
+    session_factory = _bench.make_session_factory(f"audit_{mode}.db")
+    seed_families(session_factory, args.families)
+    app = _bench.build_app(session_factory, rsvp.router)
+    vote_audit_buffer.SessionLocal = session_factory
+    vote_audit_buffer.VOTE_AUDIT_MODE = mode
+    await vote_audit_buffer.start_flusher()
+
+    latencies: list[float] = []
+    audited = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        families = (await client.get("/api/families")).json()
+        deadline = time.perf_counter() + args.seconds
+
+        async def writer(worker: int) -> None:
+            nonlocal audited
+            rng = random.Random(worker)
+            headers = {"x-real-ip": f"10.0.{worker}.1"}
+            while time.perf_counter() < deadline:
+                family = rng.choice(families)
+                started = time.perf_counter()
+                if rng.random() < 0.5:
+                    updates = {guest["id"]: rng.choice(CHOICES) for guest in family["guests"]}
+                    response = await client.patch(f"/api/families/{family['id']}/guests",
+                                                  json={"guest_updates": updates}, headers=headers)
+                    rows = len(updates)
+                else:
+                    guest = rng.choice(family["guests"])
+                    response = await client.patch(f"/api/guests/{guest['id']}",
+                                                  json={"attendance_choice": rng.choice(CHOICES)},
+                                                  headers=headers)
+                    rows = 1
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+                audited += rows
+
+        started = time.perf_counter()
+        await asyncio.gather(*(writer(i) for i in range(args.writers)))
+        elapsed = time.perf_counter() - started
+
+    # An RSVP transaction that fails to commit: its audit row must not be written
+    db = session_factory()
+    vote_audit_buffer.record(db, [{
+        "ip_address": "10.255.0.1", "scope_type": "family", "scope_id": families[0]["id"],
+        "guest_id": families[0]["guests"][0]["id"], "created_at": datetime.utcnow(),
+    }])
+    db.rollback()
+    db.close()
+
+    await vote_audit_buffer.stop_flusher()
+    db = session_factory()
+    stored = db.scalar(select(func.count(VoteAudit.id)))
+    db.close()
+
+    print(f"VOTE_AUDIT_MODE={mode}: {len(latencies) / elapsed:.0f} writes/s")
+    print(_bench.format_latencies("  writes", latencies))
+    if mode == "buffered":
+        stats = vote_audit_buffer.stats()
+        print(f"  flushes={stats['flushes']} rows={stats['flushed']} "
+              f"avg={stats['avg_flush_ms']:.1f}ms max={stats['max_flush_ms']:.1f}ms "
+              f"written inline={stats['written_inline']}")
+    print(f"  audit rows: {stored} stored, {audited} expected")
+    return stored == audited
+
+
+def main() -> int:
+    args = parse_args()
+    ok = all([asyncio.run(run(mode, args)) for mode in MODES])
+    print("audit rows complete: " + ("OK" if ok else "FAIL"))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""Load-test the backend with 1..N uvicorn worker processes, and check their shared state.
+
+For each worker count, starts `uvicorn main:app --workers N` on a fresh
+SQLite database (200 families, 5000 photos) and runs two loads from
+several client processes for a fixed time:
+
+- ``gallery``: `GET /api/photos` pages with totals, and photo statuses
+- ``rsvp``: `GET /api/families`, `/api/guests`, `/api/rsvp/stats`, with
+  20% `PATCH /api/families/{id}/guests`
+
+and reports requests/s and latencies. Then it checks what the workers
+share, over new connections (spread across the workers by the kernel):
+
+- cache invalidation: after an RSVP write, every read shows it, with one ETag
+- multi-group warning: once the guest one IP also voted for is deleted, no
+  worker warns that IP any more
+- rate limit: 40 uploads from one IP get exactly 10 answers 429 (limit 30/h)
+- upload queue (PHOTO_UPLOAD_MODE=async): every accepted upload becomes ready
+
+Throughput can only scale up to the cores left free by the clients: on a
+machine with fewer than 4 cores the numbers say little.
+
+Usage:
+    python scripts/bench_workers.py [--workers 1 2 4] [--seconds 10] [--clients 32]
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import _bench
+
+ADMIN_PASSWORD = "bench-admin"
+UPLOAD_LIMIT = 30
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, max(2, min(8, os.cpu_count() or 1))}),
+                        help="Worker process counts to measure")
+    parser.add_argument("--seconds", type=float, default=10, help="Duration of each load")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent connections")
+    parser.add_argument("--client-processes", type=int, default=max(2, min(4, (os.cpu_count() or 1) // 2)),
+                        help="Processes the connections are spread over")
+    return parser.parse_args()
+
+
+def prepare_database(path) -> None:
+    """Migrate a new SQLite database at `path` and seed families and photos."""
+    from sqlalchemy.orm import sessionmaker
+
+    from bench_photo_pagination import seed_photos
+    from check_query_counts import seed_families
+    from db import create_db_engine
+    from migrations import upgrade_schema
+
+    for suffix in ("", "-wal", "-shm"):
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+    engine = create_db_engine(f"sqlite:///{path}")
+    upgrade_schema(engine)
+    session_factory = sessionmaker(bind=engine)
+    seed_families(session_factory, 200)
+    seed_photos(session_factory, 5000)
+    engine.dispose()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, db_path, port: int) -> subprocess.Popen:
+    """Start uvicorn with `workers` processes and wait until it answers."""
+    import httpx
+
+    shared_dir = _bench.WORK_DIR / "shared"
+    shutil.rmtree(shared_dir, ignore_errors=True)
+    for suffix in ("", "-wal", "-shm"):
+        (_bench.WORK_DIR / f"rate_limits.db{suffix}").unlink(missing_ok=True)
+    env = os.environ | {
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "WEB_CONCURRENCY": str(workers),
+        "SHARED_STATE_DIR": str(shared_dir),
+        "RATE_LIMIT_SQLITE_PATH": str(_bench.WORK_DIR / "rate_limits.db"),
+        "PHOTO_UPLOAD_MODE": "async",
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=_bench.BACKEND_DIR, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                # The first worker is up; give the others a moment
+                time.sleep(0.5 * workers)
+                return server
+        except httpx.TransportError:
+            pass
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode}")
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("uvicorn didn't start within 60s")
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def client_process(base_url: str, scenario: str, threads: int, seconds: float, seed: int, results) -> None:
+    """Run `threads` connections of `scenario` for `seconds`; put (latencies, errors) on `results`."""
+    import threading
+
+    import httpx
+
+    with httpx.Client(base_url=base_url) as setup:
+        families = setup.get("/api/families").json()
+        photo_ids = [photo["id"] for photo in setup.get("/api/photos", params={"per_page": 100}).json()["photos"]]
+
+    def next_request(rng: random.Random) -> tuple[str, str, dict]:
+        roll = rng.random()
+        if scenario == "gallery":
+            if roll < 0.8:
+                return "GET", "/api/photos", {"params": {"page": rng.randint(1, 50), "per_page": 20}}
+            return "GET", f"/api/photos/{rng.choice(photo_ids)}/status", {}
+        if roll < 0.2:
+            family = rng.choice(families)
+            updates = {guest["id"]: rng.choice(("ceremony", "lunch", "decline")) for guest in family["guests"]}
+            return "PATCH", f"/api/families/{family['id']}/guests", {
+                "json": {"guest_updates": updates},
+                "headers": {"x-real-ip": f"10.1.{rng.randrange(256)}.{rng.randrange(256)}"},
+            }
+        if roll < 0.6:
+            return "GET", "/api/families", {}
+        if roll < 0.8:
+            return "GET", "/api/guests", {}
+        return "GET", "/api/rsvp/stats", {}
+
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def run(index: int) -> None:
+        nonlocal errors
+        rng = random.Random(seed * 1000 + index)
+        own: list[float] = []
+        failed = 0
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            while time.monotonic() < deadline:
+                method, path, kwargs = next_request(rng)
+                started = time.perf_counter()
+                try:
+                    response = client.request(method, path, **kwargs)
+                    ok = response.status_code < 400
+                except httpx.TransportError:
+                    ok = False
+                if ok:
+                    own.append(time.perf_counter() - started)
+                else:
+                    failed += 1
+        with lock:
+            latencies.extend(own)
+            errors += failed
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put((latencies, errors))
+
+
+def run_load(base_url: str, scenario: str, args: argparse.Namespace) -> tuple[float, list[float], int]:
+    """Run `scenario` from the client processes; return (requests/s, latencies, errors)."""
+    results = multiprocessing.Queue()
+    per_process = max(1, args.clients // args.client_processes)
+    clients = [
+        multiprocessing.Process(target=client_process,
+                                args=(base_url, scenario, per_process, args.seconds, seed, results))
+        for seed in range(args.client_processes)
+    ]
+    for client in clients:
+        client.start()
+    latencies: list[float] = []
+    errors = 0
+    for _ in clients:
+        own, failed = results.get()
+        latencies.extend(own)
+        errors += failed
+    for client in clients:
+        client.join()
+    return len(latencies) / args.seconds, latencies, errors
+
+
+def check_shared_state(base_url: str, workers: int) -> list[str]:
+    """Check cache invalidation, the upload rate limit and the upload queue; return failures."""
+    import httpx
+
+    failures = []
+    admin = {"X-Admin-Password": ADMIN_PASSWORD}
+    # New connections land on different workers
+    pids = {httpx.get(f"{base_url}/api/admin/metrics", headers=admin).json()["shared_state"]["pid"]
+            for _ in range(8 * workers)}
+    print(f"  processes answering: {len(pids)}")
+
+    # Warm every worker's guest-list cache, write through one, read through all
+    for _ in range(4 * workers):
+        httpx.get(f"{base_url}/api/families")
+    family = httpx.get(f"{base_url}/api/families").json()[0]
+    guest = family["guests"][0]
+    choice = "decline" if guest["attendance_choice"] != "decline" else "lunch"
+    httpx.patch(f"{base_url}/api/guests/{guest['id']}", json={"attendance_choice": choice},
+                headers={"x-real-ip": "10.9.9.9"}).raise_for_status()
+    stale = 0
+    etags = set()
+    for _ in range(8 * workers):
+        response = httpx.get(f"{base_url}/api/families")
+        etags.add(response.headers["etag"])
+        current = next(f for f in response.json() if f["id"] == family["id"])
+        stale += next(g for g in current["guests"] if g["id"] == guest["id"])["attendance_choice"] != choice
+    print(f"  reads after a write: {stale} stale of {8 * workers}, {len(etags)} ETag(s)")
+    if stale or len(etags) != 1:
+        failures.append("guest-list caches not invalidated across workers")
+
+    # One IP votes for an individual guest and a family: every worker remembers it
+    voter = {"x-real-ip": "10.8.8.8"}
+    individual = httpx.get(f"{base_url}/api/guests").json()[0]
+    httpx.patch(f"{base_url}/api/guests/{individual['id']}", json={"attendance_choice": "lunch"},
+                headers=voter).raise_for_status()
+    vote = {"guest_updates": {g["id"]: "lunch" for g in family["guests"]}}
+    warned_before = sum(
+        "x-rsvp-warning" in httpx.patch(f"{base_url}/api/families/{family['id']}/guests",
+                                        json=vote, headers=voter).headers
+        for _ in range(4 * workers)
+    )
+    httpx.delete(f"{base_url}/api/admin/guests/{individual['id']}", headers=admin).raise_for_status()
+    warned_after = sum(
+        "x-rsvp-warning" in httpx.patch(f"{base_url}/api/families/{family['id']}/guests",
+                                        json=vote, headers=voter).headers
+        for _ in range(8 * workers)
+    )
+    print(f"  multi-group warnings: {warned_before} of {4 * workers} before deleting the other guest, "
+          f"{warned_after} of {8 * workers} after")
+    if warned_before != 4 * workers or warned_after:
+        failures.append("multi-group warnings not in sync across workers")
+
+    # Upload limit shared by the workers
+    accepted, limited = [], 0
+    for i in range(UPLOAD_LIMIT + 10):
+        response = httpx.post(
+            f"{base_url}/api/photos",
+            files={"file": (f"{i}.jpg", _bench.sample_jpeg(320, 240, seed=10_000 + i), "image/jpeg")},
+            headers={"x-real-ip": "10.7.7.7"},
+        )
+        if response.status_code == 429:
+            limited += 1
+        elif response.status_code in (200, 202):
+            accepted.append(response.json()["id"])
+    print(f"  {UPLOAD_LIMIT + 10} uploads from one IP: {len(accepted)} accepted, {limited} rate limited")
+    if limited != 10:
+        failures.append("upload rate limit not shared across workers")
+
+    # Every accepted upload processed, whichever worker claims it
+    deadline = time.monotonic() + 60
+    statuses: dict[str, str] = {}
+    while time.monotonic() < deadline:
+        statuses = {s["id"]: s["status"] for s in
+                    httpx.get(f"{base_url}/api/photos/status", params={"ids": accepted}).json()}
+        if all(status == "ready" for status in statuses.values()):
+            break
+        time.sleep(0.5)
+    ready = sum(status == "ready" for status in statuses.values())
+    print(f"  queued uploads ready: {ready} of {len(accepted)}")
+    if ready != len(accepted):
+        failures.append("queued uploads not all processed")
+    return failures
+
+
+def main() -> int:
+    args = parse_args()
+    print(f"{os.cpu_count()} cores; {args.clients} connections from {args.client_processes} processes, "
+          f"{args.seconds:g}s per load")
+    db_path = _bench.WORK_DIR / "workers.db"
+    failures = []
+    baseline: dict[str, float] = {}
+    for workers in args.workers:
+        prepare_database(db_path)
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(workers, db_path, port)
+        try:
+            print(f"--workers {workers}:")
+            for scenario in ("gallery", "rsvp"):
+                rate, latencies, errors = run_load(base_url, scenario, args)
+                baseline.setdefault(scenario, rate)
+                print(_bench.format_latencies(f"  {scenario}", latencies)
+                      + f"  {rate:7.0f} req/s (x{rate / baseline[scenario]:.2f}) errors={errors}")
+            failures += [f"--workers {workers}: {failure}" for failure in check_shared_state(base_url, workers)]
+        finally:
+            stop_server(server)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("shared state OK" if not failures else f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Check that the `DB_ASYNC=1` endpoints answer like the sync ones.
+
+Seeds a database with families and ready photos, then sends the same
+requests to the RSVP and photo endpoints with `DB_ASYNC=0` and with
+`DB_ASYNC=1` (each mode in its own process, since the flag is read at
+import): family listings, bulk RSVP updates, stats, photo pages by number
+and by cursor, search, status and delete. Exits non-zero if an endpoint
+wrapped by `db_endpoint` isn't a coroutine with `DB_ASYNC=1`, or if a
+status code or response body differs between the modes.
+
+Usage:
+    python scripts/check_async_db.py [--families 20] [--photos 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import inspect
+import json
+import os
+import subprocess
+import sys
+
+import _bench
+from bench_photo_search import photo_rows
+from check_query_counts import seed_families
+
+MODES = ("0", "1")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--families", type=int, default=20, help="Families to seed")
+    parser.add_argument("--photos", type=int, default=200, help="Ready photos to seed")
+    parser.add_argument("--db-async", choices=MODES, help="Run one mode and print its answers as JSON")
+    return parser.parse_args()
+
+
+def _strip_times(value):
+    """Drop `*_at` fields, which hold the time of the run."""
+    if isinstance(value, dict):
+        return {key: _strip_times(item) for key, item in value.items() if not key.endswith("_at")}
+    if isinstance(value, list):
+        return [_strip_times(item) for item in value]
+    return value
+
+
+def answers(args: argparse.Namespace) -> dict:
+    """Send the requests in the current `DB_ASYNC` mode; return {request: [status, body]}."""
+    from fastapi.testclient import TestClient
+
+    import async_db
+    from models import Photo
+    from routers import photos, rsvp
+
+    session_factory = _bench.make_session_factory(f"async_check_{os.environ['DB_ASYNC']}.db")
+    seed_families(session_factory, args.families)
+    rows = photo_rows(args.photos)
+    for i, row in enumerate(rows):
+        # Same IDs in both modes
+        row["id"] = f"{i:032x}"
+    db = session_factory()
+    db.execute(Photo.__table__.insert(), rows)
+    db.commit()
+    db.close()
+
+    endpoints = [
+        route.endpoint for router in (rsvp.router, photos.router) for route in router.routes
+        if getattr(route.endpoint, "__wrapped__", None) is not None
+    ]
+    coroutines = all(inspect.iscoroutinefunction(endpoint) for endpoint in endpoints)
+
+    client = TestClient(_bench.build_app(session_factory, rsvp.router, photos.router))
+    results: dict[str, list] = {}
+
+    def send(method: str, path: str, ip: str = "10.0.0.1", **kwargs):
+        response = client.request(method, path, headers={"x-real-ip": ip}, **kwargs)
+        body = response.json()
+        # Numbered: the same request is sent again after writes
+        results[f"{len(results):>2} {method} {path} {json.dumps(kwargs, sort_keys=True)}"] = [
+            response.status_code, _strip_times(body)
+        ]
+        return body
+
+    families = send("GET", "/api/families")
+    for i, family in enumerate(families[:5]):
+        updates = {guest["id"]: ("ceremony", "lunch", "decline")[(i + j) % 3]
+                   for j, guest in enumerate(family["guests"])}
+        # One IP per family, so the multi-group warning header stays out of it
+        send("PATCH", f"/api/families/{family['id']}/guests", ip=f"10.0.1.{i}",
+             json={"guest_updates": updates})
+    send("PATCH", "/api/families/999999/guests", json={"guest_updates": {}})
+    send("GET", "/api/families")
+    send("GET", "/api/rsvp/stats")
+
+    send("GET", "/api/photos", params={"page": 2, "per_page": 20})
+    page = send("GET", "/api/photos", params={"per_page": 20})
+    if page.get("next_cursor"):
+        send("GET", "/api/photos", params={"per_page": 20, "cursor": page["next_cursor"]})
+    send("GET", "/api/photos", params={"search": rows[0]["uploader_name"].split()[0]})
+    send("GET", f"/api/photos/{rows[0]['id']}/status")
+    send("DELETE", f"/api/photos/{rows[1]['id']}")
+    send("GET", f"/api/photos/{rows[1]['id']}/status")
+    send("GET", "/api/photos", params={"per_page": 5})
+    return {"async_db": async_db.DB_ASYNC, "coroutines": coroutines, "endpoints": len(endpoints),
+            "results": results}
+
+
+def main() -> int:
+    args = parse_args()
+    if args.db_async:
+        # Read when async_db is imported, so set it first
+        os.environ["DB_ASYNC"] = args.db_async
+        print(json.dumps(answers(args)))
+        return 0
+
+    runs = {}
+    for mode in MODES:
+        cmd = [sys.executable, __file__, "--db-async", mode,
+               "--families", str(args.families), "--photos", str(args.photos)]
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        runs[mode] = json.loads(output.strip().splitlines()[-1])
+
+    sync, async_ = runs["0"], runs["1"]
+    failed = False
+    if not async_["async_db"] or not async_["endpoints"] or not async_["coroutines"]:
+        print(f"FAIL: with DB_ASYNC=1 the {async_['endpoints']} db_endpoint handlers aren't all coroutines")
+        failed = True
+    for request, (status, body) in sync["results"].items():
+        other = async_["results"].get(request)
+        same = other == [status, body]
+        print(f"{'same' if same else 'DIFF'}  {status}  {request[:90]}")
+        if not same:
+            print(f"  DB_ASYNC=0: {status} {json.dumps(body)[:200]}")
+            print(f"  DB_ASYNC=1: {json.dumps(other)[:200]}")
+            failed = True
+    if not failed:
+        print(f"OK: {len(sync['results'])} requests answer the same with DB_ASYNC=0 and DB_ASYNC=1")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Check that guest-entered text can't become a formula in the caterer exports.
+
+Sets dietary notes like ``=HYPERLINK("x")`` through the public RSVP
+endpoint (and names starting with a tab or CR directly), downloads
+`GET /api/admin/export?format=csv` and `?format=xlsx`, and checks that:
+
+- every CSV cell starting with ``=``, ``+``, ``-``, ``@``, tab or CR is
+  prefixed with ``'``, and plain text is unchanged
+- the XLSX sheet has no formula cells and keeps the text as typed
+
+Exits non-zero on any failure.
+
+Usage:
+    python scripts/check_export_escaping.py
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import zipfile
+
+import _bench
+
+# Dietary notes are stripped by the RSVP endpoint, so the tab/CR cases are names
+NOTES = ['=HYPERLINK("http://example.com","x")', "+1+1", "-2+3", "@SUM(A1)"]
+NAMES = ["\t=1", "\r=1"]
+PLAIN = "Niente glutine, grazie"
+
+
+def main() -> int:
+    from fastapi.testclient import TestClient
+
+    from check_query_counts import seed_families
+    from models import Guest
+    from routers import admin, rsvp
+
+    session_factory = _bench.make_session_factory("export_escaping.db")
+    seed_families(session_factory, 4, guests_per_family=2)
+    client = TestClient(_bench.build_app(session_factory, rsvp.router, admin.router))
+    guests = client.get("/api/guests").json()
+
+    for guest, note in zip(guests, NOTES + [PLAIN]):
+        response = client.patch(f"/api/guests/{guest['id']}", json={"dietary_notes": note},
+                                headers={"x-real-ip": "10.0.0.1"})
+        response.raise_for_status()
+    db = session_factory()
+    for guest, name in zip(guests, NAMES):
+        db.get(Guest, guest["id"]).name = name
+    db.commit()
+    db.close()
+
+    failures = []
+    headers = {"X-Admin-Password": admin.ADMIN_PASSWORD}
+    body = client.get("/api/admin/export", params={"format": "csv"}, headers=headers).content
+    rows = list(csv.DictReader(io.StringIO(body.decode("utf-8-sig"), newline="")))
+    exported = {row["dietary_notes"] for row in rows} | {row["name"] for row in rows}
+    for text in NOTES + NAMES:
+        if "'" + text not in exported:
+            failures.append(f"CSV: {text!r} not escaped")
+    if PLAIN not in exported:
+        failures.append("CSV: plain text changed")
+    print(f"csv:  {len(rows)} rows, {len(failures)} failure(s)")
+
+    body = client.get("/api/admin/export", params={"format": "xlsx"}, headers=headers).content
+    sheet = zipfile.ZipFile(io.BytesIO(body)).read("xl/worksheets/sheet1.xml").decode()
+    xlsx_failures = []
+    if "<f>" in sheet or "<f " in sheet:
+        xlsx_failures.append("XLSX: formula cell found")
+    if "=HYPERLINK(&quot;" not in sheet and '=HYPERLINK("' not in sheet:
+        xlsx_failures.append("XLSX: text not kept as typed")
+    print(f"xlsx: {len(xlsx_failures)} failure(s)")
+    failures += xlsx_failures
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("OK: exports are safe to open in a spreadsheet" if not failures else f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Check that family endpoints run a constant number of SQL statements.
+
+Seeds databases with an increasing number of families (3 guests each),
+calls `GET /api/families` and `GET /api/admin/data`, and counts the
+statements sent to the database per request. Then sends
+`PATCH /api/families/{id}/guests` for families of increasing size. Exits
+non-zero if a count grows with the number of families or guests, which
+means an N+1 query pattern is back.
+
+Usage:
+    python scripts/check_query_counts.py [--families 10 100 1000] [--family-sizes 2 10 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+from contextlib import contextmanager
+
+import _bench
+
+ENDPOINTS = ("/api/families", "/api/admin/data")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--families", type=int, nargs="+", default=[10, 100, 1000],
+                        help="Family counts to seed")
+    parser.add_argument("--family-sizes", type=int, nargs="+", default=[2, 10, 50],
+                        help="Guests per family for the bulk RSVP update")
+    return parser.parse_args()
+
+
+def seed_families(session_factory, count: int, guests_per_family: int = 3) -> None:
+    """Insert `count` families with their guests, plus a few individual guests."""
+    from models import Family, Guest
+
+    db = session_factory()
+    try:
+        for i in range(count):
+            family = Family(family_name=f"Famiglia {i}")
+            family.guests = [Guest(name=f"Ospite {i}.{j}") for j in range(guests_per_family)]
+            db.add(family)
+        db.add_all(Guest(name=f"Singolo {i}") for i in range(5))
+        db.commit()
+    finally:
+        db.close()
+
+
+@contextmanager
+def count_statements(engine):
+    """Count the statements executed on `engine` inside the block."""
+    from sqlalchemy import event
+
+    statements: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def main() -> int:
+    args = parse_args()
+    from fastapi.testclient import TestClient
+
+    from routers import admin, rsvp
+
+    counts: dict[str, list[int]] = {path: [] for path in ENDPOINTS}
+    for families in args.families:
+        session_factory = _bench.make_session_factory(f"queries_{families}.db")
+        seed_families(session_factory, families)
+        client = TestClient(_bench.build_app(session_factory, rsvp.router, admin.router))
+        headers = {"X-Admin-Password": admin.ADMIN_PASSWORD}
+        for path in ENDPOINTS:
+            with count_statements(session_factory.kw["bind"]) as statements:
+                response = client.get(path, headers=headers)
+            response.raise_for_status()
+            counts[path].append(len(statements))
+            print(f"{path:<18} families={families:<6} statements={len(statements)}")
+
+    path = "PATCH family guests"
+    counts[path] = []
+    for size in args.family_sizes:
+        session_factory = _bench.make_session_factory(f"queries_family_{size}.db")
+        seed_families(session_factory, 1, guests_per_family=size)
+        client = TestClient(_bench.build_app(session_factory, rsvp.router))
+        family = client.get("/api/families").json()[0]
+        # Alternate answers so every guest row really changes
+        updates = {
+            guest["id"]: "ceremony" if i % 2 else "lunch"
+            for i, guest in enumerate(family["guests"])
+        }
+        with count_statements(session_factory.kw["bind"]) as statements:
+            response = client.patch(
+                f"/api/families/{family['id']}/guests",
+                json={"guest_updates": updates},
+                headers={"x-real-ip": "10.0.0.1"},
+            )
+        response.raise_for_status()
+        counts[path].append(len(statements))
+        print(f"{path:<18} guests={size:<9} statements={len(statements)}")
+
+    failed = [path for path, values in counts.items() if len(set(values)) > 1]
+    for path in failed:
+        print(f"FAIL: {path} statement count grows: {counts[path]}")
+    if not failed:
+        print("OK: statement counts are constant")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Archive and summarize old vote audit rows, then free space in the database.
+
+Flow (see `audit_compaction`):
+1) move `vote_audits` rows older than the retention to `vote_audit_summaries`
+   and a gzip-compressed JSON Lines file in the archive directory
+2) `PRAGMA incremental_vacuum` + `ANALYZE` (SQLite) or `VACUUM (ANALYZE)` (PostgreSQL)
+3) with --vacuum, a full VACUUM (stop the backend first: it blocks writes)
+
+Works on `DATABASE_URL`, like the app. Run it from cron, e.g. weekly:
+
+    docker compose -f docker-compose.prod.yml exec backend python scripts/compact_vote_audits.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import audit_compaction  # noqa: E402
+from db import engine  # noqa: E402
+from migrations import upgrade_schema  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--retention-days",
+        type=float,
+        default=audit_compaction.VOTE_AUDIT_RETENTION_DAYS,
+        help="Keep raw rows newer than this (default: VOTE_AUDIT_RETENTION_DAYS)",
+    )
+    parser.add_argument(
+        "--archive-dir",
+        type=Path,
+        default=audit_compaction.VOTE_AUDIT_ARCHIVE_DIR,
+        help="Where to write the archive files (default: VOTE_AUDIT_ARCHIVE_DIR)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=audit_compaction.VOTE_AUDIT_COMPACT_BATCH,
+        help="Rows per transaction (default: VOTE_AUDIT_COMPACT_BATCH)",
+    )
+    parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="Also run a full VACUUM; on SQLite this enables incremental auto_vacuum for later runs",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    upgrade_schema()
+
+    before = datetime.utcnow() - timedelta(days=args.retention_days)
+    print(f"Compacting vote audit rows created before {before:%Y-%m-%d %H:%M} UTC...")
+    result = audit_compaction.compact(engine, before, args.archive_dir, args.batch_size)
+    print(f"Compacted {result['compacted']} rows in {result['batches']} batches.")
+    if result["archive"]:
+        print(f"Archive:   {result['archive']}")
+
+    maintenance = audit_compaction.maintain(engine)
+    if "pages_freed" in maintenance:
+        print(f"Freed {maintenance['pages_freed']} pages ({maintenance['free_pages']} free pages left).")
+    if args.vacuum:
+        print("Running VACUUM...")
+        audit_compaction.vacuum(engine)
+    print("Done.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
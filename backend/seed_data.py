@@ -1,17 +1,35 @@
-"""Seed script to populate the database from invitation.txt."""
+"""Seed script to populate the database from invitation.txt.
 
-from db import SessionLocal, engine, Base
-from models import Family, Guest
+Syncs the database with the file instead of reloading it: families are
+matched by name and guests by (family, name), so a rerun only inserts what
+was added to the file and every recorded RSVP is kept. A guest whose family
+changed (or was renamed) is moved rather than re-created. Guests and
+families no longer in the file are kept unless `--prune` is given. All
+changes are written in one transaction with bulk statements.
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+The container runs it with `--if-empty` before the API, which only loads a
+database with no guests yet: a sync at every start would undo the edits
+made in the admin panel. Run it without the flag to sync on purpose.
 
-db = SessionLocal()
+Usage:
+    python seed_data.py [--file ../data/invitation.txt] [--prune] [--if-empty]
+"""
 
-# Clear existing data
-db.query(Guest).delete()
-db.query(Family).delete()
-db.commit()
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import delete, exists, insert, select, update
+from sqlalchemy.orm import Session
+
+# Registers the hooks bumping the guest-list version on commit, which
+# invalidates the caches of a backend running next to this script
+import data_version  # noqa: F401
+import vote_scopes
+from db import SessionLocal
+from migrations import upgrade_schema
+from models import Family, Guest, VoteAudit, VoteAuditSummary
+
+INVITATION_FILE = '../data/invitation.txt'
 
 
 def parse_invitations(filepath: str) -> tuple[list[dict], list[str]]:
@@ -83,30 +101,152 @@ def parse_invitations(filepath: str) -> tuple[list[dict], list[str]]:
     return families, individuals
 
 
-# Parse the invitation file
-families_data, individuals_data = parse_invitations('../data/invitation.txt')
+def _group(rows, key) -> dict:
+    """Group `rows` by `key(row)`, keeping their order within each group."""
+    groups = defaultdict(list)
+    for row in rows:
+        groups[key(row)].append(row)
+    return groups
 
-# Create families and their guests
-for fam_data in families_data:
-    family = Family(family_name=fam_data['name'])
-    db.add(family)
-    db.commit()
-    db.refresh(family)
 
-    for member_name in fam_data['members']:
-        db.add(Guest(name=member_name, family_id=family.id))
+def sync_guests(db: Session, families: list[dict], individuals: list[str], prune: bool = False) -> dict:
+    """Bring the families and guests in the database in line with the parsed file.
 
-# Create individual guests
-for name in individuals_data:
-    db.add(Guest(name=name, family_id=None))
+    Rows are paired by stable keys: the n-th family of a given name in the
+    file with the n-th (by ID) in the database, and likewise guests by
+    (family, name). Unpaired guests of the file are then paired by name alone
+    with unpaired guests of the database, which moves them to their new
+    family. Matched rows are left untouched, so their RSVP fields survive.
+    Does not commit.
 
-db.commit()
-db.close()
+    Args:
+        db: Database session
+        families: Families from `parse_invitations`
+        individuals: Individual guests from `parse_invitations`
+        prune: Delete guests (with their vote audits) and families that are
+            no longer in the file
 
-print("Database seeded successfully!")
-print(f"Created {len(families_data)} families:")
-for fam in families_data:
-    print(f"  - {fam['name']}: {len(fam['members'])} members")
-print(f"Created {len(individuals_data)} individual guests:")
-for name in individuals_data:
-    print(f"  - {name}")
+    Returns:
+        Counts of the changes: families_added, guests_added, guests_moved,
+        guests_removed, families_removed, guests_stale (kept although not
+        in the file) and families_stale.
+    """
+    stats = dict.fromkeys(
+        ("families_added", "guests_added", "guests_moved", "guests_removed",
+         "families_removed", "guests_stale", "families_stale"), 0)
+
+    # Families, by name
+    existing_families = _group(
+        db.execute(select(Family.id, Family.family_name).order_by(Family.id)),
+        lambda row: row.family_name,
+    )
+    family_ids: list[int | None] = []
+    for fam in families:
+        matches = existing_families.get(fam['name'])
+        family_ids.append(matches.pop(0).id if matches else None)
+    stale_family_ids = [row.id for rows in existing_families.values() for row in rows]
+
+    new_families = [fam for fam, family_id in zip(families, family_ids) if family_id is None]
+    if new_families:
+        new_ids = iter(db.scalars(
+            insert(Family).returning(Family.id, sort_by_parameter_order=True),
+            [{"family_name": fam['name']} for fam in new_families],
+        ).all())
+        family_ids = [family_id if family_id is not None else next(new_ids) for family_id in family_ids]
+    stats["families_added"] = len(new_families)
+
+    # Guests, by (family, name)
+    wanted = [
+        (family_id, name)
+        for fam, family_id in zip(families, family_ids)
+        for name in fam['members']
+    ] + [(None, name) for name in individuals]
+    existing_guests = _group(
+        db.execute(select(Guest.id, Guest.name, Guest.family_id).order_by(Guest.id)),
+        lambda row: (row.family_id, row.name),
+    )
+    unmatched = []
+    for key in wanted:
+        matches = existing_guests.get(key)
+        if matches:
+            matches.pop(0)
+        else:
+            unmatched.append(key)
+
+    # Guests that changed family, by name
+    leftover = _group((row for rows in existing_guests.values() for row in rows), lambda row: row.name)
+    moves, new_guests = [], []
+    for family_id, name in unmatched:
+        matches = leftover.get(name)
+        if matches:
+            moves.append({"id": matches.pop(0).id, "family_id": family_id})
+        else:
+            new_guests.append({"name": name, "family_id": family_id})
+    if moves:
+        db.execute(update(Guest), moves)
+    if new_guests:
+        db.execute(insert(Guest), new_guests)
+    stats["guests_moved"] = len(moves)
+    stats["guests_added"] = len(new_guests)
+
+    stale_guest_ids = [row.id for rows in leftover.values() for row in rows]
+    if not prune:
+        stats["guests_stale"] = len(stale_guest_ids)
+        stats["families_stale"] = len(stale_family_ids)
+        return stats
+
+    if stale_guest_ids:
+        db.execute(delete(VoteAudit).where(VoteAudit.guest_id.in_(stale_guest_ids)))
+        db.execute(
+            delete(VoteAuditSummary)
+            .where(VoteAuditSummary.scope_type == "guest", VoteAuditSummary.scope_id.in_(stale_guest_ids))
+        )
+        db.execute(delete(Guest).where(Guest.id.in_(stale_guest_ids)))
+    if stale_family_ids:
+        # Their guests were all moved or deleted above
+        db.execute(delete(Family).where(Family.id.in_(stale_family_ids)))
+    stats["guests_removed"] = len(stale_guest_ids)
+    stats["families_removed"] = len(stale_family_ids)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=INVITATION_FILE, help="Invitation list to sync from")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete guests and families no longer in the file, with their RSVPs")
+    parser.add_argument("--if-empty", action="store_true",
+                        help="Do nothing if the database already has families or guests")
+    args = parser.parse_args()
+
+    # Runs before the app starts, so bring the schema up to date here
+    upgrade_schema()
+    families_data, individuals_data = parse_invitations(args.file)
+
+    db = SessionLocal()
+    try:
+        if args.if_empty and db.scalar(select(exists(select(Family.id)) | exists(select(Guest.id)))):
+            print("Database already has guests, not seeding (run without --if-empty to sync)")
+            return
+        stats = sync_guests(db, families_data, individuals_data, prune=args.prune)
+        db.commit()
+    finally:
+        db.close()
+    if stats["guests_removed"]:
+        # Some IPs may no longer have votes for several groups
+        vote_scopes.clear()
+
+    print(f"Database seeded from {args.file}: {len(families_data)} families, "
+          f"{sum(len(fam['members']) for fam in families_data)} family members, "
+          f"{len(individuals_data)} individual guests")
+    print(f"  added {stats['families_added']} families and {stats['guests_added']} guests, "
+          f"moved {stats['guests_moved']} guests")
+    if args.prune:
+        print(f"  removed {stats['families_removed']} families and {stats['guests_removed']} guests")
+    elif stats["guests_stale"] or stats["families_stale"]:
+        print(f"  kept {stats['families_stale']} families and {stats['guests_stale']} guests "
+              "no longer in the file (rerun with --prune to delete them)")
+
+
+if __name__ == "__main__":
+    main()
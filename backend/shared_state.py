@@ -0,0 +1,184 @@
+"""State shared by the backend processes of one host.
+
+With ``WEB_CONCURRENCY`` above 1, uvicorn runs that many worker processes
+(``uvicorn main:app --workers N`` reads it too), and what one process keeps
+in memory the others don't see. This module holds what has to be common:
+
+- counters (`counter`, `bump`): versions of the guest list, of the
+  gallery and of the vote audit rows, checked by the caches before
+  serving. They live in a one-page file in `SHARED_STATE_DIR` mapped into
+  every process, so reading one is a memory load and bumping one a file
+  lock and a write
+- file locks (`lock`, `try_lock`): one process at a time for the schema
+  upgrade at startup and for scheduled jobs like the audit compaction
+
+Each process holds a shared lock on the counter file while it runs. The
+first one to start after all of them stopped resets the counters and draws
+a new token, so versions (and the ETags built from them) don't carry over
+to a restart, during which the database may have changed.
+
+The file is used with a single worker too, so that scripts run next to the
+backend (``docker compose exec backend python seed_data.py --prune``)
+invalidate its caches. If `SHARED_STATE_DIR` can't be written, the
+counters fall back to anonymous memory of the process.
+"""
+
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+SHARED_STATE_DIR = Path(os.getenv("SHARED_STATE_DIR", os.path.join(tempfile.gettempdir(), "wedding-backend")))
+
+# Offsets in the counter file: an 8-byte token, then one 8-byte slot per counter
+COUNTERS = ("guest_list", "photos", "vote_scopes")
+_TOKEN_SIZE = 8
+_SIZE = mmap.PAGESIZE
+_SLOT = struct.Struct("<Q")
+_OFFSETS = {name: _TOKEN_SIZE + index * _SLOT.size for index, name in enumerate(COUNTERS)}
+
+_map: mmap.mmap | None = None
+# Kept open for the life of the process: closing it would release the shared lock
+_map_fd: int | None = None
+_open_lock = threading.Lock()
+# {name: (thread lock, lock file descriptor)}; flock doesn't exclude threads sharing a descriptor
+_locks: dict[str, tuple[threading.Lock, int | None]] = {}
+_locks_lock = threading.Lock()
+
+
+def multi_process() -> bool:
+    """Whether the backend runs as several worker processes."""
+    return WEB_CONCURRENCY > 1
+
+
+def _attach() -> mmap.mmap:
+    """Map the counter file, resetting it if no other process has it open."""
+    global _map, _map_fd
+    if _map is not None:
+        return _map
+    with _open_lock:
+        if _map is not None:
+            return _map
+        try:
+            SHARED_STATE_DIR.mkdir(parents=True, exist_ok=True)
+            fd = os.open(SHARED_STATE_DIR / "counters", os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as exc:
+            if multi_process():
+                raise
+            logger.warning("Counters not shared with other processes: %s", exc)
+            _map = mmap.mmap(-1, _SIZE)
+            _map[:_TOKEN_SIZE] = os.urandom(_TOKEN_SIZE)
+            return _map
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another process is running: join its counters
+            fcntl.flock(fd, fcntl.LOCK_SH)
+        else:
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, _SIZE)
+            os.pwrite(fd, os.urandom(_TOKEN_SIZE), 0)
+            # Processes waiting in LOCK_SH get in once the reset is done
+            fcntl.flock(fd, fcntl.LOCK_SH)
+        _map, _map_fd = mmap.mmap(fd, _SIZE), fd
+        return _map
+
+
+def attach() -> None:
+    """Join (or reset) the shared counters; called by the lifespan before serving."""
+    _attach()
+
+
+def token() -> str:
+    """Random hex string identifying the counters since their last reset."""
+    return _attach()[:_TOKEN_SIZE].hex()
+
+
+def counter(name: str) -> int:
+    """Current value of the counter `name` (one of COUNTERS)."""
+    return _SLOT.unpack_from(_attach(), _OFFSETS[name])[0]
+
+
+def bump(name: str) -> int:
+    """Increment the counter `name` for every process.
+
+    Returns:
+        The new value.
+    """
+    shared, offset = _attach(), _OFFSETS[name]
+    with lock("counters"):
+        value = _SLOT.unpack_from(shared, offset)[0] + 1
+        _SLOT.pack_into(shared, offset, value)
+    return value
+
+
+def _named_lock(name: str) -> tuple[threading.Lock, int | None]:
+    with _locks_lock:
+        if name not in _locks:
+            try:
+                SHARED_STATE_DIR.mkdir(parents=True, exist_ok=True)
+                fd = os.open(SHARED_STATE_DIR / f"{name}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+            except OSError:
+                if multi_process():
+                    raise
+                # Same fallback as the counters: this process only
+                fd = None
+            _locks[name] = (threading.Lock(), fd)
+        return _locks[name]
+
+
+@contextmanager
+def lock(name: str):
+    """Hold the lock `name` across the processes (and threads) of the host; blocking."""
+    thread_lock, fd = _named_lock(name)
+    with thread_lock:
+        if fd is None:
+            yield
+            return
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+@contextmanager
+def try_lock(name: str):
+    """Like `lock`, without waiting: yields False if another holder has it."""
+    thread_lock, fd = _named_lock(name)
+    if not thread_lock.acquire(blocking=False):
+        yield False
+        return
+    try:
+        if fd is None:
+            yield True
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        thread_lock.release()
+
+
+def stats() -> dict:
+    """Counter values and mode, for the admin metrics endpoint."""
+    return {
+        "processes": WEB_CONCURRENCY,
+        "pid": os.getpid(),
+        "token": token(),
+        "counters": {name: counter(name) for name in COUNTERS},
+    }
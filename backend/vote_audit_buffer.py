@@ -0,0 +1,258 @@
+"""Write-behind buffer for `VoteAudit` rows.
+
+By default (``VOTE_AUDIT_MODE=sync``) every RSVP write inserts its audit
+rows in the request's own transaction, so the SQLite write lock is also held
+for them. With ``VOTE_AUDIT_MODE=buffered`` the RSVP request commits only
+the guest update: audit rows are queued in memory and a background task
+started by the lifespan inserts them in batches, when
+`VOTE_AUDIT_FLUSH_SIZE` rows are waiting or every
+`VOTE_AUDIT_FLUSH_INTERVAL` seconds, whichever comes first.
+
+Rows join the queue only once the RSVP transaction that recorded them is
+committed (an `after_commit` hook, like the one of `data_version`), and
+rows of a rolled back transaction are dropped. They leave the queue only
+once their batch is committed, and the lifespan flushes what is left on
+shutdown. A crash of the process still loses the
+rows of the last interval; they are an audit trail for the multi-group
+warning, not RSVP data. When `VOTE_AUDIT_BUFFER_MAX` rows are already
+waiting (the database is unreachable, say), new rows are written in the
+request transaction as in sync mode instead of being dropped; rows of
+transactions already under way when the limit is reached still join the
+queue.
+
+Queued rows are also indexed by IP, so the multi-group check sees votes
+that are not in the database yet (`other_scope_pending`). Each backend
+process has its own queue: votes queued by another worker are seen once
+flushed.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from models import Guest, VoteAudit
+
+logger = logging.getLogger(__name__)
+
+VOTE_AUDIT_MODE = os.getenv("VOTE_AUDIT_MODE", "sync")
+VOTE_AUDIT_FLUSH_SIZE = int(os.getenv("VOTE_AUDIT_FLUSH_SIZE", "500"))
+VOTE_AUDIT_FLUSH_INTERVAL = float(os.getenv("VOTE_AUDIT_FLUSH_INTERVAL", "1.0"))
+VOTE_AUDIT_BUFFER_MAX = int(os.getenv("VOTE_AUDIT_BUFFER_MAX", "50000"))
+
+# Queued rows, oldest first, and {ip: {(scope_type, scope_id): row count}}
+_rows: list[dict] = []
+_pending_scopes: dict[str, dict[tuple[str, int], int]] = {}
+_lock = threading.Lock()
+# One flush at a time: a batch stays queued until it is committed
+_flush_lock = threading.Lock()
+_counters = {
+    "enqueued": 0,
+    "flushed": 0,
+    "flushes": 0,
+    "flush_errors": 0,
+    "written_inline": 0,
+    "last_flush_ms": 0.0,
+    "max_flush_ms": 0.0,
+    "total_flush_ms": 0.0,
+}
+
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+_flusher_task: asyncio.Task | None = None
+
+
+def buffered_mode_enabled() -> bool:
+    """Whether audit rows are written by the background flusher."""
+    return VOTE_AUDIT_MODE == "buffered"
+
+
+def _wake_flusher() -> None:
+    """Ask the flusher for an early flush; callable from any thread."""
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def record(db: Session, rows: list[dict]) -> None:
+    """Record audit rows: queue them once `db` commits, or add them to its transaction.
+
+    Rows are written in the request transaction in sync mode, when the
+    flusher isn't running (scripts, tests without the lifespan) and when the
+    queue is full.
+
+    Args:
+        db: Session of the RSVP request
+        rows: `VoteAudit` column values, one dict per row
+    """
+    if not rows:
+        return
+    if _flusher_task is not None:
+        with _lock:
+            full = len(_rows) + len(rows) > VOTE_AUDIT_BUFFER_MAX
+            if full:
+                _counters["written_inline"] += len(rows)
+        if not full:
+            db.info.setdefault("vote_audit_rows", []).extend(rows)
+            return
+    db.execute(insert(VoteAudit), rows)
+
+
+def _enqueue(rows: list[dict]) -> None:
+    """Add committed rows to the queue."""
+    with _lock:
+        _rows.extend(rows)
+        _counters["enqueued"] += len(rows)
+        for row in rows:
+            scopes = _pending_scopes.setdefault(row["ip_address"], {})
+            scope = (row["scope_type"], row["scope_id"])
+            scopes[scope] = scopes.get(scope, 0) + 1
+        depth = len(_rows)
+    if _flusher_task is None:
+        # The flusher stopped since the rows were recorded: nobody else will write them
+        try:
+            flush()
+        except Exception:
+            logger.exception("Failed to write %d vote audit rows", depth)
+    elif depth >= VOTE_AUDIT_FLUSH_SIZE:
+        _wake_flusher()
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_on_commit(session):
+    """Queue the rows recorded in the committed transaction."""
+    rows = session.info.pop("vote_audit_rows", None)
+    if rows:
+        _enqueue(rows)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_rollback(session):
+    """Drop the rows recorded in a rolled back transaction."""
+    session.info.pop("vote_audit_rows", None)
+
+
+def other_scope_pending(ip_address: str, scope_type: str, scope_id: int) -> bool:
+    """Whether a queued row of `ip_address` is for another scope than (scope_type, scope_id)."""
+    with _lock:
+        scopes = _pending_scopes.get(ip_address)
+        return bool(scopes) and any(scope != (scope_type, scope_id) for scope in scopes)
+
+
+def flush() -> int:
+    """Insert every queued row in one transaction; blocking.
+
+    Rows of guests deleted while they were queued are skipped. On error the
+    rows stay queued for the next attempt.
+
+    Returns:
+        Number of rows inserted.
+    """
+    with _flush_lock:
+        with _lock:
+            batch = list(_rows)
+        if not batch:
+            return 0
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            guest_ids = {row["guest_id"] for row in batch}
+            existing = set(db.scalars(select(Guest.id).where(Guest.id.in_(guest_ids))))
+            kept = [row for row in batch if row["guest_id"] in existing]
+            if kept:
+                db.execute(insert(VoteAudit), kept)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with _lock:
+                _counters["flush_errors"] += 1
+            raise
+        finally:
+            db.close()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with _lock:
+            # Only this function removes rows, so the batch is still the head
+            del _rows[:len(batch)]
+            for row in batch:
+                scopes = _pending_scopes[row["ip_address"]]
+                scope = (row["scope_type"], row["scope_id"])
+                scopes[scope] -= 1
+                if not scopes[scope]:
+                    del scopes[scope]
+                if not scopes:
+                    del _pending_scopes[row["ip_address"]]
+            _counters["flushed"] += len(kept)
+            _counters["flushes"] += 1
+            _counters["last_flush_ms"] = elapsed_ms
+            _counters["max_flush_ms"] = max(_counters["max_flush_ms"], elapsed_ms)
+            _counters["total_flush_ms"] += elapsed_ms
+        return len(kept)
+
+
+async def _flusher():
+    """Flush every VOTE_AUDIT_FLUSH_INTERVAL seconds, or earlier when woken."""
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=VOTE_AUDIT_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        try:
+            await asyncio.to_thread(flush)
+        except Exception:
+            logger.exception("Failed to flush %d vote audit rows", depth())
+
+
+async def start_flusher():
+    """Start the background flusher (buffered mode only)."""
+    global _loop, _wakeup, _flusher_task
+    if not buffered_mode_enabled() or _flusher_task is not None:
+        return
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _flusher_task = asyncio.create_task(_flusher())
+
+
+async def stop_flusher():
+    """Stop the flusher, then write the rows still queued."""
+    global _loop, _wakeup, _flusher_task
+    if _flusher_task is None:
+        return
+    # From here on, RSVP writes insert their rows themselves
+    task, _flusher_task = _flusher_task, None
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    _loop = _wakeup = None
+    try:
+        await asyncio.to_thread(flush)
+    except Exception:
+        logger.exception("Lost %d vote audit rows on shutdown", depth())
+
+
+def depth() -> int:
+    """Number of rows waiting to be written."""
+    with _lock:
+        return len(_rows)
+
+
+def stats() -> dict:
+    """Queue depth and flush counters, for the admin metrics endpoint."""
+    with _lock:
+        flushes = _counters["flushes"]
+        return {
+            "mode": VOTE_AUDIT_MODE,
+            "depth": len(_rows),
+            "enqueued": _counters["enqueued"],
+            "flushed": _counters["flushed"],
+            "flushes": flushes,
+            "flush_errors": _counters["flush_errors"],
+            "written_inline": _counters["written_inline"],
+            "last_flush_ms": round(_counters["last_flush_ms"], 1),
+            "max_flush_ms": round(_counters["max_flush_ms"], 1),
+            "avg_flush_ms": round(_counters["total_flush_ms"] / flushes, 1) if flushes else 0.0,
+        }
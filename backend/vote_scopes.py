@@ -0,0 +1,158 @@
+"""Multi-group vote detection: has this IP voted for another family or guest?
+
+RSVP writes add one `VoteAudit` row per guest and vote, so the table only
+grows. The check doesn't depend on its size: with the
+`ix_vote_audits_ip_scope` index, the lowest and the highest (scope_type,
+scope_id) an IP voted for are one index seek each, and the IP voted for
+another scope exactly when one of them differs from the current scope.
+
+IPs found voting for several scopes stay that way while their audit rows
+exist, so they are also kept in a bounded in-process map (least recently
+used first out), warmed at startup. Checks for them are answered without a
+query. Other IPs are always checked against the database, which stays
+correct with several backend processes writing. Deleting audit rows
+(`clear`) bumps the shared "vote_scopes" counter, and every process empties
+its map when it sees the counter change.
+
+Votes older than the audit retention are rolled up into
+`VoteAuditSummary` rows by `audit_compaction`; both tables are checked.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import func, or_, select, union_all
+from sqlalchemy.orm import Session
+
+import shared_state
+from models import VoteAudit, VoteAuditSummary
+
+VOTE_SCOPE_CACHE_SIZE = int(os.getenv("VOTE_SCOPE_CACHE_SIZE", "10000"))
+
+_multi_scope_ips: OrderedDict[str, None] = OrderedDict()
+# Value of the shared "vote_scopes" counter the map is valid for
+_version = 0
+_counters = {"hits": 0, "queries": 0}
+_lock = threading.Lock()
+
+
+def _sync() -> int:
+    """Empty the map if audit rows were deleted since it was filled; call with `_lock` held.
+
+    Returns:
+        The current version.
+    """
+    global _version
+    version = shared_state.counter("vote_scopes")
+    if version != _version:
+        _multi_scope_ips.clear()
+        _version = version
+    return version
+
+
+def _remember(ip_address: str, version: int) -> None:
+    """Add `ip_address` to the multi-scope map, evicting the oldest entry if full.
+
+    Args:
+        ip_address: IP found voting for several scopes
+        version: Version current when the votes were read; a map cleared
+            since then isn't filled with the stale answer
+    """
+    if VOTE_SCOPE_CACHE_SIZE <= 0:
+        return
+    with _lock:
+        if _sync() != version:
+            return
+        _multi_scope_ips[ip_address] = None
+        _multi_scope_ips.move_to_end(ip_address)
+        while len(_multi_scope_ips) > VOTE_SCOPE_CACHE_SIZE:
+            _multi_scope_ips.popitem(last=False)
+
+
+def other_scope_exists(db: Session, ip_address: str, scope_type: str, scope_id: int) -> bool:
+    """Whether `ip_address` already voted for a scope other than (scope_type, scope_id).
+
+    Args:
+        db: Database session
+        ip_address: Client IP of the vote
+        scope_type: "family" or "guest"
+        scope_id: ID of the family or guest
+
+    Returns:
+        True if the IP has audit rows for another family or guest.
+    """
+    with _lock:
+        version = _sync()
+        if ip_address in _multi_scope_ips:
+            _multi_scope_ips.move_to_end(ip_address)
+            _counters["hits"] += 1
+            return True
+        _counters["queries"] += 1
+
+    bounds_queries = []
+    for model in (VoteAudit, VoteAuditSummary):
+        by_ip = (
+            select(model.scope_type, model.scope_id)
+            .where(model.ip_address == ip_address)
+            .limit(1)
+        )
+        lowest = by_ip.order_by(model.scope_type, model.scope_id).subquery()
+        highest = by_ip.order_by(model.scope_type.desc(), model.scope_id.desc()).subquery()
+        bounds_queries += [select(lowest), select(highest)]
+    bounds = db.execute(union_all(*bounds_queries)).all()
+    if any(tuple(bound) != (scope_type, scope_id) for bound in bounds):
+        _remember(ip_address, version)
+        return True
+    return False
+
+
+def warm(db: Session) -> int:
+    """Load the IPs that voted for several scopes into the map.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of IPs loaded (at most VOTE_SCOPE_CACHE_SIZE).
+    """
+    if VOTE_SCOPE_CACHE_SIZE <= 0:
+        return 0
+    with _lock:
+        version = _sync()
+    # An IP voted for several scopes when its lowest and highest scope differ;
+    # scans of the covering indexes, without touching the tables
+    scopes = union_all(*(
+        select(model.ip_address, model.scope_type, model.scope_id)
+        for model in (VoteAudit, VoteAuditSummary)
+    )).subquery()
+    ips = db.scalars(
+        select(scopes.c.ip_address)
+        .group_by(scopes.c.ip_address)
+        .having(or_(
+            func.min(scopes.c.scope_type) != func.max(scopes.c.scope_type),
+            func.min(scopes.c.scope_id) != func.max(scopes.c.scope_id),
+        ))
+        .limit(VOTE_SCOPE_CACHE_SIZE)
+    ).all()
+    for ip_address in ips:
+        _remember(ip_address, version)
+    return len(ips)
+
+
+def clear() -> None:
+    """Forget every IP in every process, e.g. after audit rows were deleted."""
+    shared_state.bump("vote_scopes")
+    with _lock:
+        _sync()
+
+
+def stats() -> dict:
+    """Map size and counters, for the admin metrics endpoint."""
+    with _lock:
+        _sync()
+        return {
+            "multi_scope_ips": len(_multi_scope_ips),
+            "max_size": VOTE_SCOPE_CACHE_SIZE,
+            **_counters,
+        }
@@ -70,7 +70,8 @@ export async function updateFamilyGuests(familyId, guestUpdates) {
 
 /**
  * Get RSVP statistics.
- * @returns {Promise<Object>} Stats with total_guests, confirmed, declined, pending
+ * @returns {Promise<Object>} Stats with total_guests, confirmed, declined, pending,
+ *   per-event counts (ceremony, lunch) and allergen tallies of the lunch guests
  */
 export async function getStats() {
   const { data } = await api.get('/rsvp/stats')
@@ -137,6 +138,33 @@ export const adminApi = {
    */
   deleteFamily: async (familyId) => {
     await api.delete(`/admin/families/${familyId}`, { headers: adminHeaders() })
+  },
+
+  /**
+   * Apply many guest/family operations at once, all or none.
+   * Operations: create_guest, update_guest, move_guest, delete_guest,
+   * create_family, update_family, delete_family (see POST /api/admin/batch).
+   */
+  applyBatch: async (operations) => {
+    const { data } = await api.post('/admin/batch', { operations }, { headers: adminHeaders() })
+    return data.results
+  },
+
+  /**
+   * Download all guests with their RSVPs as a 'csv' or 'xlsx' file.
+   */
+  exportGuests: async (format) => {
+    const { data } = await api.get('/admin/export', {
+      params: { format },
+      headers: adminHeaders(),
+      responseType: 'blob'
+    })
+    const url = URL.createObjectURL(data)
+    const link = document.createElement('a')
+    link.href = url
+    link.download = `rsvp.${format}`
+    link.click()
+    URL.revokeObjectURL(url)
   }
 }
 
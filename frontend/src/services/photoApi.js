@@ -10,7 +10,8 @@ const api = axios.create({
  * @param {string|null} uploaderName - Name of the uploader
  * @param {string|null} caption - Optional caption
  * @param {Function} onProgress - Progress callback (0-100)
- * @returns {Promise<Object>} Uploaded photo data
+ * @returns {Promise<Object>} Uploaded photo data; `status` is 'pending' when the
+ *   server processes uploads in the background (see waitForPhoto)
  */
 export async function uploadPhoto(file, uploaderName, caption, onProgress) {
   const formData = new FormData()
@@ -31,14 +32,38 @@ export async function uploadPhoto(file, uploaderName, caption, onProgress) {
 
 /**
  * Fetch paginated list of photos (newest first).
- * @param {number} page - Page number (1-indexed)
+ * @param {number} page - Page number (1-indexed), ignored when cursor is set
  * @param {number} perPage - Items per page
  * @param {string|null} search - Optional search string to filter by name/caption
- * @returns {Promise<Object>} PhotoListResponse with photos array and pagination
+ * @param {string|null} cursor - next_cursor of the previous page, for infinite scroll
+ * @param {boolean} includeTotal - Whether the server should count all matching photos
+ * @returns {Promise<Object>} PhotoListResponse with photos array, pagination and next_cursor
  */
-export async function getPhotos(page = 1, perPage = 20, search = null) {
-  const params = { page, per_page: perPage }
+export async function getPhotos(page = 1, perPage = 20, search = null, cursor = null, includeTotal = true) {
+  const params = { page, per_page: perPage, include_total: includeTotal }
   if (search) params.search = search
+  if (cursor) params.cursor = cursor
   const { data } = await api.get('', { params })
   return data
 }
+
+/**
+ * Poll the processing status of an uploaded photo until it is ready.
+ * @param {string} photoId - ID returned by uploadPhoto
+ * @param {number} intervalMs - Delay between polls
+ * @param {number} maxAttempts - Polls before giving up
+ * @returns {Promise<Object>} Photo data once processing has finished (the
+ *   already existing photo if the upload turned out to be a duplicate)
+ * @throws {Error} If processing failed or didn't finish within maxAttempts polls
+ */
+export async function waitForPhoto(photoId, intervalMs = 1000, maxAttempts = 120) {
+  for (let attempt = 0; attempt < maxAttempts; attempt++) {
+    const { data } = await api.get(`/${photoId}/status`)
+    if ((data.status === 'ready' || data.status === 'duplicate') && data.photo) return data.photo
+    if (data.status === 'failed') {
+      throw new Error(data.detail || 'Elaborazione della foto non riuscita')
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs))
+  }
+  throw new Error('Elaborazione della foto troppo lenta, riprova più tardi')
+}
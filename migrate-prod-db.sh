@@ -3,8 +3,8 @@
 set -euo pipefail
 
 COMPOSE_FILE="docker-compose.prod.yml"
-DB_PATH="backend/wedding.db"
-BACKUP_PATH="backend/wedding.db.bak.$(date +%Y%m%d_%H%M%S)"
+DB_PATH="data/wedding.db"
+BACKUP_PATH="data/wedding.db.bak.$(date +%Y%m%d_%H%M%S)"
 
 echo "Backing up ${DB_PATH} to ${BACKUP_PATH}"
 cp "${DB_PATH}" "${BACKUP_PATH}"
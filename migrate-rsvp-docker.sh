@@ -15,7 +15,7 @@ set -euo pipefail
 #   - Stored in ./data/db-backups on the host (via /data/db-backups in the container)
 #
 # Migrate the RSVP SQLite DB inside the backend Docker container.
-# Defaults to prod compose because it bind-mounts /app/wedding.db.
+# Defaults to prod compose because it keeps the DB in the mounted /data/wedding.db.
 #
 # Examples:
 #   ./migrate-rsvp-docker.sh
@@ -40,7 +40,7 @@ Options:
   -h, --help         Show this help
 
 Notes:
-  - Prod mode is recommended because docker-compose.prod.yml bind-mounts ./backend/wedding.db -> /app/wedding.db.
+  - Prod mode is recommended because docker-compose.prod.yml keeps the DB in ./data/wedding.db (/data/wedding.db).
   - Backups are written to /data/db-backups inside the container, which maps to ./data on the host.
   - Dev mode without a bind-mounted /app/wedding.db may migrate a non-persistent container-local DB.
 EOF
@@ -92,7 +92,9 @@ fi
 
 if [[ "$ENVIRONMENT" == "prod" ]]; then
   COMPOSE_FILES=(-f docker-compose.prod.yml)
+  DB_PATH=/data/wedding.db
 else
+  DB_PATH=/app/wedding.db
   COMPOSE_FILES=(-f docker-compose.yml)
   echo "WARNING: dev compose does not bind-mount /app/wedding.db in the current config." >&2
   echo "         Prefer --env prod, or use --exec on the running dev backend container." >&2
@@ -102,7 +104,7 @@ MIGRATE_ARGS=(
   python
   /app/scripts/migrate_rsvp_db.py
   --backend-dir /app
-  --db-path /app/wedding.db
+  --db-path "$DB_PATH"
   --backup-dir /data/db-backups
 )
 